@@ -0,0 +1,178 @@
+import bisect
+import threading
+from datetime import datetime
+
+# Fixed histogram buckets (upper bounds); one more slot counts everything above the last
+ATTEMPT_BUCKETS = (1, 2, 3, 5, 8, 13, 21)
+SOLVE_TIME_BUCKETS = (30, 60, 120, 300, 600, 900, 1200, 1800, 2700, 3600)  # seconds
+
+
+class FixedHistogram:
+    """Counts per fixed bucket plus a running sum; O(log buckets) to record"""
+
+    __slots__ = ('bounds', 'counts', 'total', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (None when empty or past the last bound)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for bound, bucket_count in zip(self.bounds, self.counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return bound
+        return None
+
+    def to_dict(self):
+        return {
+            'buckets': list(self.bounds),
+            'counts': list(self.counts),
+            'count': self.count,
+            'avg': round(self.total / self.count, 2) if self.count else None,
+            'median_bucket': self.quantile(0.5)
+        }
+
+
+class QuestionStats:
+    __slots__ = ('opened_at', 'submissions', 'correct_submissions', 'compile_errors', 'attempts',
+                 'solved', 'attempts_to_solve', 'time_to_solve')
+
+    def __init__(self):
+        self.opened_at = None            # when the question was first shown, for time-to-first-correct
+        self.submissions = 0             # graded submissions
+        self.correct_submissions = 0
+        self.compile_errors = 0          # submissions that did not compile
+        self.attempts = {}               # nickname -> submissions so far, compile errors included
+        self.solved = set()
+        self.attempts_to_solve = FixedHistogram(ATTEMPT_BUCKETS)
+        self.time_to_solve = FixedHistogram(SOLVE_TIME_BUCKETS)
+
+
+def _parse_time(value):
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+class GameAnalytics:
+    """Per-question aggregates of the current game, updated in O(1) per event.
+
+    Keeps counters and fixed-bucket histograms (attempts before the first
+    correct submission, time from the question opening to it) instead of
+    scanning every participant's submission list. ``version`` is the seq
+    of the last event applied, for ETags.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self, version=0):
+        with self.lock:
+            self.version = version
+            self.participants = set()
+            self.questions = {}  # question index -> QuestionStats
+
+    def _question(self, index):
+        stats = self.questions.get(index)
+        if stats is None:
+            stats = self.questions[index] = QuestionStats()
+        return stats
+
+    def question_opened(self, index, timestamp, version=0):
+        with self.lock:
+            stats = self._question(index)
+            if stats.opened_at is None:
+                stats.opened_at = _parse_time(timestamp)
+            self.version = max(self.version, version)
+
+    def joined(self, nickname, version=0):
+        with self.lock:
+            self.participants.add(nickname)
+            self.version = max(self.version, version)
+
+    def compile_failed(self, nickname, index, count=1, version=0):
+        with self.lock:
+            stats = self._question(index)
+            stats.compile_errors += count
+            stats.attempts[nickname] = stats.attempts.get(nickname, 0) + count
+            self.version = max(self.version, version)
+
+    def submitted(self, nickname, index, correct, timestamp, version=0):
+        with self.lock:
+            stats = self._question(index)
+            stats.submissions += 1
+            attempts = stats.attempts[nickname] = stats.attempts.get(nickname, 0) + 1
+            if correct:
+                stats.correct_submissions += 1
+                if nickname not in stats.solved:
+                    stats.solved.add(nickname)
+                    stats.attempts_to_solve.observe(attempts)
+                    submitted_at = _parse_time(timestamp)
+                    if stats.opened_at and submitted_at:
+                        stats.time_to_solve.observe(max(0.0, (submitted_at - stats.opened_at).total_seconds()))
+            self.version = max(self.version, version)
+
+    def rebuild(self, game, version):
+        """Recompute from a restored game dict (a snapshot has no event history).
+
+        Only compile error counts are kept per participant and question, so
+        they are taken to have come before that participant's graded
+        submissions when counting attempts to solve.
+        """
+        self.reset(version)
+        for index, timestamp in (game.get('question_times') or {}).items():
+            self.question_opened(int(index), timestamp)
+        records = []
+        for nickname, participant in game['participants'].items():
+            self.joined(nickname)
+            for index, count in (participant.get('compile_errors') or {}).items():
+                self.compile_failed(nickname, int(index), count)
+            for submission in participant['submissions']:
+                records.append((submission['timestamp'], nickname, submission['question_index'], submission['correct']))
+        for timestamp, nickname, index, correct in sorted(records, key=lambda record: record[0]):
+            self.submitted(nickname, index, correct, timestamp)
+        with self.lock:
+            self.version = version
+
+    def _summary(self, index, stats):
+        attempted = len(stats.attempts)
+        total = stats.submissions + stats.compile_errors
+        return {
+            'question_index': index,
+            'participants': len(self.participants),
+            'attempted': attempted,
+            'solved': len(stats.solved),
+            'solve_rate': round(len(stats.solved) / attempted, 3) if attempted else 0.0,
+            'submissions': total,
+            'correct_submissions': stats.correct_submissions,
+            'compile_errors': stats.compile_errors,
+            'compile_error_rate': round(stats.compile_errors / total, 3) if total else 0.0,
+            'attempts_to_solve': stats.attempts_to_solve.to_dict(),
+            'time_to_solve': stats.time_to_solve.to_dict()
+        }
+
+    def question_summary(self, index):
+        with self.lock:
+            return self._summary(index, self._question(index))
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'version': self.version,
+                'participants': len(self.participants),
+                'questions': [self._summary(index, stats) for index, stats in sorted(self.questions.items())]
+            }
@@ -1,8 +1,16 @@
-from flask import Flask, render_template, request, jsonify, session
+import os
+# Serving mode: 'threading' (default) or 'eventlet', where sockets, subprocesses, PTY
+# reads and sleeps all become cooperative so one worker holds many idle connections
+ASYNC_MODE = os.environ.get('ASYNC_MODE', 'threading')
+if ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+
+from flask import Flask, render_template, request, jsonify, session, make_response, send_from_directory
 import secrets
 import subprocess
-import os
 import json
+import hashlib
 import tempfile
 import shutil
 from datetime import datetime
@@ -10,28 +18,54 @@ import uuid
 import signal
 import threading
 import time
-import fcntl
-import termios
-import struct
 import logging
-import sys
-# SocketIO and PTY imports for real-time terminal functionality
+# SocketIO imports for real-time terminal functionality
 from flask_socketio import SocketIO, emit, disconnect, join_room, leave_room
-import threading, pty, select
-
-# Configure logging for Docker deployment
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('/app/logs/app.log') if os.path.exists('/app/logs') else logging.StreamHandler(sys.stdout)
-    ]
+from compile_cache import CompileCache
+from scheduler import JobScheduler, QueueFullError
+from grader import Grader, question_cases
+from pty_loop import PTYEventLoop
+from output_pipeline import OutputPipeline
+from scrollback import Scrollback
+from leaderboard import Leaderboard
+from game_backend import create_game_backend
+from sandbox import SandboxExecutor
+from metrics import registry, TimedLock
+from assets import AssetPipeline, IMMUTABLE_CACHE, REVALIDATE_CACHE
+from verdict_cache import VerdictCache
+from broadcast import Broadcaster
+from logging_setup import configure_logging, parse_rates
+from slot_pool import SlotPool
+from source_store import SourceStore
+from similarity import SimilarityIndex
+from diagnostics import SyntaxChecker
+from analytics import GameAnalytics
+from question_bank import QuestionBank, QuestionError
+from regrade import Regrader, RegradeBusyError, collect_submissions
+import psutil
+
+# Logging: request threads only enqueue; a listener thread formats and writes stdout and
+# /app/logs/app.log (rotated). LOG_RATE_LIMITS caps chatty categories, e.g. 'pty.input=5'
+configure_logging(
+    log_dir='/app/logs',
+    level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+    fmt=os.environ.get('LOG_FORMAT', 'json'),
+    max_bytes=int(os.environ.get('LOG_MAX_MB', '10')) * 1024 * 1024,
+    backups=int(os.environ.get('LOG_BACKUPS', '5')),
+    rates=parse_rates(os.environ.get('LOG_RATE_LIMITS', 'pty.input=5,pty.loop=5,pty.output=5'))
 )
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-app.secret_key = secrets.token_hex(32)
+# /static is served by the asset pipeline below rather than Flask's built-in route
+app = Flask(__name__, static_folder=None)
+STATIC_DIR = os.path.join(app.root_path, 'static')
+# Workers behind one load balancer must share the key to accept each other's session cookies
+app.secret_key = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
+
+# Static files are fingerprinted and precompressed once at startup; templates link via asset_url()
+assets = AssetPipeline(STATIC_DIR)
+assets.build()
+app.jinja_env.globals['asset_url'] = assets.url
 
 # SocketIO configuration optimized for Docker environments
 socketio = SocketIO(
@@ -42,100 +76,274 @@ socketio = SocketIO(
     engineio_logger=False,
     ping_timeout=60,
     ping_interval=30,
-    # Threading mode for better Docker compatibility
+    async_mode=ASYNC_MODE,
     transports=['polling', 'websocket'],
-    allow_upgrades=True
+    allow_upgrades=True,
+    # e.g. redis://host:6379/0 so emits reach clients connected to other workers
+    message_queue=os.environ.get('SOCKETIO_MESSAGE_QUEUE') or None
 )
 
-# Global session management
+# Hot-path instrumentation, exposed on /metrics and /api/teacher/metrics
+COMPILE_SECONDS = registry.histogram('compile_seconds', 'Compile step wall time including cache lookup', ('source', 'cached'))
+SUBMIT_SECONDS = registry.histogram('submit_seconds', 'Submission latency: queueing, build and all test cases')
+GRADE_CASES = registry.counter('grade_cases_total', 'Graded test cases by verdict', ('verdict',))
+SYNTAX_CHECKS = registry.counter('syntax_checks_total', 'Editor syntax checks by outcome', ('result',))
+VERDICT_CACHE_LOOKUPS = registry.counter('verdict_cache_lookups_total', 'Submissions answered from the verdict cache or graded', ('result',))
+PROGRAM_WALL_SECONDS = registry.histogram('program_wall_seconds', 'Wall time of interactive runs')
+PROGRAM_CPU_SECONDS = registry.histogram('program_cpu_seconds', 'CPU time of interactive runs')
+PROGRAM_EXITS = registry.counter('program_exits_total', 'Interactive runs by how they ended', ('status',))
+PTY_FRAMES = registry.counter('pty_output_frames_total', 'Output frames emitted to terminals')
+PTY_BYTES = registry.counter('pty_output_chars_total', 'Characters of program output emitted to terminals')
+EMIT_SECONDS = registry.histogram('pty_emit_seconds', 'Time spent emitting one output frame')
+PTY_RESUMES = registry.counter('pty_resumes_total', 'Terminal reconnects by outcome', ('outcome',))
+SESSION_LOCK_WAIT = registry.histogram(
+    'session_lock_wait_seconds', 'Time spent waiting for the session lock',
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+)
+
+# Global session management: terminal sessions are keyed by a resumable token,
+# and each connected socket id maps to the token it is attached to
 active_sessions = {}
-session_lock = threading.Lock()
+pty_sids = {}
+session_lock = TimedLock(SESSION_LOCK_WAIT)
 
 # Directory paths with Docker/local fallbacks
-TEMP_DIR = '/app/temp' if os.path.exists('/app/temp') else './temp'
-LOGS_DIR = '/app/logs' if os.path.exists('/app/logs') else './logs'
-DATA_DIR = '/app/data' if os.path.exists('/app/data') else './data'
+TEMP_DIR = '/app/temp' if os.path.exists('/app/temp') else os.path.abspath('./temp')
+LOGS_DIR = '/app/logs' if os.path.exists('/app/logs') else os.path.abspath('./logs')
+DATA_DIR = '/app/data' if os.path.exists('/app/data') else os.path.abspath('./data')
 MAX_SESSIONS = int(os.environ.get('MAX_SESSIONS', '30'))
 COMPILE_TIMEOUT = int(os.environ.get('COMPILE_TIMEOUT', '15'))
 EXECUTION_TIMEOUT = int(os.environ.get('EXECUTION_TIMEOUT', '30'))
+COMPILE_CACHE_MAX_MB = int(os.environ.get('COMPILE_CACHE_MAX_MB', '256'))
+# Build/execute pool defaults to one worker per core
+SCHEDULER_WORKERS = int(os.environ.get('SCHEDULER_WORKERS', '0')) or os.cpu_count() or 1
+SCHEDULER_MAX_QUEUE = int(os.environ.get('SCHEDULER_MAX_QUEUE', '200'))
+# Test cases of a submission run in parallel on a shared pool, each with its own timeout
+GRADER_WORKERS = int(os.environ.get('GRADER_WORKERS', '0')) or os.cpu_count() or 1
+GRADER_CASE_TIMEOUT = int(os.environ.get('GRADER_CASE_TIMEOUT', str(EXECUTION_TIMEOUT)))
+# Graded output is compared while it streams; anything past this is rejected unread
+GRADER_MAX_OUTPUT_KB = int(os.environ.get('GRADER_MAX_OUTPUT_KB', '1024'))
+# Resource limits applied to every student program
+SANDBOX_LIMITS = {
+    'cpu_seconds': int(os.environ.get('SANDBOX_CPU_SECONDS', str(EXECUTION_TIMEOUT))),
+    'memory_bytes': int(os.environ.get('SANDBOX_MEMORY_MB', '256')) * 1024 * 1024,
+    'file_size_bytes': int(os.environ.get('SANDBOX_FILE_SIZE_MB', '16')) * 1024 * 1024,
+    'processes': int(os.environ.get('SANDBOX_NPROC', '512')),
+    'cgroup_pids': int(os.environ.get('SANDBOX_CGROUP_PIDS', '64')),
+}
+SANDBOX_CGROUP_ROOT = os.environ.get('SANDBOX_CGROUP_ROOT') or None
+# Program output is batched into frames and capped per run
+OUTPUT_FLUSH_MS = int(os.environ.get('OUTPUT_FLUSH_MS', '50'))
+OUTPUT_FLUSH_BYTES = int(os.environ.get('OUTPUT_FLUSH_BYTES', '16384'))
+OUTPUT_MAX_BYTES = int(os.environ.get('OUTPUT_MAX_BYTES', str(1024 * 1024)))
+OUTPUT_MAX_UNACKED = int(os.environ.get('OUTPUT_MAX_UNACKED', '4'))
+# A disconnected terminal keeps its program running this long so the client can resume it,
+# replaying up to PTY_SCROLLBACK_KB of recent output (0 disables resuming)
+PTY_RESUME_GRACE = float(os.environ.get('PTY_RESUME_GRACE', '60'))
+PTY_SCROLLBACK_KB = int(os.environ.get('PTY_SCROLLBACK_KB', '64'))
+# Run takes a pre-made work directory and PTY pair from this pool; returned slots are
+# killed, scrubbed and refilled in the background. Point SLOT_POOL_DIR at a tmpfs
+# mounted with exec to keep run directories off disk.
+SLOT_POOL_SIZE = int(os.environ.get('SLOT_POOL_SIZE', str(min(MAX_SESSIONS, 8))))
+SLOT_POOL_DIR = os.environ.get('SLOT_POOL_DIR') or os.path.join(TEMP_DIR, 'slots')
+# Live editor diagnostics run gcc -fsyntax-only beside the build pool, never more than
+# SYNTAX_CHECK_WORKERS at once, and are skipped while builds are queued
+SYNTAX_CHECK_WORKERS = int(os.environ.get('SYNTAX_CHECK_WORKERS', '2'))
+SYNTAX_CHECK_TIMEOUT = float(os.environ.get('SYNTAX_CHECK_TIMEOUT', '5'))
+SYNTAX_CHECK_CACHE_ENTRIES = int(os.environ.get('SYNTAX_CHECK_CACHE_ENTRIES', '1024'))
+
+# Shared by the PTY run handler and game submissions so both hit the same cache entry
+COMPILE_FLAGS = ['-Wall', '-Wextra', '-std=c99', '-g', '-O1']
 
 os.makedirs(TEMP_DIR, exist_ok=True)
 os.makedirs(LOGS_DIR, exist_ok=True)
 os.makedirs(DATA_DIR, exist_ok=True)
 
+compile_cache = CompileCache(
+    os.path.join(DATA_DIR, 'compile_cache'),
+    max_bytes=COMPILE_CACHE_MAX_MB * 1024 * 1024
+)
+
+# All gcc invocations and graded executions go through this pool
+job_scheduler = JobScheduler(workers=SCHEDULER_WORKERS, max_queue=SCHEDULER_MAX_QUEUE, name='build')
+syntax_checker = SyntaxChecker(
+    compile_cache, COMPILE_FLAGS,
+    timeout=SYNTAX_CHECK_TIMEOUT,
+    max_concurrent=SYNTAX_CHECK_WORKERS,
+    max_entries=SYNTAX_CHECK_CACHE_ENTRIES,
+    busy=lambda: job_scheduler.stats()['queue_depth'] > 0
+)
+sandbox = SandboxExecutor(limits=SANDBOX_LIMITS, cgroup_root=SANDBOX_CGROUP_ROOT)
+grader = Grader(sandbox, workers=GRADER_WORKERS, case_timeout=GRADER_CASE_TIMEOUT,
+                max_output_bytes=GRADER_MAX_OUTPUT_KB * 1024)
+# Verdicts of unchanged resubmissions are reused; everything that can change a verdict is in the key
+verdict_cache = VerdictCache(max_entries=int(os.environ.get('VERDICT_CACHE_ENTRIES', '2048')))
+# Graded sources are kept by content hash; the latest per student and question is
+# fingerprinted for the teacher's similarity view
+source_store = SourceStore(os.path.join(DATA_DIR, 'sources'))
+similarity_index = SimilarityIndex(common_limit=int(os.environ.get('SIMILARITY_COMMON_LIMIT', '20')))
+game_analytics = GameAnalytics()
+GRADING_CONFIG = {
+    'compiler': compile_cache.compiler,
+    'flags': COMPILE_FLAGS,
+    'case_timeout': GRADER_CASE_TIMEOUT,
+    'max_output_kb': GRADER_MAX_OUTPUT_KB,
+    'limits': SANDBOX_LIMITS
+}
+
+# Single thread multiplexing every running program's PTY output and exit
+pty_loop = PTYEventLoop()
+slot_pool = SlotPool(SLOT_POOL_DIR, size=SLOT_POOL_SIZE)
+
+def count_child_processes():
+    return len(psutil.Process().children(recursive=True))
+
+registry.gauge('active_sessions', 'Terminal sessions, connected or awaiting resume', lambda: len(active_sessions))
+registry.gauge('detached_sessions', 'Terminal sessions awaiting resume after a disconnect',
+               lambda: sum(1 for session in list(active_sessions.values()) if session.sid is None))
+registry.gauge('running_programs', 'Programs attached to the PTY event loop', lambda: pty_loop.stats()['sessions'])
+registry.gauge('slot_pool_idle', 'Execution slots ready for Run', lambda: slot_pool.stats()['idle'])
+registry.gauge('slot_pool_returning', 'Execution slots waiting for the reaper', lambda: slot_pool.stats()['returning'])
+registry.gauge('threads', 'Threads in the server process', threading.active_count)
+registry.gauge('child_processes', 'Descendant processes (compilers, student programs, sandbox helper)', count_child_processes)
+registry.gauge('build_queue_depth', 'Jobs waiting for the build pool', lambda: job_scheduler.stats()['queue_depth'])
+registry.gauge('build_running', 'Jobs running on the build pool', lambda: job_scheduler.stats()['running'])
+registry.gauge('compile_cache_hits', 'Compile cache hits since start', lambda: compile_cache.stats()['hits'])
+registry.gauge('compile_cache_misses', 'Compile cache misses since start', lambda: compile_cache.stats()['misses'])
+
+def timed_compile(code, source):
+    """Compile through the cache, recording how long it took and whether it was a hit"""
+    started = time.monotonic()
+    result = compile_cache.compile(code, COMPILE_FLAGS, COMPILE_TIMEOUT)
+    COMPILE_SECONDS.observe(time.monotonic() - started, source=source, cached=str(result.cached).lower())
+    return result
+
 class PTYSession:
-    def __init__(self, session_id):
-        self.session_id = session_id
+    def __init__(self, session_id, sid):
+        self.session_id = session_id  # Resume token, also the Socket.IO room of the client
+        self.sid = sid                # None while detached
+        self.detached_at = None
         self.master_fd = None
         self.process = None
-        self.reader_thread = None
-        self.monitor_thread = None
+        self.output = None
         self.active = False
         self.lock = threading.Lock()
-        self.temp_dir = None
+        self.output_lock = threading.Lock()
+        self.scrollback = Scrollback(PTY_SCROLLBACK_KB * 1024)
+        self.slot = None  # Work directory and PTY pair checked out from slot_pool for a run
+    
+    def write(self, text, callback=None):
+        """Send terminal output to the client, keeping it in the scrollback for resumes"""
+        # Recorded and emitted under one lock so scrollback offsets follow delivery order
+        with self.output_lock:
+            self.scrollback.append(text)
+            socketio.emit('pty-output', text, namespace='/pty', to=self.session_id, callback=callback)
         
     def cleanup(self):
-        """Clean up all session resources including processes and temp files"""
+        """Stop watching the running program and hand its slot to the pool for teardown"""
         with self.lock:
             if not self.active:
                 return
                 
             logger.info(f"Cleaning up PTY session {self.session_id}")
             self.active = False
+            pty_loop.remove_session(self.session_id)
+            
+            # Killing the program, closing the PTY and scrubbing the work directory
+            # all happen on the pool's reaper thread
+            if self.slot:
+                slot_pool.release(self.slot, self.process)
+            self.slot = None
+            self.process = None
+            self.master_fd = None
             
-            # Kill process group to ensure all child processes are terminated
-            if self.process:
-                try:
-                    if self.process.poll() is None:
-                        pgid = os.getpgid(self.process.pid)
-                        os.killpg(pgid, signal.SIGTERM)
-                        time.sleep(0.5)
-                        
-                        if self.process.poll() is None:
-                            os.killpg(pgid, signal.SIGKILL)
-                            
-                    self.process.wait(timeout=2)
-                except Exception as e:
-                    logger.warning(f"Error killing process for session {self.session_id}: {e}")
-                finally:
-                    self.process = None
-                    
-            # Close PTY file descriptor
-            if self.master_fd:
-                try:
-                    os.close(self.master_fd)
-                except Exception as e:
-                    logger.warning(f"Error closing PTY for session {self.session_id}: {e}")
-                finally:
-                    self.master_fd = None
-                    
-            # Remove session-specific temporary directory
-            if self.temp_dir and os.path.exists(self.temp_dir):
-                try:
-                    shutil.rmtree(self.temp_dir)
-                except Exception as e:
-                    logger.warning(f"Error cleaning temp dir for session {self.session_id}: {e}")
-                    
-            self.reader_thread = None
-            self.monitor_thread = None
             logger.info(f"Session {self.session_id} cleaned up")
 
 # Teacher authentication credentials
 TEACHER_USERNAME = 'tuklu15'
 TEACHER_PASSWORD = 'AdJk@1526'
 PROGRESS_FILE = os.path.join(DATA_DIR, 'progress.json')
-GAME_STATE_FILE = os.path.join(DATA_DIR, 'game_state.json')
-
-# In-memory game state structure
-current_game = {
-    'active': False,
-    'current_question': None,
-    'question_index': 0,
-    'questions': [],
-    'timer': 0,
-    'start_time': None,
-    'participants': {}
-}
+# Game state changes are recorded as events on a backend: 'local' (this process only)
+# or 'sqlite:<path>' shared by several workers
+game_backend = create_game_backend(
+    os.environ.get('GAME_BACKEND', 'local'), DATA_DIR,
+    snapshot_every=int(os.environ.get('GAME_SNAPSHOT_EVERY', '500')),
+    snapshot_interval=float(os.environ.get('GAME_SNAPSHOT_INTERVAL', '30'))
+)
+current_game = game_backend.game
+
+def run_reference(solution, inputs):
+    """Compile a question's reference solution and capture its output for each input.
+
+    Returns ``(outputs, error)``; runs on the build pool like any other job.
+    """
+    def build_and_run():
+        compile_result = timed_compile(solution, 'reference')
+        if compile_result.returncode != 0:
+            return None, f'Reference solution does not compile:\n{compile_result.stderr}'
+        temp_dir = tempfile.mkdtemp(dir=TEMP_DIR, prefix='reference_')
+        try:
+            exe_file = os.path.join(temp_dir, 'program')
+            compile_cache.link_into(compile_result, exe_file)
+            results = grader.capture(exe_file, inputs, cwd=temp_dir)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        for text, result in zip(inputs, results):
+            if result['error']:
+                return None, f"Reference solution {result['error']} on input {text!r}"
+        return [result['output'] for result in results], None
+    return job_scheduler.run('question-bank', build_and_run)
+
+# Questions live in DATA_DIR by id; games reference them instead of copying them around
+question_bank = QuestionBank(DATA_DIR, run_reference, reference_config=GRADING_CONFIG)
+game_backend.resolve_questions = question_bank.resolve_for_replay
+game_lock = game_backend.lock
+
+# Ranking kept in sync with participant scores; viewers in LEADERBOARD_ROOM get deltas
+leaderboard = Leaderboard(epoch=game_backend.epoch)
+LEADERBOARD_ROOM = 'leaderboard'
+
+# Game notifications go only to the rooms that use them: teacher panels, leaderboard
+# displays, and students (every terminal socket joins PARTICIPANTS_ROOM on /pty)
+TEACHERS_ROOM = 'teachers'
+PARTICIPANTS_ROOM = 'participants'
+GAME_TARGETS = [('/', [TEACHERS_ROOM, LEADERBOARD_ROOM]), ('/pty', [PARTICIPANTS_ROOM])]
+TEACHER_TARGETS = [('/', [TEACHERS_ROOM])]
+# Joins and score changes are coalesced into one frame per interval
+broadcaster = Broadcaster(socketio, interval=int(os.environ.get('BROADCAST_INTERVAL_MS', '250')) / 1000)
+
+def push_leaderboard_delta(delta):
+    socketio.emit('leaderboard_delta', delta, namespace='/', to=LEADERBOARD_ROOM)
+
+_question_set = (None, None)
+
+def question_set_id():
+    """Content hash of the current game's questions; names them in URLs so clients can cache them"""
+    global _question_set
+    questions = current_game['questions']
+    cached_for, digest = _question_set
+    if cached_for is not questions:
+        payload = json.dumps(questions, sort_keys=True, separators=(',', ':'))
+        digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+        _question_set = (questions, digest)
+    return digest
+
+# Question fields students may see; test inputs and expected outputs stay with the grader
+PUBLIC_QUESTION_FIELDS = ('id', 'title', 'description', 'hint')
+
+def public_question(question):
+    """A question as served to students, without its test cases or expected outputs"""
+    if question is None:
+        return None
+    return {field: question[field] for field in PUBLIC_QUESTION_FIELDS if field in question}
+
+def question_ref():
+    """What clients need to fetch the current question instead of receiving it inline"""
+    return {
+        'question_set': question_set_id(),
+        'question_index': current_game['question_index'],
+        'total_questions': len(current_game['questions'])
+    }
 
 def load_progress():
     try:
@@ -148,25 +356,102 @@ def save_progress(progress):
     with open(PROGRESS_FILE, 'w') as f:
         json.dump(progress, f, indent=2)
 
+def on_game_event(seq, event, game, local):
+    """Keep the leaderboard in step with game events, numbered by event seq so all workers agree.
+
+    Only the worker that recorded an event broadcasts it; with a message
+    queue that reaches viewers connected to every worker.
+    """
+    kind = event['type']
+    if kind in ('start', 'question', 'refresh_questions'):
+        # Cached verdicts only ever apply to the current question
+        verdict_cache.clear()
+    if kind == 'start':
+        verdict_cache.reset_stats()
+        similarity_index.reset()
+        game_analytics.reset(version=seq)
+        game_analytics.question_opened(0, event['start_time'], version=seq)
+        leaderboard.reset(version=seq)
+        if local:
+            version, entries = leaderboard.snapshot()
+            socketio.emit('leaderboard_snapshot', {'version': version, 'entries': entries},
+                          namespace='/', to=LEADERBOARD_ROOM)
+    elif kind in ('join', 'submit'):
+        participant = game['participants'].get(event['nickname'])
+        if participant is None:
+            return
+        delta = leaderboard.update(
+            event['nickname'], participant['current_score'], len(participant['submissions']),
+            rejoined=kind == 'join', version=seq
+        )
+        if local:
+            push_leaderboard_delta(delta)
+        if kind == 'join':
+            game_analytics.joined(event['nickname'], version=seq)
+        else:
+            submission = event['submission']
+            game_analytics.submitted(event['nickname'], submission['question_index'], submission['correct'],
+                                     submission['timestamp'], version=seq)
+            index_submission(event['nickname'], submission)
+            if local:
+                push_analytics(submission['question_index'])
+    elif kind == 'regrade':
+        # Any score may have moved, so rank and count from scratch once
+        leaderboard.reset(game['participants'], version=seq)
+        game_analytics.rebuild(game, version=seq)
+        if local:
+            version, entries = leaderboard.snapshot()
+            socketio.emit('leaderboard_snapshot', {'version': version, 'entries': entries},
+                          namespace='/', to=LEADERBOARD_ROOM)
+    elif kind == 'question':
+        game_analytics.question_opened(event['question_index'], event.get('timestamp'), version=seq)
+    elif kind == 'compile_error':
+        if event['nickname'] not in game['participants']:
+            return
+        game_analytics.compile_failed(event['nickname'], event['question_index'], version=seq)
+        if local:
+            push_analytics(event['question_index'])
+
+game_backend.add_listener(on_game_event)
+
+def push_analytics(question_index):
+    """Queue a question's updated summary for teacher panels; bursts coalesce to the latest"""
+    broadcaster.publish('analytics_updated', question_index,
+                        game_analytics.question_summary(question_index), TEACHER_TARGETS)
+
+def index_submission(nickname, submission):
+    """Add a graded submission's source to the similarity index"""
+    digest = submission.get('source')
+    if not digest:
+        return
+    code = source_store.get(digest)
+    if code is None:
+        logger.warning(f"Source {digest} of {nickname}'s submission is not in the source store")
+        return
+    similarity_index.add(submission['question_index'], nickname, digest, code)
+
 def load_game_state():
-    global current_game
-    try:
-        with open(GAME_STATE_FILE, 'r') as f:
-            current_game.update(json.load(f))
-    except FileNotFoundError:
-        pass
+    question_bank.load()
+    game_backend.load()
+    if not game_backend.shared:
+        # The local store restores a snapshot instead of replaying events, so rebuild the ranking
+        leaderboard.reset(current_game['participants'], version=game_backend.seq)
+        game_analytics.rebuild(current_game, version=game_backend.seq)
+        for nickname, participant in current_game['participants'].items():
+            for submission in participant['submissions']:
+                index_submission(nickname, submission)
+    game_backend.start()
+    if game_backend.shared and not os.environ.get('SOCKETIO_MESSAGE_QUEUE'):
+        logger.warning("Shared game backend without SOCKETIO_MESSAGE_QUEUE: live updates only reach this worker's clients")
 
-def save_game_state():
-    with open(GAME_STATE_FILE, 'w') as f:
-        json.dump(current_game, f, indent=2)
+def record_game_event(event):
+    return game_backend.record(event)
 
-def validate_output(expected, actual):
-    # Convert literal "\n" in expected to actual newlines
-    if '\\n' in expected:
-        expected = expected.replace('\\n', '\n')
-    if expected == "variable":
-        return len(actual.strip()) > 0
-    return expected.strip() == actual.strip()
+@app.before_request
+def sync_game_state():
+    # Pick up events recorded by other workers before answering from the local replica
+    if request.path.startswith('/api/'):
+        game_backend.sync()
 
 @app.route('/')
 def index():
@@ -174,7 +459,24 @@ def index():
 
 @app.route('/static/<path:filename>')
 def static_files(filename):
-    return app.send_static_file(filename)
+    asset, immutable = assets.lookup(filename)
+    if asset is None:
+        # Added after startup: served as-is until the next restart fingerprints it
+        return send_from_directory(STATIC_DIR, filename)
+    
+    encoding = assets.negotiate(asset, request.accept_encodings)
+    etag = asset.etag(encoding)
+    not_modified = request.if_none_match.contains(etag.strip('"'))
+    assets.record(asset, encoding, not_modified)
+    
+    response = make_response(b'' if not_modified else asset.variants[encoding], 304 if not_modified else 200)
+    response.headers['Content-Type'] = asset.content_type
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE if immutable else REVALIDATE_CACHE
+    response.headers['Vary'] = 'Accept-Encoding'
+    if encoding != 'identity' and not not_modified:
+        response.headers['Content-Encoding'] = encoding
+    return response
 
 @app.route('/teacher')
 def teacher_panel():
@@ -209,54 +511,144 @@ def start_game():
         return jsonify({'error': 'Unauthorized'}), 401
     
     data = request.json
-    questions = data.get('questions', [])
     timer = data.get('timer', 0)
     
-    global current_game
-    current_game = {
-        'active': True,
-        'current_question': questions[0] if questions else None,
-        'question_index': 0,
-        'questions': questions,
-        'timer': timer,
-        'start_time': datetime.now().isoformat(),
-        'participants': {}
-    }
+    if 'question_ids' in data:
+        question_ids = [str(qid) for qid in data['question_ids']]
+        if not question_ids:
+            return jsonify({'error': 'Choose at least one question'}), 400
+        # Resolved before recording, outside the game lock, and carried in the event so applying
+        # it never builds; normally instant as reference outputs were computed on save
+        try:
+            questions = [question_bank.resolve(qid) for qid in question_ids]
+        except QuestionError as e:
+            return jsonify({'error': str(e)}), 400
+        except QueueFullError:
+            return jsonify({'error': 'Server is busy, please try again shortly'}), 503
+        event = {'type': 'start', 'question_ids': question_ids, 'questions': questions}
+    else:
+        # Inline questions with hand-typed outputs, as sent by older clients
+        event = {'type': 'start', 'questions': data.get('questions', [])}
     
-    save_game_state()
-    socketio.emit('game_started', {
-        'question': current_game['current_question'],
-        'timer': timer
-    }, namespace='/')
+    record_game_event(dict(event, timer=timer, start_time=datetime.now().isoformat()))
+    
+    broadcaster.send('game_started', dict(question_ref(), timer=timer), GAME_TARGETS)
     
     return jsonify({'success': True})
 
+@app.route('/api/questions')
+def list_questions():
+    if not session.get('is_teacher'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(question_bank.list())
+
+@app.route('/api/questions', methods=['POST'])
+def create_question():
+    if not session.get('is_teacher'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        return jsonify(question_bank.save(request.json or {}))
+    except QuestionError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/questions/import', methods=['POST'])
+def import_questions():
+    """Save several questions at once, optionally hiding every existing one first"""
+    if not session.get('is_teacher'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    data = request.json or {}
+    if data.get('replace'):
+        for question in question_bank.list():
+            question_bank.delete(question['id'])
+    saved, errors = [], []
+    for index, item in enumerate(data.get('questions', [])):
+        try:
+            saved.append(question_bank.save(item))
+        except QuestionError as e:
+            errors.append({'index': index, 'error': str(e)})
+    return jsonify({'questions': saved, 'errors': errors})
+
+@app.route('/api/questions/<question_id>', methods=['PUT'])
+def update_question(question_id):
+    if not session.get('is_teacher'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        return jsonify(question_bank.save(request.json or {}, question_id))
+    except QuestionError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/questions/<question_id>', methods=['DELETE'])
+def delete_question(question_id):
+    if not session.get('is_teacher'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    if not question_bank.delete(question_id):
+        return jsonify({'error': 'Unknown question'}), 404
+    return jsonify({'success': True})
+
 @app.route('/api/game/stop', methods=['POST'])
 def stop_game():
     if not session.get('is_teacher'):
         return jsonify({'error': 'Unauthorized'}), 401
     
-    global current_game
-    current_game['active'] = False
-    save_game_state()
-    socketio.emit('game_stopped', {}, namespace='/')
+    record_game_event({'type': 'stop'})
+    broadcaster.send('game_stopped', {}, GAME_TARGETS)
     return jsonify({'success': True})
 
+@app.route('/api/game/regrade', methods=['POST'])
+def regrade_game():
+    """Re-grade stored submissions against the questions as they are now in the bank"""
+    if not session.get('is_teacher'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    if not current_game['questions']:
+        return jsonify({'error': 'No game to re-grade'}), 400
+    
+    data = request.json or {}
+    question_indexes = data.get('question_indexes')
+    if question_indexes is not None:
+        try:
+            question_indexes = {int(index) for index in question_indexes}
+        except (TypeError, ValueError):
+            return jsonify({'error': 'question_indexes must be a list of numbers'}), 400
+    
+    def prepare():
+        if current_game.get('question_ids'):
+            # Resolve first, outside the game lock: a corrected reference solution is rebuilt here.
+            # The game already holds its questions, so one deleted since the start still resolves
+            questions = [question_bank.resolve(qid, allow_deleted=True) for qid in current_game['question_ids']]
+            record_game_event({'type': 'refresh_questions', 'questions': questions})
+        # From here on live submissions are graded against the refreshed questions
+        with game_lock:
+            return current_game['questions'], collect_submissions(current_game['participants'], question_indexes)
+    
+    def apply(changes):
+        if changes:
+            record_game_event({'type': 'regrade', 'changes': changes})
+    
+    try:
+        progress = regrader.start(prepare, apply)
+    except RegradeBusyError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify(progress), 202
+
+@app.route('/api/game/regrade', methods=['GET'])
+def regrade_status():
+    if not session.get('is_teacher'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(regrader.status() or {'state': 'idle'})
+
 @app.route('/api/game/next', methods=['POST'])
 def next_question():
     if not session.get('is_teacher'):
         return jsonify({'error': 'Unauthorized'}), 401
     
-    global current_game
     if current_game['active'] and current_game['question_index'] < len(current_game['questions']) - 1:
-        current_game['question_index'] += 1
-        current_game['current_question'] = current_game['questions'][current_game['question_index']]
-        save_game_state()
+        record_game_event({
+            'type': 'question',
+            'question_index': current_game['question_index'] + 1,
+            'timestamp': datetime.now().isoformat()
+        })
         
-        socketio.emit('new_question', {
-            'question': current_game['current_question'],
-            'question_index': current_game['question_index']
-        }, namespace='/')
+        broadcaster.send('new_question', question_ref(), GAME_TARGETS)
     
     return jsonify({'success': True, 'question': current_game['current_question']})
 
@@ -264,12 +656,29 @@ def next_question():
 def game_status():
     return jsonify({
         'active': current_game['active'],
-        'current_question': current_game['current_question'],
+        'current_question': public_question(current_game['current_question']),
         'question_index': current_game['question_index'],
         'total_questions': len(current_game['questions']),
+        'question_set': question_set_id(),
         'timer': current_game['timer']
     })
 
+@app.route('/api/game/questions/<question_set>/<int:index>')
+def game_question(question_set, index):
+    """One question of the current game; the URL names its content, so it is cached for good"""
+    questions = current_game['questions']
+    if question_set != question_set_id() or not 0 <= index < len(questions):
+        return jsonify({'error': 'Unknown question'}), 404
+    
+    etag = f'"{question_set}-{index}"'
+    if request.if_none_match.contains(etag.strip('"')):
+        response = make_response('', 304)
+    else:
+        response = jsonify(public_question(questions[index]))
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE
+    return response
+
 @app.route('/api/game/join', methods=['POST'])
 def join_game():
     data = request.json
@@ -278,40 +687,158 @@ def join_game():
     if not current_game['active']:
         return jsonify({'error': 'No active game'})
     
-    current_game['participants'][nickname] = {
-        'joined_at': datetime.now().isoformat(),
-        'current_score': 0,
-        'submissions': []
-    }
+    record_game_event({
+        'type': 'join',
+        'nickname': nickname,
+        'joined_at': datetime.now().isoformat()
+    })
     
-    save_game_state()
-    socketio.emit('participant_joined', {
+    broadcaster.publish('participants_joined', nickname, {
         'nickname': nickname,
         'participants_count': len(current_game['participants'])
-    }, namespace='/')
+    }, TEACHER_TARGETS)
     
-    return jsonify({'success': True, 'question': current_game['current_question']})
+    return jsonify({'success': True, 'question': public_question(current_game['current_question'])})
 
 @app.route('/api/leaderboard')
 def get_leaderboard():
     if not current_game['active']:
         return jsonify([])
     
-    leaderboard = []
-    for nickname, data in current_game['participants'].items():
-        leaderboard.append({
-            'nickname': nickname,
-            'score': data['current_score'],
-            'submissions': len(data['submissions'])
-        })
+    # Pollers revalidate with If-None-Match or ask only for what changed since their version
+    etag = leaderboard.etag()
+    if request.headers.get('If-None-Match') == etag:
+        return '', 304, {'ETag': etag}
     
-    leaderboard.sort(key=lambda x: -x['score'])
-    return jsonify(leaderboard)
+    since_version = request.args.get('since_version', type=int)
+    if since_version is not None:
+        deltas = leaderboard.deltas_since(since_version)
+        if deltas is not None:
+            version = deltas[-1]['version'] if deltas else since_version
+            response = jsonify({'version': version, 'deltas': deltas})
+        else:
+            version, entries = leaderboard.snapshot()
+            response = jsonify({'version': version, 'entries': entries})
+    else:
+        _, entries = leaderboard.snapshot()
+        response = jsonify(entries)
+    
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/leaderboard')
 def leaderboard_page():
     return render_template('leaderboard.html')
 
+@app.route('/api/compile-cache/stats')
+def compile_cache_stats():
+    if not session.get('is_teacher'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(compile_cache.stats())
+
+@app.route('/api/scheduler/stats')
+def scheduler_stats():
+    if not session.get('is_teacher'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(job_scheduler.stats())
+
+@app.route('/api/pty-loop/stats')
+def pty_loop_stats():
+    if not session.get('is_teacher'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(pty_loop.stats())
+
+@app.route('/api/game-store/stats')
+def game_store_stats():
+    if not session.get('is_teacher'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(game_backend.stats())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return registry.render_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.route('/api/teacher/metrics')
+def teacher_metrics():
+    if not session.get('is_teacher'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(registry.snapshot())
+
+@app.route('/api/assets/stats')
+def asset_stats():
+    if not session.get('is_teacher'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(assets.stats())
+
+@app.route('/api/verdict-cache/stats')
+def verdict_cache_stats():
+    if not session.get('is_teacher'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(verdict_cache.stats())
+
+@app.route('/api/syntax-check/stats')
+def syntax_check_stats():
+    if not session.get('is_teacher'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(syntax_checker.stats())
+
+@app.route('/api/slot-pool/stats')
+def slot_pool_stats():
+    if not session.get('is_teacher'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(slot_pool.stats())
+
+@app.route('/api/teacher/similarity')
+def submission_similarity():
+    """Most similar pairs of latest submissions to a question (the current one by default)"""
+    if not session.get('is_teacher'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    question_index = request.args.get('question', current_game['question_index'], type=int)
+    limit = min(request.args.get('limit', 20, type=int), 200)
+    min_score = request.args.get('min_score', 0.5, type=float)
+    return jsonify({
+        'question_index': question_index,
+        'pairs': similarity_index.top_pairs(question_index, limit, min_score),
+        'stats': similarity_index.stats()
+    })
+
+@app.route('/api/teacher/analytics')
+def teacher_analytics():
+    """Per-question solve rates, attempt and solve-time histograms, compile error rates"""
+    if not session.get('is_teacher'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    analytics = game_analytics.snapshot()
+    etag = f'"an-{analytics["version"]}"'
+    if request.headers.get('If-None-Match') == etag:
+        return '', 304, {'ETag': etag}
+    response = jsonify(analytics)
+    response.headers['ETag'] = etag
+    return response
+
+@app.route('/api/teacher/sources/<digest>')
+def submission_source(digest):
+    if not session.get('is_teacher'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    code = source_store.get(digest)
+    if code is None:
+        return jsonify({'error': 'Unknown source'}), 404
+    response = jsonify({'digest': digest, 'code': code})
+    response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+@app.route('/api/question-bank/stats')
+def question_bank_stats():
+    if not session.get('is_teacher'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(question_bank.stats())
+
+@app.route('/api/sandbox/stats')
+def sandbox_stats():
+    if not session.get('is_teacher'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(sandbox.stats())
+
 
 # Endpoint for student code submission in game mode
 @app.route('/api/game/submit', methods=['POST'])
@@ -324,355 +851,489 @@ def submit_answer():
     if nickname not in current_game['participants']:
         return jsonify({'error': 'Player not joined'}), 400
 
-    # Prepare temporary directory for compilation
-    temp_dir = tempfile.mkdtemp(dir=TEMP_DIR, prefix=f'submit_{nickname}_')
-    c_file = os.path.join(temp_dir, 'program.c')
-    exe_file = os.path.join(temp_dir, 'program')
-    try:
-        with open(c_file, 'w', encoding='utf-8') as f:
-            f.write(code)
-
-        # Compile
-        compile_result = subprocess.run(
-            ['gcc', '-Wall', '-Wextra', '-std=c99', '-O1', '-o', exe_file, c_file],
-            capture_output=True, text=True, timeout=COMPILE_TIMEOUT
-        )
-        if compile_result.returncode != 0:
-            shutil.rmtree(temp_dir)
-            return jsonify({
-                'correct': False,
-                'output': compile_result.stderr,
-                'error': 'compilation'
-            })
-
-        # Run and capture output
-        run_result = subprocess.run(
-            [exe_file],
-            capture_output=True, text=True, timeout=EXECUTION_TIMEOUT
-        )
-        actual_output = run_result.stdout
+    cases = question_cases(current_game['current_question'])
+    cache_key = VerdictCache.key(code, cases, GRADING_CONFIG)
+    cached = verdict_cache.get(cache_key)
+    if cached is not None:
+        VERDICT_CACHE_LOOKUPS.inc(result='hit')
+        compile_error, verdict = cached['compile_error'], cached['verdict']
+    else:
+        VERDICT_CACHE_LOOKUPS.inc(result='miss')
+        try:
+            compile_error, verdict = grade_submission(nickname, code, cases, cache_key)
+        except QueueFullError:
+            return jsonify({'error': 'Server is busy, please submit again shortly'}), 503
 
-        # Validate
-        expected = current_game['current_question'].get('expected_output', '')
-        is_correct = validate_output(expected, actual_output)
+    if verdict is None:
+        # Counted for the per-question compile error rate; it does not add to the submissions list
+        record_game_event({
+            'type': 'compile_error',
+            'nickname': nickname,
+            'question_index': current_game['question_index'],
+            'timestamp': datetime.now().isoformat()
+        })
+        return jsonify({
+            'correct': False,
+            'output': compile_error,
+            'error': 'compilation',
+            'cached': cached is not None
+        })
+    is_correct = verdict['correct']
 
-        # Update score and submissions
-        participant = current_game['participants'][nickname]
-        participant['submissions'].append({
+    # Update score and submissions; the source itself is stored once by content hash
+    record_game_event({
+        'type': 'submit',
+        'nickname': nickname,
+        'submission': {
             'question_index': current_game['question_index'],
             'timestamp': datetime.now().isoformat(),
-            'correct': is_correct
-        })
-        if is_correct:
-            participant['current_score'] += 1
+            'correct': is_correct,
+            'source': source_store.put(code)
+        }
+    })
+    participant = current_game['participants'][nickname]
 
-        save_game_state()
-        # Notify teacher panel
-        socketio.emit('score_updated', {
-            'nickname': nickname,
-            'score': participant['current_score']
-        }, namespace='/')
+    # Notify teacher panels, batched with other score changes
+    broadcaster.publish('scores_updated', nickname, {
+        'nickname': nickname,
+        'score': participant['current_score']
+    }, TEACHER_TARGETS)
 
-        return jsonify({
-            'correct': is_correct,
-            'output': actual_output,
-            'score': participant['current_score']
-        })
+    return jsonify({
+        'correct': is_correct,
+        'output': verdict['output'],
+        'cases': verdict['cases'],
+        'score': participant['current_score'],
+        'cached': cached is not None
+    })
+
+def build_and_grade(code, cases, source, prefix):
+    """Compile ``code`` and grade it in a scratch directory; runs on a build pool worker"""
+    temp_dir = tempfile.mkdtemp(dir=TEMP_DIR, prefix=prefix)
+    try:
+        # Compile (usually a cache hit from the run that triggered this submit)
+        compile_result = timed_compile(code, source)
+        if compile_result.returncode != 0:
+            return compile_result, None
+        exe_file = os.path.join(temp_dir, 'program')
+        compile_cache.link_into(compile_result, exe_file)
+
+        # Run every test case in parallel, stopping at the first failure
+        return compile_result, grader.grade(exe_file, cases, cwd=temp_dir)
     finally:
         shutil.rmtree(temp_dir, ignore_errors=True)
 
-def pty_reader(session_id, master_fd):
-    """Read PTY output and emit to client via SocketIO"""
-    logger.info(f"PTY reader started for session {session_id}")
-    
-    with session_lock:
-        session = active_sessions.get(session_id)
-    
-    if not session:
-        logger.error(f"No session found for PTY reader {session_id}")
-        return
-        
+def grade_submission(nickname, code, cases, cache_key):
+    """Compile and grade a submission, storing the result in the verdict cache.
+
+    Returns ``(compile_error, verdict)``: the compiler output and None when
+    the build fails, else None and the grader's verdict.
+    """
+    started = time.monotonic()
+    with SUBMIT_SECONDS.time():
+        compile_result, verdict = job_scheduler.run(
+            nickname, lambda: build_and_grade(code, cases, 'submit', f'submit_{nickname}_')
+        )
+    elapsed = time.monotonic() - started
+
+    if verdict is not None:
+        for case in verdict['cases']:
+            GRADE_CASES.inc(verdict=case['verdict'])
+    compile_error = compile_result.stderr if verdict is None else None
+    verdict_cache.put(cache_key, compile_error, verdict, elapsed)
+    return compile_error, verdict
+
+def regrade_source(code, cases):
+    """Verdict for a stored source against corrected cases; already inside a build pool job"""
+    cache_key = VerdictCache.key(code, cases, GRADING_CONFIG)
+    cached = verdict_cache.get(cache_key)
+    if cached is not None:
+        return cached['verdict']
+    started = time.monotonic()
+    compile_result, verdict = build_and_grade(code, cases, 'regrade', 'regrade_')
+    compile_error = compile_result.stderr if verdict is None else None
+    verdict_cache.put(cache_key, compile_error, verdict, time.monotonic() - started)
+    return verdict
+
+# Bulk re-grades of stored sources after a question is corrected; progress goes to teacher panels
+regrader = Regrader(
+    job_scheduler, regrade_source, source_store.get,
+    on_progress=lambda progress: broadcaster.publish('regrade_progress', progress['id'], progress, TEACHER_TARGETS)
+)
+
+def kill_process_group(process):
+    """SIGKILL a program and any children it spawned"""
     try:
-        while session.active:
-            try:
-                # Non-blocking read with select
-                r, _, _ = select.select([master_fd], [], [], 0.1)
-                
-                if master_fd in r:
-                    data = os.read(master_fd, 8192)
-                    if data:
-                        try:
-                            decoded_data = data.decode('utf-8', errors='replace')
-                            socketio.emit('pty-output', decoded_data, namespace='/pty', room=session_id)
-                        except Exception as e:
-                            logger.warning(f"Decode error for session {session_id}: {e}")
-                    else:
-                        logger.info(f"PTY EOF for session {session_id}")
-                        break
-                        
-            except OSError as e:
-                if e.errno == 5:  # Input/output error indicates PTY closed
-                    logger.info(f"PTY closed for session {session_id}")
-                    break
-                else:
-                    logger.error(f"PTY read error for session {session_id}: {e}")
-                    break
-            except Exception as e:
-                logger.error(f"Unexpected PTY error for session {session_id}: {e}")
-                break
-                
+        if process and process.poll() is None:
+            os.killpg(os.getpgid(process.pid), signal.SIGKILL)
     except Exception as e:
-        logger.error(f"PTY reader exception for session {session_id}: {e}")
-    finally:
-        logger.info(f"PTY reader ended for session {session_id}")
+        logger.error(f"Error killing process group: {e}")
+
+def terminate_process_group(process, grace=0.5):
+    """SIGTERM a program's process group and SIGKILL it after ``grace`` seconds, without blocking"""
+    if process.poll() is not None:
+        return
+    pgid = os.getpgid(process.pid)
+    os.killpg(pgid, signal.SIGTERM)
 
-def process_monitor(session_id):
-    """Monitor process execution and handle timeouts"""
-    logger.info(f"Process monitor started for session {session_id}")
+    def escalate():
+        if process.poll() is None:
+            try:
+                os.killpg(pgid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+    pty_loop.call_later(grace, escalate)
+
+def send_pty_frame(session, text, ack):
+    """Emit one batched output frame; the client acks it once rendered"""
+    PTY_FRAMES.inc()
+    PTY_BYTES.inc(len(text))
+    with EMIT_SECONDS.time():
+        session.write(text, callback=ack)
+
+def on_program_exit(session_id, return_code, timed_out):
+    """Report how the program ended and release the session; runs on the PTY event loop thread"""
+    logger.info(f"Program ended for session {session_id} (code {return_code}, timed out: {timed_out})")
     
     with session_lock:
         session = active_sessions.get(session_id)
-    
-    if not session or not session.process:
-        logger.error(f"No process to monitor for session {session_id}")
+    if session is None:
         return
+    if session.output:
+        session.output.close()
+    usage = getattr(session.process, 'usage', None)
     
-    try:
-        return_code = session.process.wait(timeout=EXECUTION_TIMEOUT)
-        time.sleep(0.5)  # Brief delay to ensure all output is captured
-        
-        if return_code == 0:
-            socketio.emit('pty-output', f'\nProgram completed successfully (exit code: {return_code})\n',
-                        namespace='/pty', room=session_id)
-        else:
-            socketio.emit('pty-output', f'\nProgram exited with code: {return_code}\n',
-                        namespace='/pty', room=session_id)
-                        
-    except subprocess.TimeoutExpired:
-        logger.warning(f"Process timeout for session {session_id}")
-        socketio.emit('pty-output', f'\nProgram execution timed out ({EXECUTION_TIMEOUT}s limit)\n',
-                    namespace='/pty', room=session_id)
-        
-        # Force kill the process group
-        try:
-            if session.process and session.process.poll() is None:
-                pgid = os.getpgid(session.process.pid)
-                os.killpg(pgid, signal.SIGKILL)
-        except Exception as e:
-            logger.error(f"Error killing timed out process: {e}")
-            
-    except Exception as e:
-        logger.error(f"Process monitor error for session {session_id}: {e}")
-        socketio.emit('pty-output', f'\nMonitor error: {str(e)}\n',
-                    namespace='/pty', room=session_id)
-    finally:
-        socketio.emit('pty-output', '-' * 50 + '\n', namespace='/pty', room=session_id)
-        time.sleep(0.1)
-        
-        # Clean up session when process ends
-        with session_lock:
-            if session_id in active_sessions:
-                active_sessions[session_id].cleanup()
-        
-        logger.info(f"Process monitor ended for session {session_id}")
+    if timed_out:
+        PROGRAM_EXITS.inc(status='timeout')
+    elif return_code is not None and return_code < 0:
+        PROGRAM_EXITS.inc(status='signal')
+    else:
+        PROGRAM_EXITS.inc(status='ok' if return_code == 0 else 'error')
+    if usage:
+        PROGRAM_WALL_SECONDS.observe(usage['wall_time'])
+        PROGRAM_CPU_SECONDS.observe(usage['cpu_time'])
+    
+    if timed_out:
+        session.write(f'\nProgram execution timed out ({EXECUTION_TIMEOUT}s limit)\n')
+    elif return_code == 0:
+        session.write(f'\nProgram completed successfully (exit code: {return_code})\n')
+    else:
+        session.write(f'\nProgram exited with code: {return_code}\n')
+    if usage:
+        session.write(
+            f"CPU time: {usage['cpu_time']:.2f}s, peak memory: {usage['peak_rss_kb'] / 1024:.1f} MB, "
+            f"wall time: {usage['wall_time']:.2f}s\n"
+        )
+        socketio.emit('run-stats', dict(usage, returncode=return_code, timed_out=timed_out),
+                      namespace='/pty', room=session_id)
+    session.write('-' * 50 + '\n')
+    
+    # Release the program's resources; the session itself stays open for more runs
+    session.cleanup()
+
+@socketio.on('join_leaderboard')
+def handle_join_leaderboard():
+    """Subscribe a leaderboard viewer to deltas, starting from a full snapshot"""
+    join_room(LEADERBOARD_ROOM)
+    game_backend.sync()
+    version, entries = leaderboard.snapshot()
+    emit('leaderboard_snapshot', {
+        'version': version,
+        'entries': entries if current_game['active'] else []
+    })
+
+@socketio.on('subscribe')
+def handle_subscribe(message):
+    """Teacher panels opt in to batched join and score notifications"""
+    room = (message or {}).get('room')
+    if room == TEACHERS_ROOM and session.get('is_teacher'):
+        join_room(TEACHERS_ROOM)
+        return True
+    return False
+
+def current_pty_session():
+    """Terminal session the requesting socket is attached to"""
+    with session_lock:
+        return active_sessions.get(pty_sids.get(request.sid))
 
 @socketio.on('connect', namespace='/pty')
-def handle_pty_connect():
-    session_id = request.sid
-    logger.info(f"PTY client connected: {session_id}")
+def handle_pty_connect(auth=None):
+    sid = request.sid
+    auth = auth if isinstance(auth, dict) else {}
+    token = auth.get('token')
+    logger.info(f"PTY client connected: {sid}")
     
-    # Enforce session limit to prevent resource exhaustion
-    if len(active_sessions) >= MAX_SESSIONS:
-        emit('pty-output', f'Server at capacity ({MAX_SESSIONS} sessions). Try again later.\n')
+    with session_lock:
+        session = active_sessions.get(token) if token and PTY_RESUME_GRACE > 0 else None
+        resumed = session is not None
+        previous_sid = None
+        if resumed:
+            # Resume: the old socket may not have timed out yet, the new one takes over
+            previous_sid = session.sid
+            if previous_sid is not None:
+                pty_sids.pop(previous_sid, None)
+            session.sid = sid
+            session.detached_at = None
+        else:
+            # Enforce session limit to prevent resource exhaustion
+            at_capacity = len(active_sessions) >= MAX_SESSIONS
+            if not at_capacity:
+                token = secrets.token_urlsafe(16)
+                session = active_sessions[token] = PTYSession(token, sid)
+        if session is not None:
+            pty_sids[sid] = token
+    
+    if session is None:
+        emit('pty-notice', f'Server at capacity ({MAX_SESSIONS} sessions). Try again later.\n')
         disconnect()
         return
+    join_room(PARTICIPANTS_ROOM)
     
-    with session_lock:
-        # Clean up any existing session with same ID
-        if session_id in active_sessions:
-            active_sessions[session_id].cleanup()
-            del active_sessions[session_id]
-        
-        active_sessions[session_id] = PTYSession(session_id)
+    if not resumed:
+        PTY_RESUMES.inc(outcome='expired' if auth.get('token') else 'new')
+        emit('pty-session', {'token': token, 'resumed': False})
+        join_room(token)
+        session.write('Connected to C Programming Environment!\n')
+        session.write('Write your C code and click "Run Code" to execute it!\n')
+        session.write('Interactive input (scanf) is fully supported.\n')
+        session.write('-' * 50 + '\n')
+        return
+    
+    if previous_sid is not None and previous_sid != sid:
+        leave_room(token, sid=previous_sid, namespace='/pty')
+        disconnect(previous_sid, namespace='/pty')
     
-    join_room(session_id)
+    # How much output the client already has; anything else gets it a full redraw
+    offset = auth.get('offset')
+    if isinstance(offset, bool) or not isinstance(offset, int) or offset < 0:
+        offset = None
     
-    emit('pty-output', 'Connected to C Programming Environment!\n')
-    emit('pty-output', 'Write your C code and click "Run Code" to execute it!\n')
-    emit('pty-output', 'Interactive input (scanf) is fully supported.\n')
-    emit('pty-output', '-' * 50 + '\n')
+    # Replay what the client missed; holding the output lock keeps live frames behind the replay
+    with session.output_lock:
+        join_room(token)
+        text, reset = session.scrollback.since(offset)
+        emit('pty-session', {'token': token, 'resumed': True})
+        emit('pty-replay', {
+            'text': text,
+            'reset': reset,
+            'offset': session.scrollback.end,
+            'running': session.active
+        })
+    PTY_RESUMES.inc(outcome='replayed' if reset else 'resumed')
+    logger.info(f"PTY session resumed by {sid} ({len(text)} chars replayed, reset: {reset})")
 
 @socketio.on('disconnect', namespace='/pty')
 def handle_pty_disconnect():
-    session_id = request.sid
-    logger.info(f"PTY client disconnected: {session_id}")
+    sid = request.sid
+    logger.info(f"PTY client disconnected: {sid}")
     
-    leave_room(session_id)
+    with session_lock:
+        token = pty_sids.pop(sid, None)
+        session = active_sessions.get(token)
+        if session is None or session.sid != sid:
+            return  # Already taken over by a newer connection
+        leave_room(token)
+        session.sid = None
+        session.detached_at = detached_at = time.monotonic()
+        if PTY_RESUME_GRACE <= 0:
+            del active_sessions[token]
     
+    if PTY_RESUME_GRACE <= 0:
+        syntax_checker.forget(token)
+        session.cleanup()
+    else:
+        # Keep the program running for a while in case the client comes back
+        pty_loop.call_later(PTY_RESUME_GRACE, lambda: expire_pty_session(token, detached_at))
+
+def expire_pty_session(token, detached_at):
+    """Close a session whose client did not come back within the grace period"""
     with session_lock:
-        if session_id in active_sessions:
-            active_sessions[session_id].cleanup()
-            del active_sessions[session_id]
+        session = active_sessions.get(token)
+        if session is None or session.sid is not None or session.detached_at != detached_at:
+            return
+        del active_sessions[token]
+    logger.info(f"PTY session {token} expired after disconnect")
+    syntax_checker.forget(token)
+    session.cleanup()
 
 @socketio.on('run', namespace='/pty')
 def handle_run(message):
     """Compile and execute C code in isolated environment"""
-    session_id = request.sid
-    
-    with session_lock:
-        session = active_sessions.get(session_id)
+    session = current_pty_session()
     
     if not session:
-        emit('pty-output', 'Session not found. Please refresh the page.\n')
+        emit('pty-notice', 'Session not found. Please refresh the page.\n')
         return
+    session_id = session.session_id
     
     code = message.get('code', '').strip()
     
     if not code:
-        emit('pty-output', 'No code provided\n')
+        session.write('No code provided\n')
         return
     
     # Clean up any previous execution
     session.cleanup()
     
     try:
-        # Create isolated temporary directory for this execution
-        session.temp_dir = tempfile.mkdtemp(dir=TEMP_DIR, prefix=f'session_{session_id}_')
-        c_file = os.path.join(session.temp_dir, 'program.c')
-        exe_file = os.path.join(session.temp_dir, 'program')
-        
-        with open(c_file, 'w', encoding='utf-8') as f:
-            f.write(code)
+        session.write('Compiling your code...\n')
         
-        emit('pty-output', 'Compiling your code...\n')
-        
-        # Compile with warnings enabled for better learning
-        compile_result = subprocess.run(
-            ['gcc', '-Wall', '-Wextra', '-std=c99', '-g', '-O1', '-o', exe_file, c_file],
-            capture_output=True,
-            text=True,
-            timeout=COMPILE_TIMEOUT,
-            cwd=session.temp_dir
-        )
+        # Compile with warnings enabled for better learning; identical sources share one build.
+        # The build pool bounds concurrent gcc processes and reports our place in line.
+        def report_position(position, eta):
+            socketio.emit('queue-status', {'position': position, 'eta': eta},
+                          namespace='/pty', room=session_id)
+
+        owner = message.get('nickname') or session_id
+        try:
+            compile_result = job_scheduler.run(
+                owner,
+                lambda: timed_compile(code, 'run'),
+                report_position
+            )
+        except QueueFullError:
+            session.write('Server is busy compiling other programs. Please try again in a moment.\n')
+            session.write('-' * 50 + '\n')
+            return
         
         if compile_result.returncode != 0:
-            emit('pty-output', 'Compilation failed:\n')
-            emit('pty-output', compile_result.stderr)
-            emit('pty-output', '\nCheck your syntax and try again.\n')
-            emit('pty-output', '-' * 50 + '\n')
+            session.write('Compilation failed:\n')
+            session.write(compile_result.stderr)
+            session.write('\nCheck your syntax and try again.\n')
+            session.write('-' * 50 + '\n')
             return
         
         # Show warnings if any (non-blocking)
         if compile_result.stderr.strip():
-            emit('pty-output', 'Compilation warnings:\n')
-            emit('pty-output', compile_result.stderr)
-            emit('pty-output', '\n')
+            session.write('Compilation warnings:\n')
+            session.write(compile_result.stderr)
+            session.write('\n')
         
-        emit('pty-output', 'Compilation successful!\n')
-        emit('pty-output', 'Running your program...\n')
+        session.write('Compilation successful!\n')
+        session.write('Running your program...\n')
         
         # Detect interactive input requirements
         if 'scanf' in code or 'gets' in code or 'getchar' in code:
-            emit('pty-output', 'Input handling ready - type in the input field when prompted.\n')
-        
-        emit('pty-output', '-' * 50 + '\n')
+            session.write('Input handling ready - type in the input field when prompted.\n')
         
-        # Create PTY for interactive I/O
-        master, slave = pty.openpty()
+        session.write('-' * 50 + '\n')
         
-        session.master_fd = master
+        # Check out a ready work directory and PTY pair for interactive I/O
+        slot = slot_pool.acquire()
+        session.slot = slot
+        session.master_fd = slot.master_fd
         session.active = True
+        exe_file = os.path.join(slot.work_dir, 'program')
+        compile_cache.link_into(compile_result, exe_file)
         
-        # Start process in new process group for clean termination
-        session.process = subprocess.Popen(
-            [exe_file],
-            stdin=slave,
-            stdout=slave,
-            stderr=slave,
-            preexec_fn=os.setsid,  # Create new process group
-            cwd=session.temp_dir
-        )
+        # Start process in its own session and process group, under the sandbox limits
+        session.process = sandbox.spawn([exe_file], slot.work_dir, slot.slave_fd, slot.slave_fd, slot.slave_fd)
         
-        os.close(slave)  # Close slave end in parent process
+        slot.close_slave()  # Close slave end in parent process
         
-        # Start background threads for I/O handling
-        session.reader_thread = threading.Thread(
-            target=pty_reader,
-            args=(session_id, master),
-            daemon=True
+        # Batch output into acked frames and stop runaway printers at the byte budget
+        process = session.process
+        session.output = OutputPipeline(
+            pty_loop, session_id,
+            send=lambda text, ack: send_pty_frame(session, text, ack),
+            on_budget_exceeded=lambda: kill_process_group(process),
+            flush_interval=OUTPUT_FLUSH_MS / 1000,
+            flush_bytes=OUTPUT_FLUSH_BYTES,
+            byte_budget=OUTPUT_MAX_BYTES,
+            max_unacked=OUTPUT_MAX_UNACKED
         )
-        session.reader_thread.start()
         
-        session.monitor_thread = threading.Thread(
-            target=process_monitor,
-            args=(session_id,),
-            daemon=True
+        # Hand the PTY and child to the shared event loop for output and exit handling
+        pty_loop.add_session(
+            session_id, slot.master_fd, session.process,
+            on_output=session.output.feed,
+            on_exit=lambda return_code, timed_out: on_program_exit(session_id, return_code, timed_out),
+            timeout=EXECUTION_TIMEOUT
         )
-        session.monitor_thread.start()
         
     except subprocess.TimeoutExpired:
-        emit('pty-output', f'Compilation timed out ({COMPILE_TIMEOUT}s limit)\n')
-        emit('pty-output', '-' * 50 + '\n')
+        session.write(f'Compilation timed out ({COMPILE_TIMEOUT}s limit)\n')
+        session.write('-' * 50 + '\n')
     except Exception as e:
-        emit('pty-output', f'Execution error: {str(e)}\n')
-        emit('pty-output', '-' * 50 + '\n')
+        session.write(f'Execution error: {str(e)}\n')
+        session.write('-' * 50 + '\n')
         logger.error(f"Run handler error for session {session_id}: {e}")
+        session.cleanup()
+
+@socketio.on('syntax-check', namespace='/pty')
+def handle_syntax_check(message):
+    """Report gcc diagnostics for the editor contents as they are typed.
+
+    The client debounces edits and numbers its requests; the reply carries
+    the same id, and a check overtaken by a newer one sends nothing. A
+    deferred or timed-out check says so, and the client asks again later.
+    """
+    session = current_pty_session()
+    if not session or not isinstance(message, dict):
+        return
+    code = message.get('code', '')
+    if not isinstance(code, str) or len(code) > 64 * 1024:
+        return
+    request_id = message.get('id')
+    
+    try:
+        result = syntax_checker.check(session.session_id, request_id, code)
+    except Exception as e:
+        logger.error(f"Syntax check error for session {session.session_id}: {e}")
+        SYNTAX_CHECKS.inc(result='error')
+        return
+    if result is None:
+        SYNTAX_CHECKS.inc(result='superseded')
+        return
+    SYNTAX_CHECKS.inc(result='cached' if result['cached'] else result['status'])
+    socketio.emit('diagnostics', dict(result, id=request_id), namespace='/pty', room=session.session_id)
 
 @socketio.on('input', namespace='/pty')
 def handle_input(message):
     """Send user input to running C program via PTY"""
-    session_id = request.sid
-    
-    with session_lock:
-        session = active_sessions.get(session_id)
+    session = current_pty_session()
     
     if not session or not session.master_fd or not session.active:
-        emit('pty-output', 'No active program to send input to\n')
+        if session:
+            session.write('No active program to send input to\n')
+        else:
+            emit('pty-notice', 'Session not found. Please refresh the page.\n')
         return
+    session_id = session.session_id
     
     data = message.get('data', '')
-    logger.info(f"Session {session_id} sending input: {repr(data)}")
-    
     try:
         bytes_written = os.write(session.master_fd, data.encode('utf-8'))
-        logger.info(f"Successfully sent {bytes_written} bytes to session {session_id}")
+        logger.debug(f"Sent {bytes_written} bytes of input to session {session_id}", extra={'category': 'pty.input'})
     except OSError as e:
         logger.error(f"OSError sending input to session {session_id}: {e}")
-        emit('pty-output', 'Failed to send input - program may have terminated\n')
+        session.write('Failed to send input - program may have terminated\n')
         session.cleanup()
     except Exception as e:
         logger.error(f"Input error for session {session_id}: {e}")
-        emit('pty-output', f'Input error: {str(e)}\n')
+        session.write(f'Input error: {str(e)}\n')
 
 @socketio.on('kill', namespace='/pty')
 def handle_kill():
     """Forcefully terminate running program"""
-    session_id = request.sid
-    
-    with session_lock:
-        session = active_sessions.get(session_id)
+    session = current_pty_session()
     
     if session and session.process:
         try:
-            emit('pty-output', '\nTerminating program...\n')
-            # Kill entire process group to handle child processes
-            pgid = os.getpgid(session.process.pid)
-            os.killpg(pgid, signal.SIGTERM)
-            time.sleep(0.5)
-            
-            # Force kill if still running
-            if session.process.poll() is None:
-                os.killpg(pgid, signal.SIGKILL)
-                
-            emit('pty-output', 'Program terminated\n')
-            emit('pty-output', '-' * 50 + '\n')
+            session.write('\nTerminating program...\n')
+            # Kill entire process group to handle child processes (SIGKILL follows if needed)
+            terminate_process_group(session.process)
+            session.write('Program terminated\n')
+            session.write('-' * 50 + '\n')
         except Exception as e:
-            emit('pty-output', f'\nFailed to terminate: {str(e)}\n')
-            emit('pty-output', '-' * 50 + '\n')
+            session.write(f'\nFailed to terminate: {str(e)}\n')
+            session.write('-' * 50 + '\n')
         finally:
             session.cleanup()
+    elif session:
+        session.write('No running program to terminate\n')
     else:
-        emit('pty-output', 'No running program to terminate\n')
+        emit('pty-notice', 'Session not found. Please refresh the page.\n')
 
 @app.errorhandler(404)
 def not_found_error(error):
@@ -689,8 +1350,13 @@ def cleanup_all_sessions():
     logger.info("Cleaning up all sessions...")
     with session_lock:
         for session in active_sessions.values():
+            # The reaper is a daemon thread that will not outlive us, so kill programs here
+            kill_process_group(session.process)
             session.cleanup()
         active_sessions.clear()
+    killed = slot_pool.shutdown()
+    if killed:
+        logger.info(f"Killed {killed} programs still awaiting the slot reaper")
     
     # Clean up orphaned temp directories
     try:
@@ -705,12 +1371,15 @@ def cleanup_all_sessions():
 
 # Register cleanup to run on process exit
 atexit.register(cleanup_all_sessions)
+atexit.register(game_backend.close)
 
 if __name__ == '__main__':
     # Load persistent game state on startup
     load_game_state()
+    sandbox.start()
+    slot_pool.start()
     logger.info("Starting Enhanced C Programming Practice Server...")
-    logger.info("Threading-mode SocketIO enabled for Docker compatibility")
+    logger.info(f"SocketIO async mode: {socketio.async_mode}")
     logger.info("Game functionality enabled")
     logger.info("Enhanced resource management")
     logger.info("-" * 50)
@@ -722,7 +1391,9 @@ if __name__ == '__main__':
             host='0.0.0.0',  # Accept connections from any IP
             port=5000,
             debug=False,     # Disable debug mode for production
-            use_reloader=False  # Prevent duplicate processes
+            use_reloader=False,  # Prevent duplicate processes
+            # Threading mode is served by Werkzeug; eventlet mode uses eventlet's own WSGI server
+            **({'allow_unsafe_werkzeug': True} if socketio.async_mode == 'threading' else {})
         )
     except KeyboardInterrupt:
         logger.info("\nServer shutting down...")
@@ -0,0 +1,144 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Long-lived caching is safe for fingerprinted names: new content gets a new URL
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+# Preference when the client accepts several encodings equally
+ENCODING_PREFERENCE = ('br', 'gzip')
+
+
+class Asset:
+    def __init__(self, name, content_type, digest):
+        self.name = name
+        self.content_type = content_type
+        self.digest = digest
+        stem, ext = os.path.splitext(name)
+        self.hashed_name = f'{stem}.{digest[:12]}{ext}'
+        self.variants = {}  # encoding ('identity', 'gzip', 'br') -> bytes
+
+    def etag(self, encoding):
+        return f'"{self.digest[:20]}-{encoding}"'
+
+    def sizes(self):
+        return {encoding: len(body) for encoding, body in self.variants.items()}
+
+
+class AssetPipeline:
+    """Content-hashed, precompressed copies of everything in the static folder.
+
+    Built once at startup: each file gets a fingerprinted name
+    (``app.3f2a9c1d0b4e.js``) plus gzip and, when the ``brotli`` package is
+    installed, brotli variants kept only if they are smaller. Templates link
+    through ``url()``; fingerprinted URLs are served as immutable, plain
+    names still work but must revalidate. Every response carries an ETag
+    for its encoding and honours If-None-Match.
+    """
+
+    def __init__(self, static_dir, url_prefix='/static', min_compress_bytes=256):
+        self.static_dir = static_dir
+        self.url_prefix = url_prefix.rstrip('/')
+        self.min_compress_bytes = min_compress_bytes
+        self.assets = {}   # plain name -> Asset
+        self.by_hash = {}  # fingerprinted name -> Asset
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self.bytes_saved = 0
+
+    def build(self):
+        assets = {}
+        for root, _, files in os.walk(self.static_dir):
+            for filename in sorted(files):
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.static_dir).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    assets[name] = self._build_asset(name, f.read())
+        self.assets = assets
+        self.by_hash = {asset.hashed_name: asset for asset in assets.values()}
+
+        identity = sum(len(asset.variants['identity']) for asset in assets.values())
+        best = sum(min(asset.sizes().values()) for asset in assets.values())
+        logger.info(
+            f"Static assets built: {len(assets)} files, {identity // 1024} KB -> {best // 1024} KB compressed"
+            f"{'' if brotli else ' (brotli unavailable, gzip only)'}"
+        )
+
+    def _build_asset(self, name, data):
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if content_type.startswith('text/'):
+            content_type += '; charset=utf-8'
+        asset = Asset(name, content_type, hashlib.sha256(data).hexdigest())
+        asset.variants['identity'] = data
+
+        if len(data) >= self.min_compress_bytes and content_type.startswith(COMPRESSIBLE_TYPES):
+            compressed = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                compressed['br'] = brotli.compress(data, quality=11)
+            for encoding, body in compressed.items():
+                if len(body) < len(data):
+                    asset.variants[encoding] = body
+        return asset
+
+    def url(self, name):
+        """URL for a static file, fingerprinted when it is known"""
+        asset = self.assets.get(name)
+        return f'{self.url_prefix}/{asset.hashed_name if asset else name}'
+
+    def lookup(self, filename):
+        """``(asset, immutable)`` for a requested file name, or ``(None, False)``"""
+        asset = self.by_hash.get(filename)
+        if asset is not None:
+            return asset, True
+        return self.assets.get(filename), False
+
+    def negotiate(self, asset, accept_encodings):
+        """Best encoding of ``asset`` the client accepts (werkzeug's request.accept_encodings)"""
+        candidates = [
+            encoding for encoding in ENCODING_PREFERENCE
+            if encoding in asset.variants and accept_encodings[encoding] > 0
+        ]
+        if not candidates:
+            return 'identity'
+        # Highest quality wins, ties go to the smaller variant
+        return max(candidates, key=lambda encoding: (accept_encodings[encoding], -len(asset.variants[encoding])))
+
+    def record(self, asset, encoding, not_modified):
+        self.requests += 1
+        if not_modified:
+            self.not_modified += 1
+            return
+        sent = len(asset.variants[encoding])
+        self.bytes_sent += sent
+        self.bytes_saved += len(asset.variants['identity']) - sent
+
+    def stats(self):
+        files = {}
+        for name, asset in sorted(self.assets.items()):
+            sizes = asset.sizes()
+            identity = sizes['identity']
+            best = min(sizes.values())
+            files[name] = {
+                'url': self.url(name),
+                'sizes': sizes,
+                'saved_percent': round(100 * (identity - best) / identity, 1) if identity else 0.0
+            }
+        return {
+            'brotli_available': brotli is not None,
+            'files': files,
+            'requests': self.requests,
+            'not_modified': self.not_modified,
+            'bytes_sent': self.bytes_sent,
+            'bytes_saved': self.bytes_saved
+        }
@@ -0,0 +1,62 @@
+import logging
+import threading
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_EVENTS = registry.counter('broadcast_events_total', 'Game notifications published, by event', ('event',))
+BROADCAST_FRAMES = registry.counter('broadcast_frames_total', 'Socket.IO frames emitted for game notifications, by event', ('event',))
+
+
+class Broadcaster:
+    """Room-targeted fan-out of game notifications, with coalescing for chatty ones.
+
+    ``targets`` are ``(namespace, [rooms])`` pairs, so a notification only
+    reaches the clients that asked for it. ``send()`` emits right away;
+    ``publish()`` queues an item under a key and, at most every
+    ``interval`` seconds, emits one ``{'items': [...]}`` frame per event
+    holding the latest item for each key. A burst of 100 joins costs each
+    subscriber a handful of frames instead of 100 messages.
+    """
+
+    def __init__(self, socketio, interval=0.25):
+        self.socketio = socketio
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.pending = {}  # (event, targets) -> {key: item}
+        self.flush_scheduled = False
+
+    def send(self, event, payload, targets):
+        BROADCAST_EVENTS.inc(event=event)
+        self._emit(event, payload, targets)
+
+    def publish(self, event, key, item, targets):
+        BROADCAST_EVENTS.inc(event=event)
+        targets = tuple((namespace, tuple(rooms)) for namespace, rooms in targets)
+        with self.lock:
+            self.pending.setdefault((event, targets), {})[key] = item
+            if self.flush_scheduled:
+                return
+            self.flush_scheduled = True
+        self.socketio.start_background_task(self._flush_later)
+
+    def _flush_later(self):
+        self.socketio.sleep(self.interval)
+        self.flush()
+
+    def flush(self):
+        """Emit everything queued by ``publish()``"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.flush_scheduled = False
+        for (event, targets), items in pending.items():
+            self._emit(event, {'items': list(items.values())}, targets)
+
+    def _emit(self, event, payload, targets):
+        for namespace, rooms in targets:
+            BROADCAST_FRAMES.inc(event=event)
+            try:
+                self.socketio.emit(event, payload, namespace=namespace, to=list(rooms))
+            except Exception as e:
+                logger.error(f"Broadcast of {event} to {namespace} {list(rooms)} failed: {e}")
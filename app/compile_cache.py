@@ -0,0 +1,307 @@
+import errno
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Staging dirs older than this belong to a compile that died; younger ones may be another worker's
+STALE_STAGING_SECONDS = 3600
+
+
+class CompileResult:
+    """Outcome of a (possibly cached) gcc invocation"""
+
+    def __init__(self, key, returncode, stderr, exe_path=None, cached=False):
+        self.key = key
+        self.returncode = returncode
+        self.stderr = stderr
+        self.exe_path = exe_path
+        self.cached = cached
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+
+class CompileCache:
+    """Content-addressed store of gcc binaries and diagnostics.
+
+    Entries are keyed by a hash of the source, the compiler flags and the
+    gcc version, live on disk under ``root`` and are evicted least recently
+    used first once the total size exceeds ``max_bytes``. Concurrent requests
+    for the same key share a single compilation. Builds are published with a
+    single rename, so workers sharing ``root`` never see a partial entry, and
+    one that loses the race to publish uses the entry that won.
+    """
+
+    META_FILE = 'meta.json'
+    EXE_FILE = 'program'
+
+    def __init__(self, root, max_bytes=256 * 1024 * 1024, compiler='gcc'):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.compiler = compiler
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> size in bytes, oldest first
+        self.total_bytes = 0
+        self.inflight = {}  # key -> threading.Event for single-flight compiles
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._compiler_id = None
+
+        os.makedirs(self.root, exist_ok=True)
+        self._load_index()
+
+    def _compiler_identity(self):
+        """Version string folded into every key so a toolchain upgrade invalidates the cache"""
+        if self._compiler_id is None:
+            try:
+                version = subprocess.run(
+                    [self.compiler, '--version'],
+                    capture_output=True, text=True, timeout=10
+                ).stdout.splitlines()
+                machine = subprocess.run(
+                    [self.compiler, '-dumpmachine'],
+                    capture_output=True, text=True, timeout=10
+                ).stdout.strip()
+                self._compiler_id = f"{version[0] if version else self.compiler} {machine}"
+            except Exception as e:
+                logger.warning(f"Could not determine compiler version: {e}")
+                self._compiler_id = self.compiler
+        return self._compiler_id
+
+    def make_key(self, source, flags):
+        digest = hashlib.sha256()
+        digest.update(self._compiler_identity().encode('utf-8'))
+        digest.update(b'\0')
+        digest.update('\x1f'.join(flags).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(source.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _load_index(self):
+        """Rebuild the in-memory LRU index from entries already on disk"""
+        found = []
+        for prefix in os.listdir(self.root):
+            prefix_dir = os.path.join(self.root, prefix)
+            if prefix.startswith('.') or not os.path.isdir(prefix_dir):
+                continue
+            for key in os.listdir(prefix_dir):
+                entry_dir = os.path.join(prefix_dir, key)
+                meta_file = os.path.join(entry_dir, self.META_FILE)
+                if not os.path.exists(meta_file):
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                    continue
+                size = self._dir_size(entry_dir)
+                found.append((os.path.getmtime(meta_file), key, size))
+
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total_bytes += size
+
+        # Leftover staging directories from an interrupted compile
+        staging_root = os.path.join(self.root, '.staging')
+        if os.path.isdir(staging_root):
+            cutoff = time.time() - STALE_STAGING_SECONDS
+            for name in os.listdir(staging_root):
+                path = os.path.join(staging_root, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        shutil.rmtree(path, ignore_errors=True)
+                except OSError:
+                    pass
+        logger.info(f"Compile cache loaded {len(self.entries)} entries ({self.total_bytes} bytes)")
+
+    @staticmethod
+    def _dir_size(path):
+        total = 0
+        for name in os.listdir(path):
+            try:
+                total += os.path.getsize(os.path.join(path, name))
+            except OSError:
+                pass
+        return total
+
+    def _read_entry(self, key):
+        entry_dir = self._entry_dir(key)
+        try:
+            with open(os.path.join(entry_dir, self.META_FILE), 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        exe_path = os.path.join(entry_dir, self.EXE_FILE)
+        if meta['returncode'] == 0 and not os.path.exists(exe_path):
+            return None
+        return CompileResult(
+            key, meta['returncode'], meta['stderr'],
+            exe_path=exe_path if meta['returncode'] == 0 else None,
+            cached=True
+        )
+
+    def _lookup(self, key):
+        """Return a cached result and mark it most recently used, or None"""
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+        result = self._read_entry(key)
+        if result is None:
+            with self.lock:
+                self._forget(key)
+            return None
+        try:
+            os.utime(os.path.join(self._entry_dir(key), self.META_FILE))
+        except OSError:
+            pass
+        return result
+
+    def _forget(self, key):
+        size = self.entries.pop(key, None)
+        if size is not None:
+            self.total_bytes -= size
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            key, _ = next(iter(self.entries.items()))
+            self._forget(key)
+            self.evictions += 1
+
+    def compile(self, source, flags, timeout):
+        """Compile ``source`` with ``flags``, reusing a cached build when possible.
+
+        Raises subprocess.TimeoutExpired if gcc exceeds ``timeout``; timeouts
+        are not cached.
+        """
+        key = self.make_key(source, flags)
+
+        while True:
+            result = self._lookup(key)
+            if result is not None:
+                with self.lock:
+                    self.hits += 1
+                return result
+
+            with self.lock:
+                pending = self.inflight.get(key)
+                if pending is None:
+                    pending = self.inflight[key] = threading.Event()
+                    owner = True
+                else:
+                    owner = False
+
+            if not owner:
+                # Another request is compiling identical code, share its result
+                pending.wait(timeout + 5)
+                result = self._lookup(key)
+                if result is not None:
+                    with self.lock:
+                        self.hits += 1
+                    return result
+                continue
+
+            try:
+                with self.lock:
+                    self.misses += 1
+                return self._build(key, source, flags, timeout)
+            finally:
+                with self.lock:
+                    self.inflight.pop(key, None)
+                pending.set()
+
+    def _build(self, key, source, flags, timeout):
+        staging_root = os.path.join(self.root, '.staging')
+        os.makedirs(staging_root, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=staging_root, prefix=f'{key[:12]}_')
+        try:
+            c_file = os.path.join(staging, 'program.c')
+            exe_file = os.path.join(staging, self.EXE_FILE)
+            with open(c_file, 'w', encoding='utf-8') as f:
+                f.write(source)
+
+            compile_result = subprocess.run(
+                [self.compiler] + list(flags) + ['-o', exe_file, c_file],
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+                cwd=staging
+            )
+
+            # Diagnostics refer to the staging path, which is meaningless to students
+            stderr = compile_result.stderr.replace(c_file, 'program.c')
+            os.remove(c_file)
+            with open(os.path.join(staging, self.META_FILE), 'w') as f:
+                json.dump({'returncode': compile_result.returncode, 'stderr': stderr}, f)
+
+            entry_dir = self._entry_dir(key)
+            os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+            existing = self._publish(key, staging, entry_dir)
+
+            size = self._dir_size(entry_dir)
+            with self.lock:
+                if key not in self.entries:
+                    self.entries[key] = size
+                    self.total_bytes += size
+                self.entries.move_to_end(key)
+                self._evict()
+
+            if existing is not None:
+                return existing
+            return CompileResult(
+                key, compile_result.returncode, stderr,
+                exe_path=os.path.join(entry_dir, self.EXE_FILE) if compile_result.returncode == 0 else None
+            )
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def _publish(self, key, staging, entry_dir):
+        """Rename ``staging`` to ``entry_dir`` in one step.
+
+        Returns None once published, or the entry another worker published
+        first. An entry left unreadable by an interrupted eviction is
+        replaced.
+        """
+        try:
+            os.rename(staging, entry_dir)
+            return None
+        except OSError as e:
+            if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                raise
+        existing = self._read_entry(key)
+        if existing is not None:
+            return existing
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.rename(staging, entry_dir)
+        return None
+
+    def link_into(self, result, dest):
+        """Place the cached binary at ``dest`` so eviction cannot pull it from under a run"""
+        try:
+            os.link(result.exe_path, dest)
+        except OSError:
+            shutil.copy2(result.exe_path, dest)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes
+            }
@@ -0,0 +1,182 @@
+import logging
+import re
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# gcc reports '<stdin>:line:col: severity: message'; includes and 'In function' lines carry no column
+DIAGNOSTIC_LINE = re.compile(r'^<stdin>:(\d+):(?:(\d+):)? (fatal error|error|warning|note): (.*)$')
+SEVERITIES = {'fatal error': 'error', 'error': 'error', 'warning': 'warning', 'note': 'info'}
+MAX_DIAGNOSTICS = 100
+
+# Outcomes of a check that get a reply; a superseded check gets none
+CHECKED = 'checked'
+DEFERRED = 'deferred'    # skipped while builds are queued; the client asks again later
+TIMED_OUT = 'timeout'
+
+
+def parse_diagnostics(stderr):
+    """Structured ``{line, column, severity, message}`` entries from gcc output read from stdin"""
+    diagnostics = []
+    for text in stderr.splitlines():
+        match = DIAGNOSTIC_LINE.match(text)
+        if not match:
+            continue
+        line, column, severity, message = match.groups()
+        diagnostics.append({
+            'line': int(line),
+            'column': int(column) if column else 1,
+            'severity': SEVERITIES[severity],
+            'message': message
+        })
+        if len(diagnostics) >= MAX_DIAGNOSTICS:
+            break
+    return diagnostics
+
+
+class SyntaxChecker:
+    """Runs ``gcc -fsyntax-only`` on editor contents for live diagnostics.
+
+    The source is piped through stdin, so nothing touches the disk and
+    nothing is linked. Results are kept in a bounded LRU keyed by a hash of
+    the source, flags and compiler. Each editor session has at most one
+    check that matters: a newer request from the same session kills the
+    gcc of the one before it, and a superseded check returns None. At most
+    ``max_concurrent`` checks run at once, separately from the build pool,
+    and ``busy()`` returning true defers uncached checks so live
+    diagnostics never delay a Run or a submission.
+    """
+
+    def __init__(self, compile_cache, flags, timeout=5, max_concurrent=2, max_entries=1024, busy=None):
+        self.compile_cache = compile_cache
+        self.flags = list(flags) + ['-fsyntax-only', '-fdiagnostics-color=never', '-x', 'c', '-']
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.busy = busy or (lambda: False)
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> diagnostics
+        self.latest = {}   # session -> id of its newest request
+        self.running = {}  # session -> (request id, gcc process)
+        self.hits = 0
+        self.misses = 0
+        self.superseded = 0
+        self.deferred = 0
+        self.check_seconds = 0.0
+
+    def key(self, source):
+        return self.compile_cache.make_key(source, self.flags)
+
+    def _current(self, session, request_id):
+        return self.latest.get(session) == request_id
+
+    def check(self, session, request_id, source):
+        """Outcome for ``source`` as ``{'status', 'diagnostics', 'cached'}``.
+
+        ``status`` is CHECKED, DEFERRED or TIMED_OUT; the last two carry no
+        diagnostics. Returns None if a newer request from ``session``
+        replaced this one, since its reply will follow.
+        """
+        key = self.key(source)
+        with self.lock:
+            self.latest[session] = request_id
+            previous = self.running.get(session)
+            diagnostics = self.entries.get(key)
+            if diagnostics is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+        if previous is not None:
+            self._kill(previous[1])
+        if diagnostics is not None:
+            return {'status': CHECKED, 'diagnostics': diagnostics, 'cached': True}
+
+        if self.busy():
+            with self.lock:
+                self.deferred += 1
+            return {'status': DEFERRED, 'diagnostics': None, 'cached': False}
+
+        # Wait for a free slot, giving up as soon as a newer edit arrives
+        while not self.slots.acquire(timeout=0.1):
+            with self.lock:
+                if not self._current(session, request_id):
+                    self.superseded += 1
+                    return None
+        try:
+            with self.lock:
+                if not self._current(session, request_id):
+                    self.superseded += 1
+                    return None
+                self.misses += 1
+            diagnostics = self._run(session, request_id, source)
+        except subprocess.TimeoutExpired:
+            return {'status': TIMED_OUT, 'diagnostics': None, 'cached': False}
+        finally:
+            self.slots.release()
+
+        if diagnostics is None:
+            return None
+        with self.lock:
+            self.entries[key] = diagnostics
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return {'status': CHECKED, 'diagnostics': diagnostics, 'cached': False}
+
+    def _run(self, session, request_id, source):
+        started = time.monotonic()
+        process = subprocess.Popen(
+            [self.compile_cache.compiler] + self.flags,
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+        )
+        with self.lock:
+            self.running[session] = (request_id, process)
+        try:
+            _, stderr = process.communicate(source, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            self._kill(process)
+            process.communicate()
+            logger.info(f"Syntax check for session {session} timed out ({self.timeout}s)")
+            raise
+        finally:
+            with self.lock:
+                if self.running.get(session, (None,))[0] == request_id:
+                    del self.running[session]
+                self.check_seconds += time.monotonic() - started
+
+        with self.lock:
+            if not self._current(session, request_id):
+                # Killed by a newer request, so the output is incomplete
+                self.superseded += 1
+                return None
+        return parse_diagnostics(stderr)
+
+    @staticmethod
+    def _kill(process):
+        try:
+            process.kill()
+        except OSError:
+            pass
+
+    def forget(self, session):
+        """Drop a closed session's request state, stopping any check still running"""
+        with self.lock:
+            self.latest.pop(session, None)
+            running = self.running.pop(session, None)
+        if running is not None:
+            self._kill(running[1])
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'superseded': self.superseded,
+                'deferred': self.deferred,
+                'entries': len(self.entries),
+                'running': len(self.running),
+                'avg_check_ms': round(self.check_seconds / self.misses * 1000, 2) if self.misses else 0.0
+            }
@@ -0,0 +1,219 @@
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+
+from game_store import GameStore, apply_event
+
+logger = logging.getLogger(__name__)
+
+
+def new_game():
+    return {
+        'active': False,
+        'current_question': None,
+        'question_index': 0,
+        'question_ids': None,
+        'questions': [],
+        'timer': 0,
+        'start_time': None,
+        'participants': {}
+    }
+
+
+class GameBackend:
+    """Holds the game dict and tells listeners about every event applied to it"""
+
+    shared = False
+
+    def __init__(self):
+        self.game = new_game()
+        self.lock = threading.RLock()
+        self.listeners = []
+        self.resolve_questions = None  # question ids -> question dicts, for start events recorded by id only
+
+    def add_listener(self, listener):
+        """``listener(seq, event, game, local)`` runs under the lock after each event is applied"""
+        self.listeners.append(listener)
+
+    def _notify(self, seq, event, local):
+        for listener in self.listeners:
+            try:
+                listener(seq, event, self.game, local)
+            except Exception as e:
+                logger.error(f"Game event listener failed: {e}")
+
+
+class LocalGameBackend(GameBackend):
+    """Game state owned by this process, persisted with a GameStore.
+
+    Suitable for a single worker; other processes never see its changes.
+    """
+
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+        self.epoch = secrets.token_hex(4)
+
+    @property
+    def seq(self):
+        return self.store.seq
+
+    def load(self):
+        self.store.load(self.game, self.resolve_questions)
+
+    def start(self):
+        self.store.start(lambda: self.game, self.lock)
+
+    def record(self, event):
+        """Apply an event, persist it and return its sequence number"""
+        with self.lock:
+            apply_event(self.game, event, self.resolve_questions)
+            seq = self.store.append(event)
+            self._notify(seq, event, True)
+            return seq
+
+    def sync(self):
+        """Nothing to catch up on: this process is the only writer"""
+
+    def close(self):
+        self.store.close()
+
+    def stats(self):
+        return dict(self.store.stats(), backend='local')
+
+
+class SQLiteGameBackend(GameBackend):
+    """Game state shared by several workers through one SQLite database.
+
+    The database holds the event log of the current game. Each worker keeps
+    a replica of the game dict and applies events newer than its last seen
+    sequence number: on ``sync()`` (before handling a request, and every
+    ``sync_interval`` seconds in the background) and inside ``record()``,
+    which appends under an immediate transaction after catching up so every
+    worker applies events in the same order. Starting a game prunes the
+    events of earlier ones.
+    """
+
+    shared = True
+
+    def __init__(self, path, sync_interval=0.5):
+        super().__init__()
+        self.path = os.path.abspath(path)
+        self.sync_interval = sync_interval
+        self._seq = 0
+        self.local_events = 0
+        self.remote_events = 0
+        self.syncs = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS events (seq INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, event TEXT NOT NULL)'
+        )
+        # Shared by every worker so leaderboard ETags agree between them
+        self.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('epoch', ?)", (secrets.token_hex(4),))
+        self.epoch = self.conn.execute("SELECT value FROM meta WHERE key = 'epoch'").fetchone()[0]
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def _catch_up(self):
+        rows = self.conn.execute(
+            'SELECT seq, event FROM events WHERE seq > ? ORDER BY seq', (self._seq,)
+        ).fetchall()
+        for seq, data in rows:
+            event = json.loads(data)
+            apply_event(self.game, event, self.resolve_questions)
+            self._seq = seq
+            self.remote_events += 1
+            self._notify(seq, event, False)
+        return len(rows)
+
+    def load(self):
+        """Replay the current game from its start event"""
+        with self.lock:
+            row = self.conn.execute("SELECT MAX(seq) FROM events WHERE kind = 'start'").fetchone()
+            self._seq = row[0] - 1 if row and row[0] else 0
+            replayed = self._catch_up()
+        logger.info(f"Game state replayed from {self.path} at seq {self._seq} ({replayed} events)")
+
+    def start(self):
+        self.thread = threading.Thread(target=self._sync_loop, name='game-sync', daemon=True)
+        self.thread.start()
+
+    def _sync_loop(self):
+        while not self.stopped.wait(self.sync_interval):
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error(f"Game state sync failed: {e}")
+
+    def record(self, event):
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._catch_up()
+                seq = self.conn.execute(
+                    'INSERT INTO events (kind, event) VALUES (?, ?)',
+                    (event['type'], json.dumps(event, separators=(',', ':')))
+                ).lastrowid
+                if event['type'] == 'start':
+                    self.conn.execute('DELETE FROM events WHERE seq < ?', (seq,))
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+            apply_event(self.game, event, self.resolve_questions)
+            self._seq = seq
+            self.local_events += 1
+            self._notify(seq, event, True)
+            return seq
+
+    def sync(self):
+        with self.lock:
+            self.syncs += 1
+            return self._catch_up()
+
+    def close(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+        with self.lock:
+            self.conn.close()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'backend': 'sqlite',
+                'path': self.path,
+                'seq': self._seq,
+                'local_events': self.local_events,
+                'remote_events': self.remote_events,
+                'syncs': self.syncs
+            }
+
+
+def create_game_backend(url, data_dir, snapshot_every=500, snapshot_interval=30.0):
+    """Build the backend named by GAME_BACKEND: 'local' or 'sqlite:<path>' (relative to ``data_dir``)"""
+    if url.startswith('sqlite:'):
+        path = url[len('sqlite:'):]
+        if path.startswith('//'):
+            path = path[2:]  # sqlite:///abs/path
+        return SQLiteGameBackend(os.path.join(data_dir, path or 'game.sqlite3'))
+    if url != 'local':
+        raise ValueError(f"Unknown game backend {url!r}")
+    return LocalGameBackend(GameStore(
+        os.path.join(data_dir, 'game_state.json'),
+        os.path.join(data_dir, 'game_events.jsonl'),
+        snapshot_every=snapshot_every,
+        snapshot_interval=snapshot_interval
+    ))
@@ -0,0 +1,263 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LOG_WRITE_SECONDS = registry.histogram('game_log_write_seconds', 'Time to append and fsync a batch of game events')
+SNAPSHOT_SECONDS = registry.histogram('game_snapshot_seconds', 'Time to write and fsync a game state snapshot')
+SNAPSHOT_BYTES = registry.gauge('game_snapshot_bytes', 'Size of the last game state snapshot')
+
+
+def apply_event(game, event, resolve_questions=None):
+    """Apply one recorded game event to the in-memory game dict.
+
+    Start and refresh_questions events carry the questions already
+    resolved, so applying them never builds anything while the caller
+    holds the game lock. Start events recorded before that name them by id
+    only (``question_ids``), which ``resolve_questions(ids)`` turns into
+    question dicts without building.
+    """
+    kind = event['type']
+    if kind == 'start':
+        question_ids = event.get('question_ids')
+        questions = event['questions'] if 'questions' in event else resolve_questions(question_ids)
+        game.clear()
+        game.update({
+            'active': True,
+            'current_question': questions[0] if questions else None,
+            'question_index': 0,
+            'question_ids': question_ids,
+            'questions': questions,
+            'timer': event['timer'],
+            'start_time': event['start_time'],
+            'question_times': {'0': event['start_time']},
+            'participants': {}
+        })
+    elif kind == 'stop':
+        game['active'] = False
+    elif kind == 'question':
+        game['question_index'] = event['question_index']
+        game['current_question'] = game['questions'][event['question_index']]
+        if event.get('timestamp'):
+            game.setdefault('question_times', {}).setdefault(str(event['question_index']), event['timestamp'])
+    elif kind == 'join':
+        game['participants'][event['nickname']] = {
+            'joined_at': event['joined_at'],
+            'current_score': 0,
+            'submissions': []
+        }
+    elif kind == 'submit':
+        participant = game['participants'].get(event['nickname'])
+        if participant is None:
+            logger.warning(f"Ignoring submission from unknown participant {event['nickname']!r}")
+            return
+        participant['submissions'].append(event['submission'])
+        if event['submission']['correct']:
+            participant['current_score'] += 1
+    elif kind == 'refresh_questions':
+        # Questions from the bank were corrected; later submissions are graded against the new version
+        game['questions'] = event['questions']
+        index = game.get('question_index', 0)
+        game['current_question'] = game['questions'][index] if index < len(game['questions']) else None
+    elif kind == 'regrade':
+        # Changes name a submission by position and timestamp, so a rejoin in between cannot be hit
+        touched = set()
+        for nickname, index, timestamp, correct in event['changes']:
+            participant = game['participants'].get(nickname)
+            if participant is None or index >= len(participant['submissions']):
+                continue
+            submission = participant['submissions'][index]
+            if submission['timestamp'] == timestamp:
+                submission['correct'] = correct
+                touched.add(nickname)
+        for nickname in touched:
+            participant = game['participants'][nickname]
+            participant['current_score'] = sum(1 for s in participant['submissions'] if s['correct'])
+    elif kind == 'compile_error':
+        participant = game['participants'].get(event['nickname'])
+        if participant is not None:
+            # One counter per question, however many failed builds there are
+            counts = participant.setdefault('compile_errors', {})
+            key = str(event['question_index'])
+            counts[key] = counts.get(key, 0) + 1
+    else:
+        logger.warning(f"Ignoring unknown game event type {kind!r}")
+
+
+def restore_questions(game, saved, resolve_questions):
+    """Resolve the questions of ``game`` loaded from an older snapshot that saved only their ids"""
+    if saved.get('question_ids') and 'questions' not in saved:
+        game['questions'] = resolve_questions(game['question_ids'])
+        index = game.get('question_index', 0)
+        game['current_question'] = game['questions'][index] if index < len(game['questions']) else None
+
+
+class GameStore:
+    """Crash-safe persistence for game state as snapshot + append-only event log.
+
+    Events are numbered and appended as JSON lines by a background writer,
+    so recording one costs a queue put on the request thread. Every
+    ``snapshot_every`` events (or ``snapshot_interval`` seconds when there
+    are unsnapshotted events) the writer saves the full state to a temp
+    file, fsyncs it and renames it over the snapshot, then starts a fresh
+    log. Loading replays logged events newer than the snapshot.
+    """
+
+    def __init__(self, snapshot_path, log_path, snapshot_every=500, snapshot_interval=30.0):
+        self.snapshot_path = snapshot_path
+        self.log_path = log_path
+        self.snapshot_every = snapshot_every
+        self.snapshot_interval = snapshot_interval
+        self.seq = 0
+        self.queue = queue.Queue()
+        self.state_fn = None
+        self.state_lock = None
+        self.log_file = None
+        self.thread = None
+        self.events_since_snapshot = 0
+        self.last_snapshot = time.monotonic()
+        self.appended = 0
+        self.snapshots = 0
+        self.last_snapshot_bytes = 0
+
+    def load(self, game, resolve_questions=None):
+        """Restore ``game`` in place from the snapshot and log; returns events replayed"""
+        snapshot_seq = 0
+        try:
+            with open(self.snapshot_path, 'r') as f:
+                snapshot = json.load(f)
+            if 'seq' in snapshot and 'game' in snapshot:
+                snapshot_seq = snapshot['seq']
+                game.update(snapshot['game'])
+                restore_questions(game, snapshot['game'], resolve_questions)
+            else:
+                game.update(snapshot)  # Plain state file from before the event log
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            logger.error(f"Game snapshot {self.snapshot_path} is unreadable: {e}")
+
+        self.seq = snapshot_seq
+        replayed = 0
+        try:
+            with open(self.log_path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        logger.warning("Stopping game log replay at a torn record")
+                        break
+                    if record['seq'] <= snapshot_seq:
+                        continue
+                    apply_event(game, record['event'], resolve_questions)
+                    self.seq = record['seq']
+                    replayed += 1
+        except FileNotFoundError:
+            pass
+
+        self.events_since_snapshot = replayed
+        logger.info(f"Game state restored at seq {self.seq} ({replayed} events replayed)")
+        return replayed
+
+    def start(self, state_fn, state_lock):
+        """Begin background writing; ``state_fn()`` returns the state to snapshot under ``state_lock``"""
+        self.state_fn = state_fn
+        self.state_lock = state_lock
+        self.log_file = open(self.log_path, 'a', encoding='utf-8')
+        self.thread = threading.Thread(target=self._writer, name='game-store', daemon=True)
+        self.thread.start()
+
+    def append(self, event):
+        """Queue an event for the log and return its seq; the caller holds the state lock so seq order matches apply order"""
+        self.seq += 1
+        self.queue.put((self.seq, event))
+        return self.seq
+
+    def _writer(self):
+        while True:
+            timeout = max(0.1, self.snapshot_interval - (time.monotonic() - self.last_snapshot))
+            try:
+                batch = [self.queue.get(timeout=timeout)]
+            except queue.Empty:
+                batch = []
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in batch
+            records = [item for item in batch if item is not None]
+            if records:
+                self._write(records)
+
+            due = self.events_since_snapshot >= self.snapshot_every or (
+                self.events_since_snapshot and time.monotonic() - self.last_snapshot >= self.snapshot_interval
+            )
+            if due or (stop and self.events_since_snapshot):
+                self._snapshot()
+            for _ in batch:
+                self.queue.task_done()
+            if stop:
+                return
+
+    def _write(self, records):
+        started = time.monotonic()
+        try:
+            for seq, event in records:
+                self.log_file.write(json.dumps({'seq': seq, 'event': event}, separators=(',', ':')) + '\n')
+            self.log_file.flush()
+            os.fsync(self.log_file.fileno())
+            self.appended += len(records)
+            self.events_since_snapshot += len(records)
+            LOG_WRITE_SECONDS.observe(time.monotonic() - started)
+        except Exception as e:
+            logger.error(f"Failed to append game events: {e}")
+
+    def _snapshot(self):
+        started = time.monotonic()
+        try:
+            with self.state_lock:
+                seq = self.seq
+                data = json.dumps({'seq': seq, 'game': self.state_fn()}, separators=(',', ':'))
+
+            tmp_path = self.snapshot_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+
+            # Everything up to seq is in the snapshot; later events still queued go to the new log
+            self.log_file.close()
+            self.log_file = open(self.log_path, 'w', encoding='utf-8')
+            self.events_since_snapshot = 0
+            self.last_snapshot = time.monotonic()
+            self.snapshots += 1
+            self.last_snapshot_bytes = len(data)
+            SNAPSHOT_SECONDS.observe(time.monotonic() - started)
+            SNAPSHOT_BYTES.set(len(data))
+        except Exception as e:
+            logger.error(f"Failed to snapshot game state: {e}")
+
+    def close(self):
+        """Write out queued events and a final snapshot"""
+        if self.thread and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout=10)
+
+    def stats(self):
+        return {
+            'seq': self.seq,
+            'queued': self.queue.qsize(),
+            'appended': self.appended,
+            'events_since_snapshot': self.events_since_snapshot,
+            'snapshots': self.snapshots,
+            'last_snapshot_bytes': self.last_snapshot_bytes
+        }
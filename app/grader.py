@@ -0,0 +1,375 @@
+import codecs
+import logging
+import os
+import selectors
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Verdicts reported per test case
+PASSED = 'passed'
+WRONG_ANSWER = 'wrong_answer'
+TIMEOUT = 'timeout'
+RUNTIME_ERROR = 'runtime_error'
+OUTPUT_LIMIT = 'output_limit_exceeded'
+SKIPPED = 'skipped'
+
+TRUNCATED_MARKER = '\n[Output truncated]\n'
+
+
+def validate_output(expected, actual):
+    """Compare ignoring surrounding whitespace; an expected output of None accepts any non-blank output"""
+    if expected is None:
+        return len(actual.strip()) > 0
+    return expected.strip() == actual.strip()
+
+
+def parse_expected_output(text):
+    """Hand-typed expected output: literal "\\n" means a newline and "variable" accepts any output"""
+    if text == 'variable':
+        return None
+    return text.replace('\\n', '\n')
+
+
+class OutputMatcher:
+    """Incremental ``validate_output``: checks output as it arrives instead of after exit.
+
+    ``feed()`` returns False as soon as the output can no longer match:
+    a character differs from the expected text, or more than ``margin``
+    characters of surrounding whitespace arrive. Past ``max_bytes`` the
+    output is rejected outright (``over_limit``), which is the only bound
+    when any output is accepted (``expected`` None). Only the first
+    ``len(expected) + margin`` characters are kept for display, so memory
+    stays flat however much the program prints.
+    """
+
+    def __init__(self, expected, margin=4096, max_bytes=1024 * 1024):
+        self.variable = expected is None
+        self.expected = '' if expected is None else expected.strip()
+        self.margin = margin
+        self.max_bytes = max_bytes
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.keep = len(self.expected) + margin
+        self.kept = []
+        self.kept_chars = 0
+        self.truncated = False
+        self.bytes_seen = 0
+        self.matched = 0       # characters of expected matched so far
+        self.started = False   # past the leading whitespace
+        self.slack = 0         # leading plus trailing whitespace seen
+        self.diverged = False
+        self.over_limit = False
+        self.saw_text = False
+
+    def feed(self, data):
+        """Consume a chunk of stdout; False once the output is known to be wrong"""
+        self.bytes_seen += len(data)
+        if self.bytes_seen > self.max_bytes:
+            self.over_limit = True
+            self.truncated = True
+            return False
+        self._check(self.decoder.decode(data))
+        return not self.diverged
+
+    def _check(self, text):
+        room = self.keep - self.kept_chars
+        if len(text) > room:
+            self.truncated = True
+        if room > 0 and text:
+            self.kept.append(text[:room])
+            self.kept_chars += len(self.kept[-1])
+
+        if self.variable:
+            self.saw_text = self.saw_text or not text.isspace() and text != ''
+            return
+        if self.diverged:
+            return
+        if not self.started:
+            stripped = text.lstrip()
+            self.slack += len(text) - len(stripped)
+            if not stripped:
+                self.diverged = self.slack > self.margin
+                return
+            self.started = True
+            text = stripped
+
+        expected = self.expected
+        remaining = len(expected) - self.matched
+        if remaining > 0:
+            head = text[:remaining]
+            if head != expected[self.matched:self.matched + len(head)]:
+                self.diverged = True
+                return
+            self.matched += len(head)
+            text = text[len(head):]
+        if text:
+            # Only whitespace may follow the expected output, and not too much of it
+            self.slack += len(text)
+            self.diverged = not text.isspace() or self.slack > self.margin
+
+    def finish(self):
+        """Whether the complete output matched"""
+        if self.over_limit or self.diverged:
+            return False
+        self._check(self.decoder.decode(b'', final=True))
+        if self.variable:
+            return self.saw_text
+        return not self.diverged and self.matched == len(self.expected)
+
+    def output(self):
+        text = ''.join(self.kept)
+        return text + TRUNCATED_MARKER if self.truncated else text
+
+
+def question_cases(question):
+    """Return the question's test cases, treating a bare expected_output as one case with no stdin.
+
+    Cases of question bank questions are marked ``exact`` (their outputs
+    come from the reference solution); any others are parsed as hand-typed.
+    """
+    cases = question.get('test_cases') or []
+    if not cases:
+        cases = [{'input': '', 'expected_output': question.get('expected_output', '')}]
+    return [
+        {
+            'input': case.get('input', ''),
+            'expected_output': case.get('expected_output') if case.get('exact') else
+                               parse_expected_output(case.get('expected_output', '')),
+            'hidden': bool(case.get('hidden', False)),
+            'timeout': case.get('timeout')
+        }
+        for case in cases
+    ]
+
+
+class Grader:
+    """Runs a compiled submission against every test case of a question in parallel.
+
+    Cases share one bounded pool across all submissions. The first failing
+    case stops the rest: queued cases are skipped and running ones killed.
+    Programs are started through ``executor`` (a SandboxExecutor), so each
+    case runs under the sandbox limits and reports its CPU time and peak RSS.
+    Output is checked as it streams in (see ``OutputMatcher``), so a wrong
+    answer is killed at its first differing character.
+    """
+
+    def __init__(self, executor, workers=None, case_timeout=30, max_output_bytes=1024 * 1024, output_margin=4096):
+        self.executor = executor
+        self.workers = workers or os.cpu_count() or 1
+        self.case_timeout = case_timeout
+        self.max_output_bytes = max_output_bytes
+        self.output_margin = output_margin
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='grader')
+
+    def grade(self, exe_file, cases, cwd=None):
+        """Grade ``exe_file``; returns {'correct', 'output', 'cases': [...]} in case order"""
+        stop = threading.Event()
+        running = {}
+        running_lock = threading.Lock()
+        results = [None] * len(cases)
+
+        def run_case(index):
+            case = cases[index]
+            if stop.is_set():
+                return
+            timeout = case.get('timeout') or self.case_timeout
+            started = time.monotonic()
+            verdict = PASSED
+            matcher = OutputMatcher(case['expected_output'], self.output_margin, self.max_output_bytes)
+            process = None
+            try:
+                process, stdin_w, stdout_r = self._spawn(exe_file, cwd)
+                with running_lock:
+                    running[index] = process
+                finished = self._communicate(
+                    process, stdin_w, stdout_r, case['input'].encode('utf-8'), timeout, matcher.feed
+                )
+                if not finished:
+                    # The output is already wrong or too long: no point letting it run
+                    self._kill(process)
+                    verdict = OUTPUT_LIMIT if matcher.over_limit else WRONG_ANSWER
+                elif stop.is_set() and process.returncode == -signal.SIGKILL:
+                    verdict = SKIPPED
+                elif process.returncode < 0:
+                    verdict = RUNTIME_ERROR
+                elif not matcher.finish():
+                    verdict = WRONG_ANSWER
+            except subprocess.TimeoutExpired:
+                self._kill(process)
+                verdict = TIMEOUT
+            except Exception as e:
+                logger.error(f"Grading case {index} failed: {e}")
+                if process:
+                    self._kill(process)
+                verdict = RUNTIME_ERROR
+            finally:
+                with running_lock:
+                    running.pop(index, None)
+
+            usage = process.usage if process else {}
+            results[index] = {
+                'verdict': verdict,
+                'time': round(time.monotonic() - started, 4),
+                'cpu_time': usage.get('cpu_time'),
+                'peak_rss_kb': usage.get('peak_rss_kb'),
+                'output': matcher.output()
+            }
+            if verdict not in (PASSED, SKIPPED):
+                # Fail fast: stop the other cases of this submission
+                stop.set()
+                with running_lock:
+                    for other in running.values():
+                        self._kill(other, wait=False)
+
+        futures = [self.pool.submit(run_case, index) for index in range(len(cases))]
+        for future in futures:
+            future.result()
+
+        report = []
+        for index, (case, result) in enumerate(zip(cases, results)):
+            result = result or {'verdict': SKIPPED, 'time': 0.0, 'cpu_time': None, 'peak_rss_kb': None, 'output': ''}
+            entry = {
+                'case': index + 1,
+                'verdict': result['verdict'],
+                'time': result['time'],
+                'cpu_time': result['cpu_time'],
+                'peak_rss_kb': result['peak_rss_kb'],
+                'hidden': case['hidden']
+            }
+            if not case['hidden']:
+                entry['output'] = result['output']
+            report.append(entry)
+
+        correct = all(entry['verdict'] == PASSED for entry in report)
+        return {
+            'correct': correct,
+            'output': self._display_output(cases, results),
+            'cases': report
+        }
+
+    def capture(self, exe_file, inputs, cwd=None):
+        """Run ``exe_file`` once per input in parallel and return what it printed.
+
+        Used for reference solutions: each result is {'output', 'error'},
+        with ``error`` None unless the run timed out, crashed, exited
+        non-zero or printed more than ``max_output_bytes``.
+        """
+        def run_one(text):
+            chunks = []
+            size = 0
+
+            def collect(chunk):
+                nonlocal size
+                size += len(chunk)
+                chunks.append(chunk)
+                return size <= self.max_output_bytes
+
+            process = None
+            error = None
+            try:
+                process, stdin_w, stdout_r = self._spawn(exe_file, cwd)
+                if not self._communicate(process, stdin_w, stdout_r, text.encode('utf-8'), self.case_timeout, collect):
+                    self._kill(process)
+                    error = 'output limit exceeded'
+                elif process.returncode != 0:
+                    error = f'exited with code {process.returncode}'
+            except subprocess.TimeoutExpired:
+                self._kill(process)
+                error = f'timed out after {self.case_timeout}s'
+            return {'output': b''.join(chunks).decode('utf-8', 'replace'), 'error': error}
+
+        return list(self.pool.map(run_one, inputs))
+
+    @staticmethod
+    def _display_output(cases, results):
+        """Output shown to the student: the first failing visible case, else the first visible case"""
+        visible = [(case, result) for case, result in zip(cases, results) if result and not case['hidden']]
+        for case, result in visible:
+            if result['verdict'] not in (PASSED, SKIPPED):
+                return result['output']
+        return visible[0][1]['output'] if visible else ''
+
+    def _spawn(self, exe_file, cwd):
+        """Start the program with pipes for stdin/stdout; returns (process, stdin_w, stdout_r)"""
+        stdin_r, stdin_w = os.pipe()
+        stdout_r, stdout_w = os.pipe()
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        try:
+            process = self.executor.spawn([exe_file], cwd, stdin_r, stdout_w, devnull)
+        except Exception:
+            os.close(stdin_w)
+            os.close(stdout_r)
+            raise
+        finally:
+            os.close(stdin_r)
+            os.close(stdout_w)
+            os.close(devnull)
+        return process, stdin_w, stdout_r
+
+    @staticmethod
+    def _communicate(process, stdin_w, stdout_r, data, timeout, on_output):
+        """Feed ``data`` and pass stdout to ``on_output`` until EOF and exit.
+
+        Returns False as soon as ``on_output`` rejects a chunk (the process
+        is left running for the caller to kill), True once it exited.
+        Raises TimeoutExpired past ``timeout``.
+        """
+        deadline = time.monotonic() + timeout
+        selector = selectors.DefaultSelector()
+        offset = 0
+        try:
+            os.set_blocking(stdout_r, False)
+            selector.register(stdout_r, selectors.EVENT_READ)
+            if data:
+                os.set_blocking(stdin_w, False)
+                selector.register(stdin_w, selectors.EVENT_WRITE)
+            else:
+                os.close(stdin_w)
+                stdin_w = None
+
+            while selector.get_map():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise subprocess.TimeoutExpired(str(process.pid), timeout)
+                for key, _ in selector.select(remaining):
+                    if key.fd == stdin_w:
+                        try:
+                            offset += os.write(stdin_w, data[offset:offset + 65536])
+                        except BrokenPipeError:
+                            offset = len(data)
+                        if offset >= len(data):
+                            selector.unregister(stdin_w)
+                            os.close(stdin_w)
+                            stdin_w = None
+                    else:
+                        chunk = os.read(stdout_r, 65536)
+                        if not chunk:
+                            selector.unregister(stdout_r)
+                        elif not on_output(chunk):
+                            return False
+
+            process.wait(max(0.0, deadline - time.monotonic()))
+            return True
+        finally:
+            selector.close()
+            if stdin_w is not None:
+                os.close(stdin_w)
+            os.close(stdout_r)
+
+    @staticmethod
+    def _kill(process, wait=True):
+        try:
+            if process.poll() is None:
+                os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        if not wait:
+            return
+        try:
+            process.wait(5)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Process {process.pid} did not exit after SIGKILL")
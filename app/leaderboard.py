@@ -0,0 +1,112 @@
+import bisect
+import secrets
+import threading
+from collections import deque
+
+
+class Leaderboard:
+    """Participant ranking maintained incrementally as scores change.
+
+    Entries are kept in a list sorted by (-score, join order), located with
+    binary search, so a score change only moves one entry. Every change
+    bumps ``version`` and records a delta listing just the entries whose
+    rank or numbers changed; viewers apply deltas instead of re-fetching the
+    whole board. The last ``history`` deltas are kept for catching up.
+
+    Callers may pass the version explicitly (the game event sequence number)
+    so that every worker sharing a game numbers its deltas identically. Each
+    delta carries ``prev``, the version it applies on top of.
+    """
+
+    def __init__(self, history=256, epoch=None):
+        self.lock = threading.Lock()
+        self.epoch = epoch or secrets.token_hex(4)  # Distinguishes versions across restarts
+        self.history = deque(maxlen=history)
+        self.version = 0
+        self._clear()
+
+    def _clear(self):
+        self.order = []       # sorted keys: (-score, seq, nickname)
+        self.players = {}     # nickname -> {'key', 'score', 'submissions'}
+        self.next_seq = 0
+
+    def reset(self, participants=None, version=None):
+        """Rebuild from a participants dict (nickname -> {'current_score', 'submissions'})"""
+        with self.lock:
+            self._clear()
+            for nickname, data in (participants or {}).items():
+                self._insert(nickname, data['current_score'], len(data['submissions']))
+            self.version = self.version + 1 if version is None else version
+            self.history.clear()
+
+    def _insert(self, nickname, score, submissions):
+        key = (-score, self.next_seq, nickname)
+        self.next_seq += 1
+        index = bisect.bisect_left(self.order, key)
+        self.order.insert(index, key)
+        self.players[nickname] = {'key': key, 'score': score, 'submissions': submissions}
+        return index
+
+    def _entry(self, index):
+        nickname = self.order[index][2]
+        player = self.players[nickname]
+        return {
+            'rank': index + 1,
+            'nickname': nickname,
+            'score': player['score'],
+            'submissions': player['submissions']
+        }
+
+    def update(self, nickname, score, submissions, rejoined=False, version=None):
+        """Record a participant's new totals and return the resulting delta.
+
+        ``rejoined`` moves the participant to the back of their score group,
+        as for a fresh join.
+        """
+        with self.lock:
+            player = self.players.get(nickname)
+            if player is None:
+                low = high = self._insert(nickname, score, submissions)
+            else:
+                old_index = bisect.bisect_left(self.order, player['key'])
+                del self.order[old_index]
+                seq = self.next_seq if rejoined else player['key'][1]
+                if rejoined:
+                    self.next_seq += 1
+                key = (-score, seq, nickname)
+                new_index = bisect.bisect_left(self.order, key)
+                self.order.insert(new_index, key)
+                player.update(key=key, score=score, submissions=submissions)
+                if rejoined:
+                    # Everyone after the old slot may have shifted
+                    low, high = min(old_index, new_index), len(self.order) - 1
+                else:
+                    low, high = min(old_index, new_index), max(old_index, new_index)
+
+            prev = self.version
+            self.version = prev + 1 if version is None else version
+            delta = {
+                'version': self.version,
+                'prev': prev,
+                'total': len(self.order),
+                'changes': [self._entry(index) for index in range(low, high + 1)]
+            }
+            self.history.append(delta)
+            return delta
+
+    def snapshot(self):
+        """Return (version, full ranking)"""
+        with self.lock:
+            return self.version, [self._entry(index) for index in range(len(self.order))]
+
+    def deltas_since(self, version):
+        """Deltas after ``version``, or None if they are no longer retained"""
+        with self.lock:
+            if version == self.version:
+                return []
+            if not self.history or version < self.history[0]['prev'] or version > self.version:
+                return None
+            return [delta for delta in self.history if delta['version'] > version]
+
+    def etag(self):
+        return f'"lb-{self.epoch}-{self.version}"'
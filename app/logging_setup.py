@@ -0,0 +1,136 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from metrics import registry
+
+LOG_SAMPLED_OUT = registry.counter(
+    'log_records_sampled_out_total', 'Log records dropped by per-category rate limits', ('category',)
+)
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the standard fields plus anything passed in ``extra``"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per ``category`` (set with ``extra={'category': ...}``).
+
+    Records without a category always pass. A category over its rate is
+    dropped; the next record let through carries ``suppressed`` with how
+    many were skipped in between.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates)  # category -> records per second (also the burst size)
+        self.lock = threading.Lock()
+        self.buckets = {}         # category -> [tokens, last refill, suppressed]
+
+    def filter(self, record):
+        category = getattr(record, 'category', None)
+        rate = self.rates.get(category)
+        if rate is None:
+            return True
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(category)
+            if bucket is None:
+                bucket = self.buckets[category] = [rate, now, 0]
+            bucket[0] = min(rate, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                suppressed = None
+            else:
+                bucket[0] -= 1
+                suppressed, bucket[2] = bucket[2], 0
+        if suppressed is None:
+            LOG_SAMPLED_OUT.inc(category=category)
+            return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue the record untouched: formatting happens on the listener thread.
+
+    The stock QueueHandler formats on the caller's thread so records can be
+    pickled to another process; this queue never leaves the process.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def parse_rates(spec):
+    """'pty.input=5,pty.loop=2' -> {'pty.input': 5.0, 'pty.loop': 2.0}"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        category, _, rate = item.partition('=')
+        rates[category.strip()] = float(rate)
+    return rates
+
+
+def configure_logging(log_dir=None, level='INFO', fmt='json', max_bytes=10 * 1024 * 1024, backups=5, rates=None):
+    """Route every record through one queue drained by a background listener.
+
+    Request threads only filter and enqueue; the listener formats and
+    writes to stdout and, when ``log_dir`` exists, a size-rotated
+    ``app.log``. Returns the listener (already started, stopped at exit).
+    """
+    if fmt == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_dir and os.path.isdir(log_dir):
+        handlers.append(logging.handlers.RotatingFileHandler(
+            os.path.join(log_dir, 'app.log'), maxBytes=max_bytes, backupCount=backups, encoding='utf-8'
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    # queue.Queue rather than SimpleQueue: its blocking get() goes through threading
+    # primitives, which eventlet's monkey patching makes cooperative
+    log_queue = queue.Queue()
+    queue_handler = LocalQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(rates or {}))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
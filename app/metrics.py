@@ -0,0 +1,226 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonically increasing count, optionally split by labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, (), value) for key, value in sorted(self.values.items())]
+
+    def snapshot(self):
+        with self.lock:
+            if not self.labelnames:
+                return self.values.get((), 0)
+            return {','.join(key): value for key, value in sorted(self.values.items())}
+
+
+class Gauge:
+    """Current value, either set directly or read from ``fn`` at scrape time"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, fn=None):
+        self.name = name
+        self.help = help
+        self.labelnames = ()
+        self.fn = fn
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        if self.fn is None:
+            return self.value
+        try:
+            return self.fn()
+        except Exception:
+            return float('nan')
+
+    def samples(self):
+        return [(self.name, (), (), self.get())]
+
+    def snapshot(self):
+        return self.get()
+
+
+class Histogram:
+    """Distribution of observations in fixed cumulative buckets (seconds unless named otherwise)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self.series = {}  # label key -> [bucket counts..., +Inf count], sum, count
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    samples.append((self.name + '_bucket', key, (('le', _format_value(bound)),), cumulative))
+                samples.append((self.name + '_sum', key, (), total))
+                samples.append((self.name + '_count', key, (), count))
+        return samples
+
+    def _quantile(self, counts, count, q):
+        """Upper bound of the bucket holding the q-th observation"""
+        rank = q * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return bound
+        return None  # Beyond the largest bucket
+
+    def snapshot(self):
+        with self.lock:
+            result = {}
+            for key, (counts, total, count) in sorted(self.series.items()):
+                result[','.join(key) or 'all'] = {
+                    'count': count,
+                    'avg': round(total / count, 6) if count else 0.0,
+                    'p50_le': self._quantile(counts, count, 0.5),
+                    'p95_le': self._quantile(counts, count, 0.95),
+                    'p99_le': self._quantile(counts, count, 0.99)
+                }
+            return result
+
+
+class TimedLock:
+    """threading.Lock that records how long callers waited to acquire it"""
+
+    def __init__(self, histogram):
+        self.lock = threading.Lock()
+        self.histogram = histogram
+
+    def acquire(self, blocking=True, timeout=-1):
+        started = time.monotonic()
+        acquired = self.lock.acquire(blocking, timeout)
+        self.histogram.observe(time.monotonic() - started)
+        return acquired
+
+    def release(self):
+        self.lock.release()
+
+    def locked(self):
+        return self.lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class Registry:
+    """Named collection of metrics rendered as Prometheus text or JSON"""
+
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _register(self, metric):
+        metric.name = self.prefix + metric.name
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, fn=None):
+        return self._register(Gauge(name, help, fn))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def render_prometheus(self):
+        lines = []
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, key, extra, value in metric.samples():
+                lines.append(f'{name}{_format_labels(metric.labelnames, key, extra)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        return {metric.name[len(self.prefix):]: metric.snapshot() for metric in metrics}
+
+
+# Process-wide registry shared by the app and its modules
+registry = Registry(prefix='codegame_')
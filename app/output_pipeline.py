@@ -0,0 +1,123 @@
+import codecs
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class OutputPipeline:
+    """Per-session batching, budgeting and flow control for program output.
+
+    Raw PTY reads are buffered and sent as one frame every ``flush_interval``
+    seconds or as soon as ``flush_bytes`` are pending. At most
+    ``byte_budget`` bytes are forwarded; past that a truncation marker is
+    sent and ``on_budget_exceeded`` is called once. Every frame must be
+    acknowledged by the client; with ``max_unacked`` frames outstanding the
+    PTY stops being read until acks arrive (or ``ack_timeout`` passes, so a
+    client that never acks only gets throttled, not stalled).
+
+    ``feed`` and ``flush`` run on the PTY event loop thread; ``ack`` may be
+    called from any thread.
+    """
+
+    def __init__(self, loop, key, send, on_budget_exceeded=None, flush_interval=0.05,
+                 flush_bytes=16384, byte_budget=1024 * 1024, max_unacked=4, ack_timeout=2.0):
+        self.loop = loop
+        self.key = key
+        self.send = send
+        self.on_budget_exceeded = on_budget_exceeded
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.byte_budget = byte_budget
+        self.max_unacked = max_unacked
+        self.ack_timeout = ack_timeout
+
+        self.lock = threading.Lock()
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.pending = bytearray()
+        self.flush_scheduled = False
+        self.forwarded = 0
+        self.truncated = False
+        self.marker_sent = False
+        self.unacked = 0
+        self.paused_at = None
+        self.closed = False
+        self.frames = 0
+
+    def feed(self, data):
+        """Accept bytes read from the PTY"""
+        with self.lock:
+            if self.truncated or self.closed:
+                return
+            room = self.byte_budget - self.forwarded - len(self.pending)
+            if len(data) > room:
+                self.pending += data[:max(room, 0)]
+                self.truncated = True
+                truncated_now = True
+            else:
+                self.pending += data
+                truncated_now = False
+            flush_now = truncated_now or len(self.pending) >= self.flush_bytes
+            if not flush_now and not self.flush_scheduled:
+                self.flush_scheduled = True
+                self.loop.call_later(self.flush_interval, self._timed_flush)
+
+        if flush_now:
+            self.flush()
+        if truncated_now:
+            logger.warning(f"Output budget exceeded for session {self.key}", extra={'category': 'pty.output'})
+            if self.on_budget_exceeded:
+                self.on_budget_exceeded()
+
+    def _timed_flush(self):
+        with self.lock:
+            self.flush_scheduled = False
+        self.flush()
+
+    def flush(self, final=False):
+        """Send everything buffered as a single frame"""
+        with self.lock:
+            text = self.decoder.decode(bytes(self.pending), final=final)
+            self.forwarded += len(self.pending)
+            self.pending.clear()
+            if self.truncated and not self.marker_sent:
+                self.marker_sent = True
+                text += f'\n[Output truncated: {self.byte_budget // 1024} KB limit reached, program stopped]\n'
+            if not text:
+                return
+            self.frames += 1
+            self.unacked += 1
+            pause = self.unacked >= self.max_unacked and self.paused_at is None
+            if pause:
+                self.paused_at = time.monotonic()
+
+        self.send(text, self.ack)
+        if pause:
+            self.loop.set_paused(self.key, True)
+            self.loop.call_later(self.ack_timeout, self._check_stalled)
+
+    def ack(self, *args):
+        """Client confirmed a frame was rendered"""
+        with self.lock:
+            self.unacked = max(0, self.unacked - 1)
+            resume = self.paused_at is not None and self.unacked < self.max_unacked
+            if resume:
+                self.paused_at = None
+        if resume:
+            self.loop.set_paused(self.key, False)
+
+    def _check_stalled(self):
+        with self.lock:
+            stalled = self.paused_at is not None and time.monotonic() - self.paused_at >= self.ack_timeout
+            if stalled:
+                self.paused_at = None
+                self.unacked = 0
+        if stalled:
+            self.loop.set_paused(self.key, False)
+
+    def close(self):
+        """Flush what is left before the session reports its exit"""
+        self.flush(final=True)
+        with self.lock:
+            self.closed = True
@@ -0,0 +1,330 @@
+import errno
+import heapq
+import logging
+import os
+import select
+import selectors
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 8192
+# Used only when pidfd_open is unavailable and exits have to be polled
+EXIT_POLL_INTERVAL = 0.25
+
+
+class LoopSession:
+    def __init__(self, key, master_fd, process, on_output, on_exit, deadline):
+        self.key = key
+        self.master_fd = master_fd
+        self.process = process
+        self.on_output = on_output
+        self.on_exit = on_exit
+        self.deadline = deadline
+        self.exit_fd = None
+        self.owns_exit_fd = True
+        self.reading = True
+        self.paused = False
+        self.timed_out = False
+        self.exited = False
+
+
+class PTYEventLoop:
+    """One thread multiplexing every running program's PTY and exit notification.
+
+    Master PTY fds and per-child pidfds are registered with a single
+    selector: epoll normally, a cooperative select under eventlet, where the
+    loop runs as a green thread. Output is handed to ``on_output(bytes)``
+    and, once the child exits and its remaining output is drained,
+    ``on_exit(returncode, timed_out)`` is called. Callbacks run on the loop thread and must not
+    block. ``call_later`` schedules other short callbacks on the same thread.
+    """
+
+    def __init__(self, name='pty-loop'):
+        self.name = name
+        self.selector = selectors.DefaultSelector()
+        self.lock = threading.Lock()
+        self.sessions = {}     # key -> LoopSession
+        self.fd_owners = {}    # fd -> (LoopSession, 'pty' | 'exit')
+        self.polled_exits = set()
+        self.timers = []       # heap of (when, seq, callback)
+        self.timer_seq = 0
+        self.wake_r, self.wake_w = os.pipe()
+        os.set_blocking(self.wake_r, False)
+        os.set_blocking(self.wake_w, False)
+        self.selector.register(self.wake_r, selectors.EVENT_READ)
+        self.thread = None
+
+        self.wakeups = 0
+        self.events = 0
+        self.reads = 0
+        self.bytes_read = 0
+        self.exits = 0
+        self.timeouts = 0
+        self.timers_fired = 0
+        self.pauses = 0
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self.thread.start()
+
+    def _wake(self):
+        try:
+            os.write(self.wake_w, b'\0')
+        except BlockingIOError:
+            pass  # Already a wakeup pending
+
+    def add_session(self, key, master_fd, process, on_output, on_exit, timeout=None):
+        """Start watching ``master_fd`` and ``process`` for session ``key``"""
+        self.start()
+        deadline = time.monotonic() + timeout if timeout else None
+        entry = LoopSession(key, master_fd, process, on_output, on_exit, deadline)
+
+        if hasattr(process, 'exit_fd'):
+            # Sandboxed programs are not our children; their handle signals exit itself
+            entry.exit_fd = process.exit_fd()
+            entry.owns_exit_fd = False
+        else:
+            try:
+                entry.exit_fd = os.pidfd_open(process.pid)
+            except (AttributeError, OSError):
+                entry.exit_fd = None
+
+        with self.lock:
+            self.sessions[key] = entry
+            self.fd_owners[master_fd] = (entry, 'pty')
+            self.selector.register(master_fd, selectors.EVENT_READ)
+            if entry.exit_fd is not None:
+                self.fd_owners[entry.exit_fd] = (entry, 'exit')
+                self.selector.register(entry.exit_fd, selectors.EVENT_READ)
+            else:
+                self.polled_exits.add(key)
+        self._wake()
+
+    def remove_session(self, key):
+        """Stop watching a session; its callbacks will not be called again"""
+        with self.lock:
+            entry = self.sessions.pop(key, None)
+            if entry is not None:
+                self._unregister(entry)
+
+    def set_paused(self, key, paused):
+        """Stop or restart reading a session's PTY, letting the child block on a full buffer"""
+        with self.lock:
+            entry = self.sessions.get(key)
+            if entry is None or not entry.reading or entry.paused == paused:
+                return
+            entry.paused = paused
+            if paused:
+                self.pauses += 1
+                self.selector.unregister(entry.master_fd)
+            else:
+                self.selector.register(entry.master_fd, selectors.EVENT_READ)
+        if not paused:
+            self._wake()  # A select-based selector only sees the fd on its next call
+
+    def _unregister(self, entry):
+        """Drop every fd of ``entry`` from the selector; caller holds the lock"""
+        self.polled_exits.discard(entry.key)
+        if entry.reading:
+            entry.reading = False
+            self.fd_owners.pop(entry.master_fd, None)
+            if not entry.paused:
+                self._forget_fd(entry.master_fd)
+        if entry.exit_fd is not None:
+            self.fd_owners.pop(entry.exit_fd, None)
+            self._forget_fd(entry.exit_fd)
+            if entry.owns_exit_fd:
+                os.close(entry.exit_fd)
+            entry.exit_fd = None
+
+    def _forget_fd(self, fd):
+        try:
+            self.selector.unregister(fd)
+        except (KeyError, OSError, ValueError):
+            pass
+
+    def call_later(self, delay, callback):
+        """Run ``callback()`` on the loop thread after ``delay`` seconds"""
+        self.start()
+        with self.lock:
+            self.timer_seq += 1
+            heapq.heappush(self.timers, (time.monotonic() + delay, self.timer_seq, callback))
+        self._wake()
+
+    def _next_timeout(self):
+        now = time.monotonic()
+        candidates = []
+        with self.lock:
+            if self.timers:
+                candidates.append(self.timers[0][0])
+            candidates.extend(
+                entry.deadline for entry in self.sessions.values()
+                if entry.deadline is not None and not entry.timed_out
+            )
+            if self.polled_exits:
+                candidates.append(now + EXIT_POLL_INTERVAL)
+        if not candidates:
+            return None
+        return max(0.0, min(candidates) - now)
+
+    def _run(self):
+        logger.info(f"PTY event loop {self.name} started")
+        while True:
+            try:
+                ready = self.selector.select(self._next_timeout())
+            except InterruptedError:
+                continue
+            except OSError as e:
+                # Under eventlet, closing an fd another greenlet removed mid-select aborts the select
+                logger.debug(f"PTY loop select interrupted: {e}")
+                continue
+            self.wakeups += 1
+            self.events += len(ready)
+
+            for key, _ in ready:
+                fd = key.fd
+                if fd == self.wake_r:
+                    # One read only: eventlet's os.read waits instead of raising on an empty pipe
+                    try:
+                        os.read(self.wake_r, 4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+
+                with self.lock:
+                    owner = self.fd_owners.get(fd)
+                if owner is None:
+                    continue
+                entry, kind = owner
+                try:
+                    if kind == 'pty':
+                        self._read_pty(entry)
+                    else:
+                        self._handle_exit(entry)
+                except Exception as e:
+                    logger.error(f"PTY loop error for session {entry.key}: {e}", extra={'category': 'pty.loop'})
+
+            self._run_timers()
+            self._check_deadlines()
+            self._poll_exits()
+
+    def _read_pty(self, entry):
+        """Read whatever is buffered on the master side; returns False once the PTY is closed"""
+        if not entry.reading:
+            return False
+        try:
+            data = os.read(entry.master_fd, READ_SIZE)
+        except OSError as e:
+            if e.errno not in (errno.EIO, errno.EBADF):
+                logger.error(f"PTY read error for session {entry.key}: {e}", extra={'category': 'pty.loop'})
+            data = b''
+
+        if not data:
+            # EOF/EIO: the slave side is closed, stop polling the fd
+            with self.lock:
+                if entry.reading:
+                    entry.reading = False
+                    self.fd_owners.pop(entry.master_fd, None)
+                    if not entry.paused:
+                        self._forget_fd(entry.master_fd)
+            return False
+
+        self.reads += 1
+        self.bytes_read += len(data)
+        entry.on_output(data)
+        return True
+
+    def _drain(self, entry):
+        """Forward output still buffered in the PTY after the child exited"""
+        while entry.reading:
+            try:
+                readable, _, _ = select.select([entry.master_fd], [], [], 0)
+            except (OSError, ValueError):
+                return
+            if not readable or not self._read_pty(entry):
+                return
+
+    def _handle_exit(self, entry):
+        with self.lock:
+            if entry.exited or self.sessions.get(entry.key) is not entry:
+                return
+            entry.exited = True
+        try:
+            returncode = entry.process.wait(timeout=1)
+        except Exception as e:
+            logger.warning(f"Could not reap process for session {entry.key}: {e}")
+            returncode = None
+
+        self._drain(entry)
+        with self.lock:
+            if self.sessions.get(entry.key) is entry:
+                del self.sessions[entry.key]
+            self._unregister(entry)
+
+        self.exits += 1
+        entry.on_exit(returncode, entry.timed_out)
+
+    def _run_timers(self):
+        now = time.monotonic()
+        due = []
+        with self.lock:
+            while self.timers and self.timers[0][0] <= now:
+                due.append(heapq.heappop(self.timers)[2])
+        for callback in due:
+            self.timers_fired += 1
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"PTY loop timer callback failed: {e}")
+
+    def _check_deadlines(self):
+        now = time.monotonic()
+        with self.lock:
+            expired = [
+                entry for entry in self.sessions.values()
+                if entry.deadline is not None and not entry.timed_out and entry.deadline <= now
+            ]
+        for entry in expired:
+            # Exit notification follows through the pidfd (or poll) as usual
+            entry.timed_out = True
+            self.timeouts += 1
+            logger.warning(f"Process timeout for session {entry.key}")
+            try:
+                if entry.process.poll() is None:
+                    os.killpg(os.getpgid(entry.process.pid), signal.SIGKILL)
+            except Exception as e:
+                logger.error(f"Error killing timed out process: {e}")
+
+    def _poll_exits(self):
+        with self.lock:
+            if not self.polled_exits:
+                return
+            candidates = [self.sessions[key] for key in self.polled_exits if key in self.sessions]
+        for entry in candidates:
+            if entry.process.poll() is not None:
+                self._handle_exit(entry)
+
+    def stats(self):
+        with self.lock:
+            sessions = len(self.sessions)
+            paused = sum(1 for entry in self.sessions.values() if entry.paused)
+            pending_timers = len(self.timers)
+        return {
+            'sessions': sessions,
+            'paused_sessions': paused,
+            'pauses': self.pauses,
+            'pidfd_supported': hasattr(os, 'pidfd_open'),
+            'pending_timers': pending_timers,
+            'wakeups': self.wakeups,
+            'events': self.events,
+            'reads': self.reads,
+            'bytes_read': self.bytes_read,
+            'exits': self.exits,
+            'timeouts': self.timeouts,
+            'timers_fired': self.timers_fired,
+            'threads': threading.active_count()
+        }
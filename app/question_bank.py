@@ -0,0 +1,361 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from grader import parse_expected_output
+from metrics import registry
+from scheduler import QueueFullError
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_RUNS = registry.counter(
+    'question_reference_runs_total', 'Reference solution builds, by outcome', ('result',)
+)
+REFERENCE_SECONDS = registry.histogram(
+    'question_reference_seconds', 'Time to compile a reference solution and capture its outputs'
+)
+
+READY = 'ready'
+PENDING = 'pending'
+FAILED = 'error'
+
+QUESTION_ID_RE = re.compile(r'^[0-9a-f]{12}$')
+
+
+class QuestionError(ValueError):
+    """A question that cannot be saved, or cannot be used in a game yet"""
+
+
+def _digest(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def _write_json(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+class QuestionBank:
+    """Persistent questions under ``root``, referenced by id.
+
+    A question either has a reference C solution or hand-typed expected
+    outputs. A reference solution is compiled and run once per test input
+    by ``run_reference(solution, inputs) -> (outputs, error)``, right after
+    the question is saved; the outputs are cached in
+    ``expected/<reference digest>.json``, keyed by input. The digest covers
+    the solution and ``reference_config`` (compiler, flags, limits), so
+    editing either invalidates the cache. ``resolve()`` turns a question
+    into the dict a game holds, with every expected output filled in.
+
+    Deleting only hides a question: games that used it can still be
+    replayed.
+    """
+
+    def __init__(self, root, run_reference, reference_config=None):
+        self.questions_dir = os.path.join(root, 'questions')
+        self.expected_dir = os.path.join(root, 'expected')
+        os.makedirs(self.questions_dir, exist_ok=True)
+        os.makedirs(self.expected_dir, exist_ok=True)
+        self.run_reference = run_reference
+        self.reference_config = reference_config or {}
+        self.lock = threading.RLock()
+        self.questions = {}     # id -> stored question
+        self.expected = {}      # reference digest -> {'outputs': {input digest: output}, 'error': str or None}
+        self.build_locks = {}   # reference digest -> lock held while it builds
+
+    def load(self):
+        questions = {}
+        for entry in os.scandir(self.questions_dir):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    question = json.load(f)
+                questions[question['id']] = question
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Skipping unreadable question file {entry.path}: {e}")
+        with self.lock:
+            self.questions = questions
+        pending = [qid for qid, question in questions.items() if self.status(question) == PENDING]
+        logger.info(f"Question bank loaded: {len(questions)} questions, {len(pending)} awaiting reference outputs")
+        for qid in pending:
+            self.prepare_async(qid)
+
+    def _reference_digest(self, solution):
+        return _digest([solution, self.reference_config]) if solution else None
+
+    def _expected_entry(self, reference, reload=False):
+        """Cached outputs of a reference solution, read from disk on first use; caller holds the lock"""
+        entry = self.expected.get(reference)
+        if entry is None or reload:
+            try:
+                with open(os.path.join(self.expected_dir, f'{reference}.json'), 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except FileNotFoundError:
+                entry = entry or {'outputs': {}, 'error': None}
+            except ValueError as e:
+                logger.error(f"Discarding unreadable expected outputs {reference}: {e}")
+                entry = {'outputs': {}, 'error': None}
+            self.expected[reference] = entry
+        return entry
+
+    def _get(self, qid):
+        """Stored question, read from disk when another worker created it; caller holds the lock"""
+        question = self.questions.get(qid)
+        if question is None and QUESTION_ID_RE.match(qid):
+            try:
+                with open(os.path.join(self.questions_dir, f'{qid}.json'), 'r', encoding='utf-8') as f:
+                    question = json.load(f)
+                self.questions[qid] = question
+            except (OSError, ValueError):
+                return None
+        return question
+
+    @staticmethod
+    def _inputs(question):
+        return [case['input'] for case in question['test_cases']] or ['']
+
+    def status(self, question):
+        """Whether a stored question's expected outputs are ready, pending or failed"""
+        return self._status(question)[0]
+
+    def _status(self, question):
+        """``(status, error)``"""
+        if not question['reference'] or question['any_output']:
+            return READY, None
+        with self.lock:
+            entry = self._expected_entry(question['reference'])
+            if entry['error']:
+                return FAILED, entry['error']
+            if all(_digest(text) in entry['outputs'] for text in self._inputs(question)):
+                return READY, None
+        return PENDING, None
+
+    def save(self, data, qid=None):
+        """Create or replace a question from teacher input; returns its listing entry"""
+        title = (data.get('title') or '').strip()
+        description = (data.get('description') or '').strip()
+        if not title or not description:
+            raise QuestionError('Title and description are required')
+        solution = (data.get('solution') or '').strip()
+        legacy_output = data.get('expected_output')
+        any_output = bool(data.get('any_output')) or legacy_output == 'variable'
+
+        test_cases = []
+        for case in data.get('test_cases') or []:
+            stored = {
+                'input': case.get('input', ''),
+                'hidden': bool(case.get('hidden', False)),
+                'timeout': case.get('timeout')
+            }
+            if not solution and not any_output:
+                if case.get('expected_output') is None:
+                    raise QuestionError('Every test case needs an expected output when there is no reference solution')
+                stored['expected_output'] = parse_expected_output(case['expected_output'])
+            test_cases.append(stored)
+        if not test_cases and not solution and not any_output:
+            if not legacy_output:
+                raise QuestionError('Provide a reference solution, an expected output or test cases')
+            test_cases.append({'input': '', 'hidden': False, 'timeout': None,
+                               'expected_output': parse_expected_output(legacy_output)})
+
+        now = datetime.now().isoformat()
+        with self.lock:
+            previous = self._get(qid) if qid else None
+            if qid and previous is None:
+                raise QuestionError('Unknown question')
+            question = {
+                'id': qid or secrets.token_hex(6),
+                'title': title,
+                'description': description,
+                'hint': (data.get('hint') or '').strip(),
+                'solution': solution,
+                'reference': self._reference_digest(solution),
+                'any_output': any_output,
+                'test_cases': test_cases,
+                'created': previous['created'] if previous else now,
+                'updated': now,
+                'deleted': False
+            }
+            _write_json(os.path.join(self.questions_dir, f"{question['id']}.json"), question)
+            self.questions[question['id']] = question
+            if question['reference']:
+                # Saving again is how a teacher retries a failed build
+                self._expected_entry(question['reference'])['error'] = None
+            if previous and previous['reference'] != question['reference']:
+                self._drop_unused(previous['reference'])
+
+        if self.status(question) == PENDING:
+            self.prepare_async(question['id'])
+        return self.describe(question)
+
+    def _drop_unused(self, reference):
+        """Forget a reference's cached outputs once no question uses it; caller holds the lock"""
+        if not reference or any(q['reference'] == reference for q in self.questions.values()):
+            return
+        self.expected.pop(reference, None)
+        try:
+            os.unlink(os.path.join(self.expected_dir, f'{reference}.json'))
+        except FileNotFoundError:
+            pass
+
+    def delete(self, qid):
+        with self.lock:
+            question = self._get(qid)
+            if question is None or question['deleted']:
+                return False
+            question = dict(question, deleted=True, updated=datetime.now().isoformat())
+            _write_json(os.path.join(self.questions_dir, f'{qid}.json'), question)
+            self.questions[qid] = question
+            return True
+
+    def prepare_async(self, qid):
+        threading.Thread(target=self._prepare_in_background, args=(qid,), name=f'question-{qid}', daemon=True).start()
+
+    def _prepare_in_background(self, qid):
+        try:
+            self.prepare(qid)
+        except QueueFullError as e:
+            REFERENCE_RUNS.inc(result='failed')
+            logger.warning(f"Reference build for question {qid} deferred: {e}")
+
+    def prepare(self, qid):
+        """Build the reference solution and capture outputs for inputs not cached yet.
+
+        Raises QueueFullError when the build pool turns the job away, so
+        callers can tell a busy server from a broken solution.
+        """
+        with self.lock:
+            question = self._get(qid)
+            if question is None or not question['reference'] or question['any_output']:
+                return
+            reference = question['reference']
+            build_lock = self.build_locks.setdefault(reference, threading.Lock())
+
+        with build_lock:
+            with self.lock:
+                entry = self._expected_entry(reference, reload=True)
+                missing = [text for text in self._inputs(question) if _digest(text) not in entry['outputs']]
+            if entry['error'] or not missing:
+                return
+
+            started = time.monotonic()
+            try:
+                outputs, error = self.run_reference(question['solution'], missing)
+            except QueueFullError:
+                raise
+            except Exception as e:
+                logger.error(f"Reference build for question {qid} failed: {e}")
+                REFERENCE_RUNS.inc(result='failed')
+                return  # Not recorded: the next prepare() tries again
+            REFERENCE_SECONDS.observe(time.monotonic() - started)
+            REFERENCE_RUNS.inc(result='error' if error else 'ok')
+
+            with self.lock:
+                entry = self._expected_entry(reference)
+                if error:
+                    entry['error'] = error
+                else:
+                    for text, output in zip(missing, outputs):
+                        entry['outputs'][_digest(text)] = output
+                _write_json(os.path.join(self.expected_dir, f'{reference}.json'), entry)
+        logger.info(f"Reference outputs for question {qid}: {error or f'{len(missing)} captured'}")
+
+    def resolve(self, qid, build=True, allow_deleted=False):
+        """The question as a game holds it; builds the reference first if needed.
+
+        QueueFullError from that build propagates. With ``build=False`` a
+        question whose outputs are not cached yet raises QuestionError.
+        Deleted questions raise QuestionError unless ``allow_deleted``, which
+        games already holding them pass.
+        """
+        with self.lock:
+            question = self._get(qid)
+        if question is None:
+            raise QuestionError(f'Unknown question {qid}')
+        if question['deleted'] and not allow_deleted:
+            raise QuestionError(f"Question '{question['title']}' has been deleted")
+        if build and self.status(question) == PENDING:
+            self.prepare(qid)
+        status, error = self._status(question)
+        if status != READY:
+            raise QuestionError(f"Question '{question['title']}': {error or 'reference outputs are not available'}")
+
+        with self.lock:
+            outputs = self._expected_entry(question['reference'])['outputs'] if question['reference'] else {}
+        cases = question['test_cases'] or [{'input': '', 'hidden': False, 'timeout': None}]
+        resolved = []
+        for case in cases:
+            if question['any_output']:
+                expected = None
+            elif question['reference']:
+                expected = outputs[_digest(case['input'])]
+            else:
+                expected = case['expected_output']
+            resolved.append({
+                'input': case['input'],
+                'expected_output': expected,
+                'hidden': case['hidden'],
+                'timeout': case['timeout'],
+                'exact': True
+            })
+        return {
+            'id': question['id'],
+            'title': question['title'],
+            'description': question['description'],
+            'hint': question['hint'],
+            'test_cases': resolved
+        }
+
+    def resolve_for_replay(self, ids):
+        """Questions of a recorded game; ones that can no longer be resolved become placeholders.
+
+        Runs while the game lock is held, so it only uses cached outputs and never builds.
+        """
+        questions = []
+        for qid in ids:
+            try:
+                questions.append(self.resolve(qid, build=False, allow_deleted=True))
+            except QuestionError as e:
+                logger.error(f"Replaying game with unavailable question {qid}: {e}")
+                questions.append({'id': qid, 'title': 'Unavailable question', 'description': str(e),
+                                  'hint': '', 'test_cases': [{'input': '', 'expected_output': None, 'exact': True}]})
+        return questions
+
+    def describe(self, question):
+        """Teacher-facing view: the stored question with its status and any known expected outputs"""
+        status, error = self._status(question)
+        with self.lock:
+            outputs = self._expected_entry(question['reference'])['outputs'] if question['reference'] else {}
+        test_cases = []
+        for case in question['test_cases'] or [{'input': '', 'hidden': False, 'timeout': None}]:
+            expected = case.get('expected_output', outputs.get(_digest(case['input'])))
+            test_cases.append(dict(case, expected_output=None if question['any_output'] else expected))
+        return dict(question, test_cases=test_cases, status=status, error=error)
+
+    def list(self):
+        with self.lock:
+            questions = [q for q in self.questions.values() if not q['deleted']]
+        questions.sort(key=lambda q: (q['created'], q['id']))
+        return [self.describe(question) for question in questions]
+
+    def stats(self):
+        with self.lock:
+            questions = [q for q in self.questions.values() if not q['deleted']]
+        statuses = [self.status(question) for question in questions]
+        return {
+            'questions': len(questions),
+            'ready': statuses.count(READY),
+            'pending': statuses.count(PENDING),
+            'failed': statuses.count(FAILED),
+            'cached_references': len(self.expected)
+        }
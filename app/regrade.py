@@ -0,0 +1,163 @@
+import logging
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from datetime import datetime
+
+from grader import question_cases
+from scheduler import QueueFullError
+
+logger = logging.getLogger(__name__)
+
+
+class RegradeBusyError(Exception):
+    """Raised when a re-grade is requested while another one is running"""
+
+
+def collect_submissions(participants, question_indexes=None):
+    """``(nickname, submission index, submission)`` for every stored submission to re-grade"""
+    selected = []
+    for nickname, participant in participants.items():
+        for index, submission in enumerate(participant['submissions']):
+            if question_indexes is None or submission['question_index'] in question_indexes:
+                selected.append((nickname, index, submission))
+    return selected
+
+
+class Regrader:
+    """Re-grades stored game submissions against the game's current questions.
+
+    Submissions are grouped by question and source digest so each distinct
+    program is graded once per question, however many times it was
+    submitted. Groups go to the shared build pool as separate owners, a
+    window of them at a time, so they spread across every worker without
+    filling the queue ahead of live submissions. Only one re-grade runs at
+    a time; its progress is reported through ``on_progress(progress)``.
+    """
+
+    def __init__(self, scheduler, grade, load_source, window=None, on_progress=None):
+        self.scheduler = scheduler
+        self.grade = grade              # (code, cases) -> verdict, or None if the code does not compile
+        self.load_source = load_source  # digest -> source, or None if it is gone
+        self.window = window or scheduler.workers * 2
+        self.on_progress = on_progress or (lambda progress: None)
+        self.lock = threading.Lock()
+        self.progress = None
+        self.runs = 0
+
+    def start(self, prepare, apply):
+        """Run a re-grade in a background thread and return its initial progress.
+
+        ``prepare()`` returns the questions and the collected submissions;
+        ``apply(changes)`` records the verdicts that differ, as
+        ``[nickname, submission index, timestamp, correct]`` entries.
+        """
+        with self.lock:
+            if self.progress and self.progress['state'] == 'running':
+                raise RegradeBusyError('A re-grade is already running')
+            self.runs += 1
+            self.progress = {
+                'id': secrets.token_hex(4),
+                'state': 'running',
+                'submissions': 0,
+                'unique': 0,
+                'graded': 0,
+                'skipped': 0,
+                'failed': 0,
+                'changed': 0,
+                'started_at': datetime.now().isoformat(),
+                'seconds': 0.0,
+                'error': None
+            }
+            progress = dict(self.progress)
+        threading.Thread(target=self._run, args=(prepare, apply), name='regrade', daemon=True).start()
+        return progress
+
+    def status(self):
+        with self.lock:
+            return dict(self.progress) if self.progress else None
+
+    def _update(self, **changes):
+        with self.lock:
+            self.progress.update(changes)
+            progress = dict(self.progress)
+        self.on_progress(progress)
+
+    def _run(self, prepare, apply):
+        started = time.monotonic()
+        try:
+            questions, submissions = prepare()
+            changes = self.regrade(questions, submissions)
+            apply(changes)
+            self._update(state='done', changed=len(changes), seconds=round(time.monotonic() - started, 2))
+            logger.info(f"Re-grade finished: {self.status()}")
+        except Exception as e:
+            logger.error(f"Re-grade failed: {e}")
+            self._update(state='failed', error=str(e), seconds=round(time.monotonic() - started, 2))
+
+    def regrade(self, questions, submissions):
+        """Grade every distinct (question, source) once and return the verdicts that changed"""
+        groups = {}  # (question index, digest) -> [(nickname, index, timestamp, correct)]
+        skipped = 0
+        for nickname, index, submission in submissions:
+            digest = submission.get('source')
+            question_index = submission['question_index']
+            if not digest or question_index >= len(questions):
+                skipped += 1
+                continue
+            groups.setdefault((question_index, digest), []).append(
+                (nickname, index, submission['timestamp'], submission['correct'])
+            )
+        self._update(submissions=len(submissions), unique=len(groups), skipped=skipped)
+
+        cases = {}
+        results = {}
+        pending = deque(groups)
+        running = {}
+        graded = failed = 0
+        while pending or running:
+            while pending and len(running) < self.window:
+                key = pending[0]
+                code = self.load_source(key[1])
+                if code is None:
+                    pending.popleft()
+                    skipped += len(groups[key])
+                    continue
+                if key[0] not in cases:
+                    cases[key[0]] = question_cases(questions[key[0]])
+                try:
+                    future = self.scheduler.submit(f'regrade-{key[1][:12]}-{key[0]}',
+                                                   lambda code=code, key=key: self.grade(code, cases[key[0]]))
+                except QueueFullError:
+                    break  # Live work has the queue; try again once one of ours finishes
+                pending.popleft()
+                running[future] = key
+            if not running:
+                time.sleep(0.2)
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = running.pop(future)
+                try:
+                    verdict = future.result()
+                except Exception as e:
+                    # The stored verdicts stand for programs that could not be graded again
+                    logger.error(f"Re-grading {key[1][:12]} for question {key[0] + 1} failed: {e}")
+                    failed += len(groups[key])
+                    continue
+                results[key] = bool(verdict and verdict['correct'])
+                graded += len(groups[key])
+            self._update(graded=graded, failed=failed, skipped=skipped)
+
+        return [
+            [nickname, index, timestamp, results[key]]
+            for key, members in groups.items() if key in results
+            for nickname, index, timestamp, correct in members if correct != results[key]
+        ]
+
+    def stats(self):
+        with self.lock:
+            return {'runs': self.runs, 'window': self.window, 'last': dict(self.progress) if self.progress else None}
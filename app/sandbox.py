@@ -0,0 +1,265 @@
+import itertools
+import json
+import logging
+import os
+import resource
+import selectors
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+HELPER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sandbox_helper.py')
+MAX_MESSAGE = 65536
+
+RLIMITS = {
+    'cpu_seconds': resource.RLIMIT_CPU,
+    'memory_bytes': resource.RLIMIT_AS,
+    'file_size_bytes': resource.RLIMIT_FSIZE,
+    'processes': resource.RLIMIT_NPROC,
+}
+
+
+class SandboxProcess:
+    """Popen-like handle for a program started by the sandbox helper.
+
+    The program is not our child, so its exit status and resource usage
+    arrive as a message from the helper. ``exit_fd`` becomes readable once
+    they are known, which lets event loops wait on it like a pidfd.
+    """
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.returncode = None
+        self.usage = {}
+        self.done = threading.Event()
+        self._exit_r, self._exit_w = os.pipe()
+
+    def _finish(self, returncode, usage):
+        self.returncode = returncode
+        self.usage = usage
+        self.done.set()
+        try:
+            os.write(self._exit_w, b'\0')
+            os.close(self._exit_w)
+        except OSError:
+            pass
+
+    def exit_fd(self):
+        return self._exit_r
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if not self.done.wait(timeout):
+            raise subprocess.TimeoutExpired(str(self.pid), timeout)
+        return self.returncode
+
+    def close(self):
+        """Release the exit notification pipe"""
+        if self._exit_r is not None:
+            try:
+                os.close(self._exit_r)
+            except OSError:
+                pass
+            self._exit_r = None
+
+    def __del__(self):
+        self.close()
+
+
+class LocalProcess(SandboxProcess):
+    """Fallback when the helper is unavailable: a direct child with limits applied right after spawn"""
+
+    def __init__(self, popen):
+        super().__init__(popen.pid)
+        self.popen = popen
+        self.started = time.monotonic()
+        threading.Thread(target=self._reap, name=f'reap-{popen.pid}', daemon=True).start()
+
+    def _reap(self):
+        # Wait on a pidfd through a selector so this also yields under eventlet
+        try:
+            pidfd = os.pidfd_open(self.popen.pid)
+        except (AttributeError, OSError):
+            pidfd = None
+        if pidfd is not None:
+            with selectors.DefaultSelector() as selector:
+                selector.register(pidfd, selectors.EVENT_READ)
+                selector.select()
+            os.close(pidfd)
+        _, status, usage = os.wait4(self.popen.pid, 0)
+        self.popen.returncode = os.waitstatus_to_exitcode(status)
+        self._finish(self.popen.returncode, {
+            'wall_time': round(time.monotonic() - self.started, 4),
+            'cpu_time': round(usage.ru_utime + usage.ru_stime, 4),
+            'peak_rss_kb': usage.ru_maxrss
+        })
+
+
+class SandboxExecutor:
+    """Starts student programs with resource limits through a pre-started helper process.
+
+    The helper (sandbox_helper.py) forks and execs on our behalf, applying
+    setrlimit and, when SANDBOX_CGROUP_ROOT is delegated to us, a per-run
+    cgroup. Its stdin/stdout/stderr are passed over a Unix socket. If the
+    helper cannot be started the executor spawns directly and applies the
+    limits with prlimit immediately after the fork.
+    """
+
+    def __init__(self, limits=None, cgroup_root=None):
+        self.limits = limits or {}
+        self.cgroup_root = cgroup_root
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.pending = {}     # request id -> [Event, reply]
+        self.processes = {}   # request id -> running SandboxProcess
+        self.unclaimed = set()  # request ids spawn() has not picked up yet
+        self.finished = {}    # request id -> exited before spawn() picked it up
+        self.sock = None
+        self.helper = None
+        self.spawned = 0
+        self.fallback_spawns = 0
+
+    def start(self):
+        with self.lock:
+            if self.helper and self.helper.poll() is None:
+                return True
+            try:
+                parent_sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+                env = dict(os.environ)
+                if self.cgroup_root:
+                    env['SANDBOX_CGROUP_ROOT'] = self.cgroup_root
+                self.helper = subprocess.Popen(
+                    [sys.executable, HELPER_SCRIPT, str(child_sock.fileno())],
+                    pass_fds=(child_sock.fileno(),),
+                    env=env,
+                    close_fds=True
+                )
+                child_sock.close()
+                self.sock = parent_sock
+                threading.Thread(target=self._reader, args=(parent_sock,), name='sandbox-reader', daemon=True).start()
+                logger.info(f"Sandbox helper started (pid {self.helper.pid})")
+                return True
+            except Exception as e:
+                logger.error(f"Could not start sandbox helper, spawning directly: {e}")
+                self.helper = None
+                self.sock = None
+                return False
+
+    def _reader(self, sock):
+        while True:
+            try:
+                data = sock.recv(MAX_MESSAGE)
+            except OSError:
+                data = b''
+            if not data:
+                break
+            message = json.loads(data.decode('utf-8'))
+            abandoned = None
+            with self.lock:
+                if message['op'] in ('spawned', 'error'):
+                    waiter = self.pending.pop(message['id'], None)
+                    if message['op'] == 'spawned' and waiter is None:
+                        # spawn() gave up waiting, so nobody would ever claim or stop this program
+                        abandoned = message['pid']
+                    elif message['op'] == 'spawned':
+                        # Registered here so an immediate exit message finds its process
+                        self.processes[message['id']] = SandboxProcess(message['pid'])
+                        self.unclaimed.add(message['id'])
+                        self.spawned += 1
+                    if waiter:
+                        waiter[1] = message
+                        waiter[0].set()
+                elif message['op'] == 'exit':
+                    process = self.processes.pop(message['id'], None)
+                    if process:
+                        process._finish(message['returncode'], message['usage'])
+                        if message['id'] in self.unclaimed:
+                            self.finished[message['id']] = process
+            if abandoned is not None:
+                logger.warning(f"Killing sandboxed program {abandoned} that started after its spawn timed out")
+                try:
+                    os.killpg(abandoned, signal.SIGKILL)  # The helper makes each program a session leader
+                except OSError:
+                    pass
+
+        logger.error("Sandbox helper connection closed")
+        with self.lock:
+            if self.sock is sock:
+                self.sock = None
+            orphans = list(self.processes.values())
+            self.processes.clear()
+            for waiter in self.pending.values():
+                waiter[0].set()
+            self.pending.clear()
+        # The helper is gone, so nobody will report these exits
+        for process in orphans:
+            process._finish(-9, {})
+
+    def spawn(self, argv, cwd, stdin, stdout, stderr, limits=None):
+        """Start ``argv`` with the given fds as its stdio; returns a SandboxProcess"""
+        run_limits = dict(self.limits)
+        run_limits.update(limits or {})
+        if self.sock is None and not self.start():
+            return self._spawn_local(argv, cwd, stdin, stdout, stderr, run_limits)
+
+        request_id = next(self.ids)
+        waiter = [threading.Event(), None]
+        with self.lock:
+            self.pending[request_id] = waiter
+        request = {'id': request_id, 'argv': list(argv), 'cwd': cwd, 'limits': run_limits}
+        try:
+            socket.send_fds(self.sock, [json.dumps(request).encode('utf-8')], [stdin, stdout, stderr])
+        except (OSError, AttributeError) as e:
+            with self.lock:
+                self.pending.pop(request_id, None)
+            logger.error(f"Sandbox helper unavailable ({e}), spawning directly")
+            return self._spawn_local(argv, cwd, stdin, stdout, stderr, run_limits)
+
+        waiter[0].wait(5)
+        with self.lock:
+            # Withdrawn under the lock, so a reply that arrives later finds no waiter
+            self.pending.pop(request_id, None)
+            reply = waiter[1]
+        if not reply or reply['op'] != 'spawned':
+            raise OSError(f"Sandbox could not start program: {reply['error'] if reply else 'no reply'}")
+
+        with self.lock:
+            self.unclaimed.discard(request_id)
+            # A very short program may already have exited and been reported
+            process = self.processes.get(request_id) or self.finished.pop(request_id, None)
+        if process is None:
+            raise OSError("Sandbox lost track of the started program")
+        return process
+
+    def _spawn_local(self, argv, cwd, stdin, stdout, stderr, limits):
+        popen = subprocess.Popen(
+            argv, stdin=stdin, stdout=stdout, stderr=stderr,
+            cwd=cwd, start_new_session=True
+        )
+        for name, value in limits.items():
+            if name in RLIMITS and value:
+                try:
+                    resource.prlimit(popen.pid, RLIMITS[name], (value, value))
+                except (OSError, ValueError):
+                    pass
+        with self.lock:
+            self.fallback_spawns += 1
+        return LocalProcess(popen)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'helper_pid': self.helper.pid if self.helper and self.helper.poll() is None else None,
+                'running': len(self.processes),
+                'spawned': self.spawned,
+                'fallback_spawns': self.fallback_spawns,
+                'limits': self.limits,
+                'cgroup_root': self.cgroup_root
+            }
@@ -0,0 +1,173 @@
+"""Pre-started spawner for student programs.
+
+Runs as a separate single-threaded process so forking is cheap and safe no
+matter how many threads the web server has. Requests arrive on a
+SOCK_SEQPACKET socket (fd passed as argv[1]) as JSON with the child's
+stdin/stdout/stderr attached via SCM_RIGHTS. Each child gets its own
+session, resource limits and (when available) a cgroup before exec. Exit
+status and resource usage are reported back when the child is reaped.
+"""
+import json
+import os
+import resource
+import select
+import signal
+import socket
+import sys
+import time
+
+MAX_MESSAGE = 65536
+
+LIMITS = {
+    'cpu_seconds': resource.RLIMIT_CPU,
+    'memory_bytes': resource.RLIMIT_AS,
+    'file_size_bytes': resource.RLIMIT_FSIZE,
+    'processes': resource.RLIMIT_NPROC,
+}
+
+
+def send(sock, message):
+    sock.send(json.dumps(message).encode('utf-8'))
+
+
+def setup_cgroup(cgroup_root, run_id, limits):
+    """Create a per-run cgroup; returns its path or None when cgroups are not delegated to us"""
+    if not cgroup_root:
+        return None
+    path = os.path.join(cgroup_root, f'run-{run_id}')
+    try:
+        os.mkdir(path)
+        if limits.get('memory_bytes'):
+            with open(os.path.join(path, 'memory.max'), 'w') as f:
+                f.write(str(limits['memory_bytes']))
+        if limits.get('cgroup_pids'):
+            with open(os.path.join(path, 'pids.max'), 'w') as f:
+                f.write(str(limits['cgroup_pids']))
+        return path
+    except OSError:
+        try:
+            os.rmdir(path)
+        except OSError:
+            pass
+        return None
+
+
+def read_cgroup_peak(path):
+    try:
+        with open(os.path.join(path, 'memory.peak'), 'r') as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def exec_child(request, fds, cgroup_path):
+    """Runs in the forked child; never returns"""
+    try:
+        os.setsid()
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+        for fd in fds:
+            if fd > 2:
+                os.close(fd)
+
+        if cgroup_path:
+            with open(os.path.join(cgroup_path, 'cgroup.procs'), 'w') as f:
+                f.write(str(os.getpid()))
+
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        for name, value in request.get('limits', {}).items():
+            if name in LIMITS and value:
+                resource.setrlimit(LIMITS[name], (value, value))
+
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+        os.chdir(request['cwd'])
+        os.execv(request['argv'][0], request['argv'])
+    except Exception as e:
+        try:
+            os.write(2, f'Failed to start program: {e}\n'.encode('utf-8'))
+        finally:
+            os._exit(127)
+
+
+def main():
+    sock = socket.socket(fileno=int(sys.argv[1]))
+    cgroup_root = os.environ.get('SANDBOX_CGROUP_ROOT') or None
+
+    wake_r, wake_w = os.pipe()
+    os.set_blocking(wake_r, False)
+    os.set_blocking(wake_w, False)
+    signal.set_wakeup_fd(wake_w)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    children = {}  # pid -> (request id, start time, cgroup path)
+
+    while True:
+        try:
+            readable, _, _ = select.select([sock, wake_r], [], [])
+        except InterruptedError:
+            continue
+
+        if sock in readable:
+            try:
+                data, fds, _, _ = socket.recv_fds(sock, MAX_MESSAGE, 3)
+            except OSError:
+                data, fds = b'', []
+            if not data:
+                break  # Server went away
+
+            request = json.loads(data.decode('utf-8'))
+            cgroup_path = setup_cgroup(cgroup_root, request['id'], request.get('limits', {}))
+            started = time.monotonic()
+            try:
+                pid = os.fork()
+            except OSError as e:
+                send(sock, {'op': 'error', 'id': request['id'], 'error': str(e)})
+                pid = None
+            if pid == 0:
+                sock.close()
+                exec_child(request, fds, cgroup_path)
+            for fd in fds:
+                os.close(fd)
+            if pid:
+                children[pid] = (request['id'], started, cgroup_path)
+                send(sock, {'op': 'spawned', 'id': request['id'], 'pid': pid, 'cgroup': bool(cgroup_path)})
+
+        if wake_r in readable:
+            try:
+                while os.read(wake_r, 512):
+                    pass
+            except BlockingIOError:
+                pass
+
+        # Reap every child that has exited and report its usage
+        while children:
+            try:
+                pid, status, usage = os.wait4(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            run_id, started, cgroup_path = children.pop(pid, (None, time.monotonic(), None))
+            peak = read_cgroup_peak(cgroup_path) if cgroup_path else None
+            if cgroup_path:
+                try:
+                    os.rmdir(cgroup_path)
+                except OSError:
+                    pass
+            send(sock, {
+                'op': 'exit',
+                'id': run_id,
+                'pid': pid,
+                'returncode': -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status),
+                'usage': {
+                    'wall_time': round(time.monotonic() - started, 4),
+                    'cpu_time': round(usage.ru_utime + usage.ru_stime, 4),
+                    'peak_rss_kb': peak // 1024 if peak else usage.ru_maxrss
+                }
+            })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the scheduler refuses new work because the queue is at capacity"""
+
+
+class Job:
+    def __init__(self, owner, fn, on_position):
+        self.owner = owner
+        self.fn = fn
+        self.on_position = on_position
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+        self.last_position = None
+
+
+class JobScheduler:
+    """Fixed-size worker pool for compile and execute jobs.
+
+    Jobs are served FIFO, except that an owner (nickname or socket id) never
+    has more than one job running at a time; their later jobs wait while
+    other owners' jobs overtake them. Queued jobs are told their position
+    and an ETA whenever it changes so the client can show backpressure.
+    """
+
+    SAMPLE_SIZE = 256
+
+    def __init__(self, workers=None, max_queue=200, name='jobs'):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.name = name
+        self.cond = threading.Condition()
+        self.queue = deque()
+        self.running_owners = set()
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_samples = deque(maxlen=self.SAMPLE_SIZE)
+        self.service_samples = deque(maxlen=self.SAMPLE_SIZE)
+        self.threads = []
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'{name}-worker-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, owner, fn, on_position=None):
+        """Queue ``fn`` on behalf of ``owner`` and return a Future for its result.
+
+        ``on_position(position, eta_seconds)`` is called from scheduler threads
+        while the job waits, and with position 0 once it starts.
+        """
+        job = Job(owner, fn, on_position)
+        with self.cond:
+            if len(self.queue) >= self.max_queue:
+                self.rejected += 1
+                raise QueueFullError(f'{self.name} queue is full ({self.max_queue} jobs)')
+            self.queue.append(job)
+            self.submitted += 1
+            self.cond.notify()
+            updates = self._position_updates()
+        self._notify(updates)
+        return job.future
+
+    def run(self, owner, fn, on_position=None):
+        """Submit and block until the job finishes, re-raising its exception"""
+        return self.submit(owner, fn, on_position).result()
+
+    def _next_job(self):
+        """Pop the oldest job whose owner has nothing running, or None"""
+        for index, job in enumerate(self.queue):
+            if job.owner not in self.running_owners:
+                del self.queue[index]
+                return job
+        return None
+
+    def _service_estimate(self):
+        if not self.service_samples:
+            return 1.0
+        return sum(self.service_samples) / len(self.service_samples)
+
+    def _position_updates(self):
+        """Collect (job, position, eta) for waiting jobs whose position changed; caller holds cond"""
+        updates = []
+        per_slot = self._service_estimate() / self.workers
+        for position, job in enumerate(self.queue, start=1):
+            if job.on_position and job.last_position != position:
+                job.last_position = position
+                updates.append((job, position, round(position * per_slot, 1)))
+        return updates
+
+    @staticmethod
+    def _notify(updates):
+        for job, position, eta in updates:
+            try:
+                job.on_position(position, eta)
+            except Exception as e:
+                logger.warning(f"Queue position callback failed for {job.owner}: {e}")
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                job = self._next_job()
+                while job is None:
+                    self.cond.wait()
+                    job = self._next_job()
+                self.running_owners.add(job.owner)
+                self.running += 1
+                started = time.monotonic()
+                self.wait_samples.append(started - job.enqueued_at)
+                updates = self._position_updates()
+
+            if job.on_position:
+                updates.insert(0, (job, 0, 0))
+            self._notify(updates)
+
+            if job.future.set_running_or_notify_cancel():
+                try:
+                    job.future.set_result(job.fn())
+                except BaseException as e:
+                    job.future.set_exception(e)
+
+            with self.cond:
+                self.running_owners.discard(job.owner)
+                self.running -= 1
+                self.service_samples.append(time.monotonic() - started)
+                if not job.future.cancelled() and job.future.exception() is None:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                # The owner may have queued work that was skipped while this ran
+                self.cond.notify_all()
+                updates = self._position_updates()
+            self._notify(updates)
+
+    @staticmethod
+    def _summary(samples):
+        if not samples:
+            return {'avg': 0.0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+        ordered = sorted(samples)
+        return {
+            'avg': round(sum(ordered) / len(ordered), 4),
+            'p50': round(ordered[len(ordered) // 2], 4),
+            'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+            'max': round(ordered[-1], 4)
+        }
+
+    def stats(self):
+        with self.cond:
+            return {
+                'workers': self.workers,
+                'queue_depth': len(self.queue),
+                'running': self.running,
+                'max_queue': self.max_queue,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'wait_seconds': self._summary(self.wait_samples),
+                'service_seconds': self._summary(self.service_samples)
+            }
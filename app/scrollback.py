@@ -0,0 +1,65 @@
+import bisect
+import threading
+
+
+def text_units(text):
+    """Length of ``text`` as the browser counts it (UTF-16 code units)"""
+    return len(text.encode('utf-16-le', 'surrogatepass')) // 2
+
+
+class Scrollback:
+    """Bounded ring of the most recent terminal output of one session.
+
+    Every chunk written to the client is appended with its starting offset,
+    counted in UTF-16 code units so offsets match ``string.length`` in the
+    browser. Oldest chunks are dropped once more than ``max_units`` are
+    held. A reconnecting client reports how much it already received and
+    gets the rest back from ``since()``.
+    """
+
+    def __init__(self, max_units=64 * 1024):
+        self.max_units = max_units
+        self.lock = threading.Lock()
+        self.starts = []   # offset of each held chunk
+        self.chunks = []
+        self.start = 0     # offset of the oldest held chunk
+        self.end = 0       # offset just past the newest chunk
+        self.dropped = 0
+
+    def append(self, text):
+        """Record a chunk and return the offset just past it"""
+        with self.lock:
+            self.starts.append(self.end)
+            self.chunks.append(text)
+            self.end += text_units(text)
+            # Always keep the newest chunk, even when it alone is over the limit
+            while len(self.chunks) > 1 and self.end - self.starts[0] > self.max_units:
+                self.starts.pop(0)
+                self.chunks.pop(0)
+                self.dropped += 1
+            self.start = self.starts[0]
+            return self.end
+
+    def since(self, offset):
+        """Output after ``offset`` as ``(text, reset)``.
+
+        ``reset`` is True when the client's offset is no longer held (or
+        never matched a chunk boundary): ``text`` is then everything held
+        and the client should redraw from it.
+        """
+        with self.lock:
+            if offset == self.end:
+                return '', False
+            index = bisect.bisect_left(self.starts, offset) if offset is not None else len(self.starts)
+            if index < len(self.starts) and self.starts[index] == offset:
+                return ''.join(self.chunks[index:]), False
+            return ''.join(self.chunks), True
+
+    def stats(self):
+        with self.lock:
+            return {
+                'chunks': len(self.chunks),
+                'units': self.end - self.start,
+                'end': self.end,
+                'dropped': self.dropped
+            }
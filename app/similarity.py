@@ -0,0 +1,191 @@
+import hashlib
+import heapq
+import re
+import threading
+
+from metrics import registry
+
+SIMILARITY_UPDATE_SECONDS = registry.histogram(
+    'similarity_update_seconds', 'Time to fingerprint a submission and update the similarity index'
+)
+
+C_KEYWORDS = frozenset('''
+    auto break case char const continue default do double else enum extern float for goto if inline
+    int long register restrict return short signed sizeof static struct switch typedef union unsigned
+    void volatile while _Bool
+'''.split())
+
+TOKEN_RE = re.compile(r'''
+    (?P<skip>//[^\n]*|/\*.*?\*/|^[ \t]*\#[^\n]*|\s+)
+  | (?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+  | (?P<number>\.?\d[\w.]*)
+  | (?P<ident>[A-Za-z_]\w*)
+  | (?P<op>->|\+\+|--|<<=?|>>=?|&&|\|\||[-+*/%&|^<>=!]=|\S)
+''', re.S | re.M | re.X)
+
+
+def tokenize(code):
+    """C tokens with names, literals, comments and preprocessor lines normalized away.
+
+    Renaming variables, rewording strings or reformatting does not change
+    the result; keywords and operators are kept as they carry the structure.
+    """
+    tokens = []
+    for match in TOKEN_RE.finditer(code):
+        kind = match.lastgroup
+        if kind == 'skip':
+            continue
+        if kind == 'ident':
+            text = match.group()
+            tokens.append(text if text in C_KEYWORDS else 'V')
+        elif kind == 'string':
+            tokens.append('S')
+        elif kind == 'number':
+            tokens.append('N')
+        else:
+            tokens.append(match.group())
+    return tokens
+
+
+def _hash(gram):
+    return int.from_bytes(hashlib.blake2b('\x1f'.join(gram).encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def fingerprints(code, k=6, window=4):
+    """Winnowed k-gram hashes of ``code``'s tokens (Schleimer et al., 2003).
+
+    Of every ``window`` consecutive k-gram hashes the smallest is kept, so
+    any shared run of ``k + window - 1`` tokens yields a shared fingerprint.
+    """
+    tokens = tokenize(code)
+    if not tokens:
+        return frozenset()
+    if len(tokens) < k:
+        return frozenset([_hash(tokens)])
+    hashes = [_hash(tokens[i:i + k]) for i in range(len(tokens) - k + 1)]
+    if len(hashes) <= window:
+        return frozenset([min(hashes)])
+    selected = set()
+    for i in range(len(hashes) - window + 1):
+        selected.add(min(hashes[i:i + window]))
+    return frozenset(selected)
+
+
+class _Question:
+    def __init__(self):
+        self.docs = {}       # nickname -> (source digest, fingerprints)
+        self.postings = {}   # fingerprint -> nicknames whose latest submission has it
+        self.common = set()  # fingerprints in too many submissions to say anything
+        self.shared = {}     # (nickname, nickname) sorted -> shared non-common fingerprints
+
+
+class SimilarityIndex:
+    """Inverted index of winnowed fingerprints, one per question of the current game.
+
+    Only each student's latest submission to a question is indexed. Adding
+    one updates the shared-fingerprint count of every pair it overlaps with,
+    which costs the length of the posting lists it touches rather than a
+    comparison against every other program. A fingerprint found in more
+    than ``common_limit`` submissions is boilerplate: it is dropped from
+    the index and from every pair count. Pairs are scored by containment,
+    shared fingerprints over the smaller program's fingerprints.
+    """
+
+    def __init__(self, k=6, window=4, common_limit=20):
+        self.k = k
+        self.window = window
+        self.common_limit = common_limit
+        self.lock = threading.Lock()
+        self.questions = {}  # question index -> _Question
+        self.indexed = 0
+
+    def reset(self):
+        with self.lock:
+            self.questions = {}
+
+    def add(self, question_index, nickname, digest, code):
+        """Index ``code`` as ``nickname``'s latest submission to a question"""
+        with SIMILARITY_UPDATE_SECONDS.time():
+            prints = fingerprints(code, self.k, self.window)
+            with self.lock:
+                question = self.questions.setdefault(question_index, _Question())
+                previous = question.docs.get(nickname)
+                if previous is not None:
+                    if previous[0] == digest:
+                        return
+                    self._remove(question, nickname, previous[1])
+                question.docs[nickname] = (digest, prints)
+                for fp in prints:
+                    if fp in question.common:
+                        continue
+                    posting = question.postings.setdefault(fp, set())
+                    for other in posting:
+                        pair = (nickname, other) if nickname < other else (other, nickname)
+                        question.shared[pair] = question.shared.get(pair, 0) + 1
+                    posting.add(nickname)
+                    if len(posting) > self.common_limit:
+                        self._make_common(question, fp, posting)
+                self.indexed += 1
+
+    def _remove(self, question, nickname, prints):
+        for fp in prints:
+            posting = question.postings.get(fp)
+            if posting is None or nickname not in posting:
+                continue
+            posting.discard(nickname)
+            for other in posting:
+                self._decrement(question, (nickname, other) if nickname < other else (other, nickname))
+            if not posting:
+                del question.postings[fp]
+
+    def _make_common(self, question, fp, posting):
+        members = sorted(posting)
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                self._decrement(question, (a, b))
+        question.common.add(fp)
+        del question.postings[fp]
+
+    @staticmethod
+    def _decrement(question, pair):
+        count = question.shared.get(pair, 0) - 1
+        if count > 0:
+            question.shared[pair] = count
+        else:
+            question.shared.pop(pair, None)
+
+    def top_pairs(self, question_index, limit=20, min_score=0.0):
+        """Most similar pairs of submissions to a question, best first"""
+        with self.lock:
+            question = self.questions.get(question_index)
+            if question is None:
+                return []
+            sizes = {}
+            pairs = []
+            for (a, b), shared in question.shared.items():
+                for nickname in (a, b):
+                    if nickname not in sizes:
+                        sizes[nickname] = len(question.docs[nickname][1] - question.common)
+                smaller = min(sizes[a], sizes[b])
+                if smaller:
+                    pairs.append((shared / smaller, shared, a, b))
+            best = heapq.nlargest(limit, (pair for pair in pairs if pair[0] >= min_score))
+            return [{
+                'a': a,
+                'b': b,
+                'score': round(min(score, 1.0), 3),
+                'shared': shared,
+                'identical': question.docs[a][0] == question.docs[b][0],
+                'sources': [question.docs[a][0], question.docs[b][0]]
+            } for score, shared, a, b in best]
+
+    def stats(self):
+        with self.lock:
+            return {
+                'questions': len(self.questions),
+                'submissions': sum(len(q.docs) for q in self.questions.values()),
+                'fingerprints': sum(len(q.postings) for q in self.questions.values()),
+                'common_fingerprints': sum(len(q.common) for q in self.questions.values()),
+                'overlapping_pairs': sum(len(q.shared) for q in self.questions.values()),
+                'indexed': self.indexed
+            }
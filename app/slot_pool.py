@@ -0,0 +1,212 @@
+import heapq
+import itertools
+import logging
+import os
+import pty
+import queue
+import shutil
+import signal
+import threading
+import time
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+SLOT_CHECKOUTS = registry.counter(
+    'slot_checkouts_total', 'Execution slots handed to Run, by whether one was ready', ('result',)
+)
+SLOT_RECYCLE_SECONDS = registry.histogram(
+    'slot_recycle_seconds', 'Time to scrub a returned slot and reopen its PTY (excluding the kill grace)'
+)
+
+
+class ExecutionSlot:
+    """Work directory plus a fresh PTY pair, ready for one program run"""
+
+    def __init__(self, work_dir):
+        self.work_dir = work_dir
+        self.master_fd = None
+        self.slave_fd = None
+        self.uses = 0
+
+    def open_pty(self):
+        self.master_fd, self.slave_fd = pty.openpty()
+
+    def close_slave(self):
+        """Drop the parent's copy of the slave end once the child holds it"""
+        if self.slave_fd is not None:
+            os.close(self.slave_fd)
+            self.slave_fd = None
+
+    def close_fds(self):
+        for fd in (self.master_fd, self.slave_fd):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self.master_fd = self.slave_fd = None
+
+
+class SlotPool:
+    """Pre-created execution slots so Run does no directory or PTY setup.
+
+    ``acquire()`` pops a ready slot (or builds one on the spot when the pool
+    is empty). ``release()`` only queues the slot: a reaper thread sends
+    SIGTERM to the program's process group, waits out ``grace`` without
+    blocking other returns, SIGKILLs survivors, empties the work directory
+    and opens a new PTY pair before the slot goes back on the idle list.
+    PTY pairs are never reused across runs, so no terminal modes or
+    buffered output leak from one program to the next.
+    """
+
+    def __init__(self, root, size=8, grace=0.5):
+        self.root = root
+        self.size = size
+        self.grace = grace
+        self.lock = threading.Lock()
+        self.idle = []
+        self.returns = queue.Queue()
+        self.names = itertools.count()
+        self.created = 0
+        self.recycled = 0
+        self.killed = 0
+        self.discarded = 0
+        self.thread = None
+        self.pending = set()  # programs handed to the reaper and not yet reaped
+
+    def start(self):
+        """Clear leftovers of an earlier process, fill the pool and start the reaper"""
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root, exist_ok=True)
+        for _ in range(self.size):
+            try:
+                slot = self._new_slot()
+            except OSError as e:
+                logger.warning(f"Could not pre-create execution slot: {e}")
+                break
+            with self.lock:
+                self.idle.append(slot)
+        self.thread = threading.Thread(target=self._reaper, name='slot-reaper', daemon=True)
+        self.thread.start()
+        logger.info(f"Execution slot pool ready: {len(self.idle)} slots in {self.root}")
+
+    def _new_slot(self):
+        slot = ExecutionSlot(os.path.join(self.root, f'slot-{next(self.names)}'))
+        os.makedirs(slot.work_dir)
+        try:
+            slot.open_pty()
+        except OSError:
+            shutil.rmtree(slot.work_dir, ignore_errors=True)
+            raise
+        with self.lock:
+            self.created += 1
+        return slot
+
+    def acquire(self):
+        with self.lock:
+            slot = self.idle.pop() if self.idle else None
+        if slot is None:
+            SLOT_CHECKOUTS.inc(result='miss')
+            slot = self._new_slot()
+        else:
+            SLOT_CHECKOUTS.inc(result='hit')
+        slot.uses += 1
+        return slot
+
+    def release(self, slot, process=None):
+        """Hand a slot back; ``process`` is the program that ran in it, if any"""
+        if process is not None:
+            with self.lock:
+                self.pending.add(process)
+        self.returns.put((slot, process))
+
+    def _reaper(self):
+        dying = []  # heap of (kill deadline, tie-breaker, slot, process)
+        order = itertools.count()
+        while True:
+            timeout = max(0.0, dying[0][0] - time.monotonic()) if dying else None
+            try:
+                slot, process = self.returns.get(timeout=timeout)
+            except queue.Empty:
+                pass
+            else:
+                if process is not None and self._signal(process, signal.SIGTERM):
+                    heapq.heappush(dying, (time.monotonic() + self.grace, next(order), slot, process))
+                else:
+                    self._forget(process)
+                    self._recycle(slot)
+
+            now = time.monotonic()
+            while dying and dying[0][0] <= now:
+                _, _, slot, process = heapq.heappop(dying)
+                if self._signal(process, signal.SIGKILL):
+                    with self.lock:
+                        self.killed += 1
+                self._forget(process)
+                self._recycle(slot)
+
+    def _forget(self, process):
+        if process is not None:
+            with self.lock:
+                self.pending.discard(process)
+
+    def shutdown(self):
+        """SIGKILL every program still waiting for the reaper, which dies with the process at exit"""
+        with self.lock:
+            pending, self.pending = list(self.pending), set()
+        return sum(1 for process in pending if self._signal(process, signal.SIGKILL))
+
+    @staticmethod
+    def _signal(process, signum):
+        """Signal the program's process group; False once it has exited"""
+        if process.poll() is not None:
+            return False
+        try:
+            os.killpg(os.getpgid(process.pid), signum)
+        except (ProcessLookupError, PermissionError):
+            return False
+        return True
+
+    def _recycle(self, slot):
+        started = time.monotonic()
+        slot.close_fds()
+        try:
+            with os.scandir(slot.work_dir) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(entry.path)
+                    else:
+                        os.unlink(entry.path)
+            with self.lock:
+                keep = len(self.idle) < self.size
+            if keep:
+                slot.open_pty()
+        except OSError as e:
+            logger.warning(f"Discarding execution slot {slot.work_dir}: {e}")
+            keep = False
+
+        with self.lock:
+            if keep:
+                self.idle.append(slot)
+                self.recycled += 1
+            else:
+                self.discarded += 1
+        if not keep:
+            slot.close_fds()
+            shutil.rmtree(slot.work_dir, ignore_errors=True)
+        SLOT_RECYCLE_SECONDS.observe(time.monotonic() - started)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': self.size,
+                'idle': len(self.idle),
+                'returning': self.returns.qsize(),
+                'created': self.created,
+                'recycled': self.recycled,
+                'killed_after_grace': self.killed,
+                'discarded': self.discarded,
+                'root': self.root
+            }
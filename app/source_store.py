@@ -0,0 +1,51 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class SourceStore:
+    """Content-addressed store of submitted programs.
+
+    Each distinct source is written once to ``<root>/<2 hex>/<sha256>.c``;
+    game events refer to it by digest, so the event log and snapshots stay
+    small however many times a program is resubmitted.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def digest(code):
+        return hashlib.sha256(code.encode('utf-8')).hexdigest()
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], f'{digest}.c')
+
+    def put(self, code):
+        """Store ``code`` if it is new and return its digest"""
+        digest = self.digest(code)
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(code)
+            os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest):
+        """Source for ``digest``, or None when it is malformed or unknown"""
+        if not DIGEST_RE.match(digest or ''):
+            return None
+        try:
+            with open(self.path(digest), 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
@@ -16,9 +16,17 @@ window.StudentPanel = {
     mobileHeaderHeight: 150,
     
     // Socket.IO connection
-    socket: null
+    socket: null,
+    // Terminal output received so far (UTF-16 units), reported when resuming a session
+    outputOffset: 0,
+    // Live diagnostics: edits are debounced and only the newest request's reply is shown
+    syntaxCheckId: 0,
+    syntaxCheckTimer: null
 };
 
+const SYNTAX_CHECK_DELAY_MS = 600;
+const SYNTAX_CHECK_RETRY_MS = 3000;
+
 // Main Application Variables - Reference DOM elements
 const runButton = document.getElementById('runButton');
 const reconnectButton = document.getElementById('reconnectButton');
@@ -47,6 +55,49 @@ function getCodeFromEditor() {
     return '';
 }
 
+// Ask the server to syntax-check the editor once typing pauses
+function scheduleSyntaxCheck(delay = SYNTAX_CHECK_DELAY_MS) {
+    clearTimeout(window.StudentPanel.syntaxCheckTimer);
+    window.StudentPanel.syntaxCheckTimer = setTimeout(() => {
+        const socket = window.StudentPanel.socket;
+        if (!socket || !socket.connected || !window.monacoEditor) return;
+        window.StudentPanel.syntaxCheckId += 1;
+        socket.emit('syntax-check', {
+            id: window.StudentPanel.syntaxCheckId,
+            code: getCodeFromEditor()
+        });
+    }, delay);
+}
+
+// Show diagnostics as Monaco markers (squiggles and hover messages)
+function applyDiagnostics(diagnostics) {
+    if (typeof monaco === 'undefined' || !window.monacoEditor) return;
+    const model = window.monacoEditor.getModel();
+    if (!model) return;
+    
+    const severities = {
+        error: monaco.MarkerSeverity.Error,
+        warning: monaco.MarkerSeverity.Warning,
+        info: monaco.MarkerSeverity.Info
+    };
+    const markers = diagnostics
+        .filter(d => d.line <= model.getLineCount())
+        .map(d => {
+            // Underline the word gcc points at, or a single character
+            const word = model.getWordAtPosition({ lineNumber: d.line, column: d.column });
+            return {
+                severity: severities[d.severity] || monaco.MarkerSeverity.Info,
+                message: d.message,
+                source: 'gcc',
+                startLineNumber: d.line,
+                startColumn: word ? word.startColumn : d.column,
+                endLineNumber: d.line,
+                endColumn: word ? word.endColumn : d.column + 1
+            };
+        });
+    monaco.editor.setModelMarkers(model, 'gcc', markers);
+}
+
 // Initialize Socket.IO PTY namespace with production-grade retry configuration
 function initializeSocket() {
     if (window.StudentPanel.socket) {
@@ -62,7 +113,12 @@ function initializeSocket() {
         reconnectionAttempts: 5,
         reconnectionDelay: 1000,
         reconnectionDelayMax: 5000,
-        forceNew: true // Prevents connection reuse issues in Docker environments
+        forceNew: true, // Prevents connection reuse issues in Docker environments
+        // Sent on every (re)connect so the server can resume our terminal session
+        auth: (cb) => cb({
+            token: sessionStorage.getItem('ptySessionToken'),
+            offset: window.StudentPanel.outputOffset
+        })
     });
     
     setupSocketListeners();
@@ -94,6 +150,13 @@ function isProgramComplete(data) {
            data.includes('Compilation failed');
 }
 
+// Append output as a new text node - avoids re-serializing the whole buffer on every frame
+function appendOutput(text) {
+    if (!output || !text) return;
+    output.appendChild(document.createTextNode(text));
+    output.scrollTop = output.scrollHeight;
+}
+
 // Socket event handlers with enhanced state management for production reliability
 function setupSocketListeners() {
     window.StudentPanel.socket.on('connect', () => {
@@ -121,14 +184,35 @@ function setupSocketListeners() {
         if (!window.StudentPanel.programRunning) {
             resetUIState();
         }
+        scheduleSyntaxCheck();
     });
     
-    window.StudentPanel.socket.on('pty-output', (data) => {
-        console.log('Received PTY output length:', data.length);
-        if (output) {
-            output.textContent += data;
-            output.scrollTop = output.scrollHeight;
+    // The server names the session to resume after a dropped connection
+    window.StudentPanel.socket.on('pty-session', (info) => {
+        sessionStorage.setItem('ptySessionToken', info.token);
+        if (!info.resumed) window.StudentPanel.outputOffset = 0;
+    });
+    
+    // Output produced while we were disconnected; reset means our copy is too old to extend
+    window.StudentPanel.socket.on('pty-replay', (replay) => {
+        if (replay.reset && output) output.textContent = '';
+        appendOutput(replay.text);
+        window.StudentPanel.outputOffset = replay.offset;
+        if (!replay.running && window.StudentPanel.programRunning) {
+            resetUIState();
         }
+    });
+    
+    // Messages from outside the session's output stream, so they are not counted in outputOffset
+    window.StudentPanel.socket.on('pty-notice', (data) => {
+        appendOutput(data);
+    });
+    
+    // Program output arrives in batched frames; acking each one lets the server keep reading
+    window.StudentPanel.socket.on('pty-output', (data, ack) => {
+        window.StudentPanel.outputOffset += data.length;
+        appendOutput(data);
+        if (typeof ack === 'function') ack();
         
         // Input detection - highlight input field but preserve stop button functionality
         // This prevents race conditions where users lose the ability to stop hung programs
@@ -163,12 +247,53 @@ function setupSocketListeners() {
                     alert('Correct! Score: ' + result.score);
                 } else {
                     output.textContent += '\nWrong answer. Try again.\n';
+                    if (result.cases && result.cases.length > 1) {
+                        const passed = result.cases.filter(c => c.verdict === 'passed').length;
+                        const failed = result.cases.find(c => c.verdict !== 'passed' && c.verdict !== 'skipped');
+                        output.textContent += `Passed ${passed} of ${result.cases.length} test cases`;
+                        if (failed) {
+                            output.textContent += ` (case ${failed.case}${failed.hidden ? ', hidden' : ''}: ${failed.verdict.replace('_', ' ')})`;
+                        }
+                        output.textContent += '\n';
+                    }
                 }
             })();
             setTimeout(resetUIState, 500);
         }
     });
     
+    // Game pushes name the question by set and index; its content is fetched (and cached) separately
+    window.StudentPanel.socket.on('game_started', () => checkGameStatus());
+    window.StudentPanel.socket.on('game_stopped', () => checkGameStatus());
+    window.StudentPanel.socket.on('new_question', (ref) => {
+        if (window.StudentPanel.gameJoined) showQuestionRef(ref);
+    });
+    
+    // Build queue backpressure - show place in line while the server is busy
+    window.StudentPanel.socket.on('queue-status', (status) => {
+        if (!connectionStatus) return;
+        
+        if (status.position > 0) {
+            connectionStatus.textContent = `Queued: #${status.position} (about ${Math.ceil(status.eta)}s)`;
+            connectionStatus.className = 'connection-status connecting';
+            connectionStatus.style.display = 'block';
+        } else {
+            connectionStatus.style.display = 'none';
+        }
+    });
+    
+    // gcc diagnostics for the editor contents; replies to superseded requests are ignored
+    window.StudentPanel.socket.on('diagnostics', (result) => {
+        if (result.id !== window.StudentPanel.syntaxCheckId) return;
+        if (result.status === 'checked') {
+            applyDiagnostics(result.diagnostics);
+            return;
+        }
+        // No diagnostics for this edit: drop the stale markers, and retry if the server was only busy
+        applyDiagnostics([]);
+        if (result.status === 'deferred') scheduleSyntaxCheck(SYNTAX_CHECK_RETRY_MS);
+    });
+    
     window.StudentPanel.socket.on('disconnect', (reason) => {
         console.log('Socket.IO PTY disconnected:', reason);
         
@@ -311,7 +436,10 @@ function runCode() {
     }
     
     console.log('Emitting run event with code length:', code.length);
-    window.StudentPanel.socket.emit('run', { code: code });
+    window.StudentPanel.socket.emit('run', {
+        code: code,
+        nickname: sessionStorage.getItem('nickname') || ''
+    });
     
     // Failsafe timeout for programs that may hang without proper termination signals
     setTimeout(() => {
@@ -430,7 +558,8 @@ async function checkGameStatus() {
             // Only update DOM if status actually changed to prevent unnecessary reflows
             if (!window.StudentPanel.lastGameStatus || 
                 window.StudentPanel.lastGameStatus.active !== status.active || 
-                window.StudentPanel.lastGameStatus.current_question !== status.current_question) {
+                window.StudentPanel.lastGameStatus.question_set !== status.question_set ||
+                window.StudentPanel.lastGameStatus.question_index !== status.question_index) {
                 
                 window.StudentPanel.lastGameStatus = status;
                 
@@ -495,6 +624,23 @@ async function joinGame() {
     }
 }
 
+// Questions are immutable per set and index, so each one is fetched at most once
+const questionCache = new Map();
+
+async function showQuestionRef(ref) {
+    const key = `${ref.question_set}/${ref.question_index}`;
+    try {
+        if (!questionCache.has(key)) {
+            const response = await fetch(`/api/game/questions/${key}`);
+            if (!response.ok) return;
+            questionCache.set(key, await response.json());
+        }
+        displayQuestion(questionCache.get(key));
+    } catch (error) {
+        console.error('Failed to load question:', error);
+    }
+}
+
 function displayQuestion(question) {
     const questionTitle = document.getElementById('questionTitle');
     const questionDescription = document.getElementById('questionDescription');
@@ -1078,6 +1224,7 @@ window.clearCode = clearCode;
 window.sendInput = sendInput;
 window.insertText = insertText;
 window.reconnectSocket = reconnectSocket;
+window.scheduleSyntaxCheck = scheduleSyntaxCheck;
 
 // Export enhanced UI functions
 window.toggleMaximize = toggleMaximize;
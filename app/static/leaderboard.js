@@ -1,12 +1,62 @@
 let gameData = null;
 let lastUpdateTime = null;
 
+// Ranking state - kept current by server-pushed deltas, with polling as a fallback
+let leaderboardVersion = null;
+let leaderboardEntries = [];
+let leaderboardSocket = null;
+
 window.addEventListener('load', function() {
+    connectLeaderboardSocket();
     updateLeaderboard();
-    setInterval(updateLeaderboard, 3000);
-    setInterval(updateGameStatus, 5000);
+    setInterval(pollLeaderboard, 3000);
+    setInterval(pollGameStatus, 5000);
 });
 
+function connectLeaderboardSocket() {
+    if (typeof io === 'undefined') return;
+    
+    leaderboardSocket = io('/', { transports: ['websocket', 'polling'] });
+    
+    leaderboardSocket.on('connect', () => {
+        leaderboardSocket.emit('join_leaderboard');
+        // Lifecycle pushes may have been missed while disconnected
+        updateGameStatus();
+    });
+    
+    leaderboardSocket.on('leaderboard_snapshot', (snapshot) => {
+        leaderboardVersion = snapshot.version;
+        leaderboardEntries = snapshot.entries;
+        displayLeaderboard(leaderboardEntries);
+        markUpdated();
+    });
+    
+    // Game lifecycle pushes carry only a question reference; refresh the status line from the API
+    ['game_started', 'new_question', 'game_stopped'].forEach(event => {
+        leaderboardSocket.on(event, updateGameStatus);
+    });
+    
+    leaderboardSocket.on('leaderboard_delta', (delta) => {
+        if (leaderboardVersion === null || delta.prev !== leaderboardVersion) {
+            // Missed a delta - resynchronize from a snapshot
+            leaderboardSocket.emit('join_leaderboard');
+            return;
+        }
+        applyDelta(delta);
+        markUpdated();
+    });
+}
+
+// Only poll while the push channel is down
+function pollLeaderboard() {
+    if (leaderboardSocket && leaderboardSocket.connected) return;
+    updateLeaderboard();
+}
+
+function pollGameStatus() {
+    if (leaderboardSocket && leaderboardSocket.connected) return;
+    updateGameStatus();
+}
 async function updateGameStatus() {
     try {
         const response = await fetch('/api/game/status');
@@ -50,15 +100,26 @@ function displayNoGame() {
 
 async function updateLeaderboard() {
     try {
-        const response = await fetch('/api/leaderboard');
-        const leaderboard = await response.json();
+        // since_version=-1 asks for a full snapshot with its version
+        const since = leaderboardVersion === null ? -1 : leaderboardVersion;
+        const response = await fetch(`/api/leaderboard?since_version=${since}`);
+        const result = await response.json();
         
-        const indicator = document.getElementById('refreshIndicator');
-        indicator.classList.add('pulse');
-        setTimeout(() => indicator.classList.remove('pulse'), 1000);
+        if (Array.isArray(result)) {
+            // No active game
+            leaderboardVersion = null;
+            leaderboardEntries = result;
+            displayLeaderboard(leaderboardEntries);
+        } else if (result.entries) {
+            leaderboardVersion = result.version;
+            leaderboardEntries = result.entries;
+            displayLeaderboard(leaderboardEntries);
+        } else {
+            result.deltas.forEach(applyDelta);
+            leaderboardVersion = result.version;
+        }
         
-        displayLeaderboard(leaderboard);
-        lastUpdateTime = new Date();
+        markUpdated();
         
     } catch (error) {
         console.error('Failed to update leaderboard:', error);
@@ -66,6 +127,32 @@ async function updateLeaderboard() {
     }
 }
 
+function markUpdated() {
+    const indicator = document.getElementById('refreshIndicator');
+    indicator.classList.add('pulse');
+    setTimeout(() => indicator.classList.remove('pulse'), 1000);
+    lastUpdateTime = new Date();
+}
+
+// Apply a versioned delta: only the rows whose rank or score changed are touched
+function applyDelta(delta) {
+    leaderboardVersion = delta.version;
+    leaderboardEntries.length = delta.total;
+    delta.changes.forEach(change => {
+        leaderboardEntries[change.rank - 1] = change;
+    });
+    
+    const tbody = document.getElementById('leaderboardBody');
+    const topChanged = delta.changes.some(change => change.rank <= 3);
+    if (tbody.rows.length !== delta.total || !tbody.rows[0] || !tbody.rows[0].dataset.rank || topChanged) {
+        displayLeaderboard(leaderboardEntries);
+        return;
+    }
+    delta.changes.forEach(change => {
+        tbody.replaceChild(createLeaderboardRow(change, change.rank - 1), tbody.rows[change.rank - 1]);
+    });
+}
+
 function displayLeaderboard(leaderboard) {
     const tbody = document.getElementById('leaderboardBody');
     const podium = document.getElementById('podium');
@@ -85,34 +172,39 @@ function displayLeaderboard(leaderboard) {
     // Display full leaderboard
     tbody.innerHTML = '';
     leaderboard.forEach((student, index) => {
-        const row = document.createElement('tr');
-        
-        let rankClass = '';
-        let rankText = `#${index + 1}`;
-        
-        if (index === 0) {
-            rankClass = 'first';
-            rankText = '🥇';
-        } else if (index === 1) {
-            rankClass = 'second';
-            rankText = '🥈';
-        } else if (index === 2) {
-            rankClass = 'third';
-            rankText = '🥉';
-        }
-
-        const progressBar = createProgressBar(student.score, gameData ? gameData.total_questions : 10);
-        
-        row.innerHTML = `
-            <td class="rank ${rankClass}">${rankText}</td>
-            <td class="student-name">${student.nickname}</td>
-            <td class="score">${student.score}</td>
-            <td style="text-align: center;">${progressBar}</td>
-        `;
-        tbody.appendChild(row);
+        tbody.appendChild(createLeaderboardRow(student, index));
     });
 }
 
+function createLeaderboardRow(student, index) {
+    const row = document.createElement('tr');
+    row.dataset.rank = index + 1;
+    
+    let rankClass = '';
+    let rankText = `#${index + 1}`;
+    
+    if (index === 0) {
+        rankClass = 'first';
+        rankText = '🥇';
+    } else if (index === 1) {
+        rankClass = 'second';
+        rankText = '🥈';
+    } else if (index === 2) {
+        rankClass = 'third';
+        rankText = '🥉';
+    }
+
+    const progressBar = createProgressBar(student.score, gameData ? gameData.total_questions : 10);
+    
+    row.innerHTML = `
+        <td class="rank ${rankClass}">${rankText}</td>
+        <td class="student-name">${student.nickname}</td>
+        <td class="score">${student.score}</td>
+        <td style="text-align: center;">${progressBar}</td>
+    `;
+    return row;
+}
+
 function displayPodium(top3) {
     const podium = document.getElementById('podium');
     podium.innerHTML = '';
@@ -153,6 +153,12 @@ int main() {
             return monacoEditor.getValue();
         };
 
+        // Live diagnostics from the server, debounced in app.js
+        monacoEditor.onDidChangeModelContent(function() {
+            if (window.scheduleSyntaxCheck) window.scheduleSyntaxCheck();
+        });
+        if (window.scheduleSyntaxCheck) window.scheduleSyntaxCheck();
+
         console.log('Global Monaco references set');
         
     } catch (error) {
@@ -157,7 +157,10 @@ async function checkTeacherAuth() {
                 window.TeacherPanel.isTeacher = true;
                 loadQuestions();
                 updateGameStatus();
-                setInterval(updateLeaderboard, 3000); // Update every 3 seconds
+                // load fires this check more than once; keep a single poller, idle while deltas are pushed
+                if (!window.leaderboardPoller) {
+                    window.leaderboardPoller = setInterval(pollLeaderboard, 3000);
+                }
             } else {
                 // Redirect to login if not authenticated
                 window.location.href = '/teacher';
@@ -335,6 +338,9 @@ function importQuestions(event) {
                     hint: q.hint,
                     expected_output: q.expected_output || 'variable'
                 };
+                if (Array.isArray(q.test_cases) && q.test_cases.length > 0) {
+                    newQuestion.test_cases = q.test_cases;
+                }
                 validQuestions.push(newQuestion);
             }
 
@@ -871,7 +877,10 @@ async function checkTeacherAuth() {
                 isTeacher = true;
                 loadQuestions();
                 updateGameStatus();
-                setInterval(updateLeaderboard, 3000); // Update every 3 seconds
+                // load fires this check more than once; keep a single poller, idle while deltas are pushed
+                if (!window.leaderboardPoller) {
+                    window.leaderboardPoller = setInterval(pollLeaderboard, 3000);
+                }
             } else {
                 // Redirect to login if not authenticated
                 window.location.href = '/teacher';
@@ -1049,6 +1058,9 @@ function importQuestions(event) {
                     hint: q.hint,
                     expected_output: q.expected_output || 'variable'
                 };
+                if (Array.isArray(q.test_cases) && q.test_cases.length > 0) {
+                    newQuestion.test_cases = q.test_cases;
+                }
                 validQuestions.push(newQuestion);
             }
 
@@ -1455,7 +1467,10 @@ async function checkTeacherAuth() {
                 isTeacher = true;
                 loadQuestions();
                 updateGameStatus();
-                setInterval(updateLeaderboard, 3000); // Update every 3 seconds
+                // load fires this check more than once; keep a single poller, idle while deltas are pushed
+                if (!window.leaderboardPoller) {
+                    window.leaderboardPoller = setInterval(pollLeaderboard, 3000);
+                }
             } else {
                 // Redirect to login if not authenticated
                 window.location.href = '/teacher';
@@ -1470,11 +1485,42 @@ async function checkTeacherAuth() {
     }
 }
 
-function loadQuestions() {
-    // Start with empty question bank
-    questions = [];
+async function loadQuestions() {
+    // Questions are kept in the server's question bank
+    try {
+        const response = await fetch('/api/questions');
+        questions = response.ok ? await response.json() : [];
+    } catch (error) {
+        console.error('Failed to load questions:', error);
+        questions = [];
+    }
     displayQuestions();
     updateQuestionCounter();
+    updateGameStatus();
+
+    // Reference outputs are computed in the background; check again until they are ready
+    if (questions.some(q => q.status === 'pending')) {
+        setTimeout(loadQuestions, 2000);
+    }
+}
+
+async function saveQuestionsToBank(newQuestions, replace) {
+    const response = await fetch('/api/questions/import', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ questions: newQuestions, replace: replace })
+    });
+    const result = await response.json();
+    await loadQuestions();
+    return result;
+}
+
+function describeExpected(question) {
+    if (question.status === 'pending') return '(Running reference solution...)';
+    if (question.status === 'error') return `(Reference solution failed: ${question.error})`;
+    if (question.any_output) return '(Any output)';
+    const visible = question.test_cases.find(c => !c.hidden) || question.test_cases[0];
+    return visible ? visible.expected_output : '';
 }
 
 function updateQuestionCounter() {
@@ -1507,56 +1553,70 @@ function displayQuestions() {
             <div class="question-header">
                 <div class="question-title">${question.title}</div>
                 <div class="question-actions">
-                    <button class="button button-danger" onclick="deleteQuestion(${question.id})" style="padding: 5px 10px; font-size: 12px;">Delete</button>
+                    <button class="button button-danger" onclick="deleteQuestion('${question.id}')" style="padding: 5px 10px; font-size: 12px;">Delete</button>
                 </div>
             </div>
             <div class="question-description">${question.description}</div>
             <div class="question-hint">Hint: ${question.hint}</div>
-            <div class="expected-output">Expected: ${question.expected_output === 'variable' ? '(Any output)' : question.expected_output}</div>
+            <div class="expected-output">Expected: ${describeExpected(question)}</div>
         `;
         
         container.appendChild(questionDiv);
     });
 }
 
-function addQuestion() {
+async function addQuestion() {
     const title = document.getElementById('questionTitle').value.trim();
     const description = document.getElementById('questionDescription').value.trim();
     const hint = document.getElementById('questionHint').value.trim();
     const expectedOutput = document.getElementById('expectedOutput').value;
+    const solution = document.getElementById('referenceSolution').value.trim();
 
     if (!title || !description || !hint) {
         alert('Please fill in all required fields (Title, Description, Hint)');
         return;
     }
 
+    // With a reference solution the expected output is generated by running it
     const newQuestion = {
-        id: Date.now(), // Simple ID generation
         title: title,
         description: description,
         hint: hint,
-        expected_output: expectedOutput || 'variable'
+        solution: solution,
+        expected_output: solution ? undefined : (expectedOutput || 'variable')
     };
 
-    questions.push(newQuestion);
-    displayQuestions();
-    updateQuestionCounter();
+    try {
+        const response = await fetch('/api/questions', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(newQuestion)
+        });
+        const result = await response.json();
+        if (!response.ok) {
+            alert('Could not add question: ' + result.error);
+            return;
+        }
+    } catch (error) {
+        alert('Could not add question: ' + error.message);
+        return;
+    }
+    await loadQuestions();
 
     // Clear form
     document.getElementById('questionTitle').value = '';
     document.getElementById('questionDescription').value = '';
     document.getElementById('questionHint').value = '';
     document.getElementById('expectedOutput').value = '';
+    document.getElementById('referenceSolution').value = '';
 
     alert('Question added successfully!');
 }
 
-function deleteQuestion(id) {
+async function deleteQuestion(id) {
     if (confirm('Are you sure you want to delete this question?')) {
-        questions = questions.filter(q => q.id !== id);
-        displayQuestions();
-        updateQuestionCounter();
-        updateGameStatus(); // Update buttons if current question was deleted
+        await fetch(`/api/questions/${id}`, { method: 'DELETE' });
+        await loadQuestions();
     }
 }
 
@@ -1573,11 +1633,7 @@ function clearAllQuestions() {
     }
 
     if (confirm(`Are you sure you want to delete all ${questions.length} questions? This cannot be undone.`)) {
-        questions = [];
-        displayQuestions();
-        updateQuestionCounter();
-        updateGameStatus(); // Update the UI state
-        alert('All questions cleared successfully!');
+        saveQuestionsToBank([], true).then(() => alert('All questions cleared successfully!'));
     }
 }
 
@@ -1605,14 +1661,18 @@ function importQuestions(event) {
                     continue;
                 }
                 
-                // Ensure unique ID
+                // The bank assigns ids; a reference solution replaces hand-typed outputs
                 const newQuestion = {
-                    id: q.id || Date.now() + Math.random(),
                     title: q.title,
                     description: q.description,
                     hint: q.hint,
-                    expected_output: q.expected_output || 'variable'
+                    solution: q.solution,
+                    any_output: q.any_output,
+                    expected_output: q.solution ? undefined : (q.expected_output || 'variable')
                 };
+                if (Array.isArray(q.test_cases) && q.test_cases.length > 0) {
+                    newQuestion.test_cases = q.test_cases;
+                }
                 validQuestions.push(newQuestion);
             }
 
@@ -1628,22 +1688,10 @@ function importQuestions(event) {
                 `Click Cancel to ADD to current questions`
             );
 
-            if (replace) {
-                questions = validQuestions;
-            } else {
-                // Append and ensure unique IDs
-                validQuestions.forEach(newQ => {
-                    while (questions.some(existingQ => existingQ.id === newQ.id)) {
-                        newQ.id = Date.now() + Math.random();
-                    }
-                    questions.push(newQ);
-                });
-            }
-
-            displayQuestions();
-            updateQuestionCounter();
-            updateGameStatus();
-            alert(`Successfully imported ${validQuestions.length} questions!`);
+            saveQuestionsToBank(validQuestions, replace).then(result => {
+                const failed = result.errors.length ? ` (${result.errors.length} rejected: ${result.errors[0].error})` : '';
+                alert(`Successfully imported ${result.questions.length} questions!${failed}`);
+            });
             
         } catch (error) {
             alert('Error importing questions: ' + error.message);
@@ -1751,33 +1799,18 @@ function loadSampleQuestions() {
         }
     ];
 
+    let replace = false;
     if (questions.length > 0) {
-        const replace = confirm(
+        replace = confirm(
             `This will load ${sampleQuestions.length} sample questions.\\n\\n` +
             `Click OK to REPLACE all current questions\\n` +
             `Click Cancel to ADD to current questions`
         );
-
-        if (replace) {
-            questions = [...sampleQuestions];
-        } else {
-            // Add sample questions with unique IDs
-            sampleQuestions.forEach(sampleQ => {
-                const newQ = { ...sampleQ };
-                while (questions.some(existingQ => existingQ.id === newQ.id)) {
-                    newQ.id = Date.now() + Math.random();
-                }
-                questions.push(newQ);
-            });
-        }
-    } else {
-        questions = [...sampleQuestions];
     }
 
-    displayQuestions();
-    updateQuestionCounter();
-    updateGameStatus();
-    alert(`Successfully loaded ${sampleQuestions.length} sample questions!`);
+    saveQuestionsToBank(sampleQuestions.map(({ id, ...question }) => question), replace).then(result => {
+        alert(`Successfully loaded ${result.questions.length} sample questions!`);
+    });
 }
 
 async function startGame() {
@@ -1791,17 +1824,22 @@ async function startGame() {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
-                questions: questions,
+                question_ids: questions.map(q => q.id),
                 timer: 0 // No timer for manual progression
             })
         });
 
         const result = await response.json();
+        if (!response.ok) {
+            alert('Failed to start game: ' + result.error);
+            return;
+        }
         if (result.success) {
             gameActive = true;
             currentQuestionIndex = 0;
             updateGameStatus();
             displayQuestions();
+            updateAnalytics();
             alert('Game started! Students can now join.');
         }
     } catch (error) {
@@ -1921,18 +1959,51 @@ function updateGameStatus() {
     }
 }
 
+// Ranking kept current by pushed deltas; the API is only polled while the socket is down
+let leaderboardVersion = null;
+let leaderboardEntries = [];
+let leaderboardSocket = null;
+
+function pollLeaderboard() {
+    if (leaderboardSocket && leaderboardSocket.connected) return;
+    updateLeaderboard();
+}
+
 async function updateLeaderboard() {
     if (!gameActive) return;
 
     try {
-        const response = await fetch('/api/leaderboard');
-        const leaderboard = await response.json();
-        displayLeaderboard(leaderboard);
+        // since_version=-1 asks for a full snapshot with its version
+        const since = leaderboardVersion === null ? -1 : leaderboardVersion;
+        const response = await fetch(`/api/leaderboard?since_version=${since}`);
+        const result = await response.json();
+
+        if (Array.isArray(result)) {
+            // No active game
+            leaderboardVersion = null;
+            leaderboardEntries = result;
+        } else if (result.entries) {
+            leaderboardVersion = result.version;
+            leaderboardEntries = result.entries;
+        } else {
+            result.deltas.forEach(applyLeaderboardDelta);
+            leaderboardVersion = result.version;
+        }
+        displayLeaderboard(leaderboardEntries);
     } catch (error) {
         console.error('Failed to update leaderboard:', error);
     }
 }
 
+// A versioned delta carries only the rows whose rank or score changed
+function applyLeaderboardDelta(delta) {
+    leaderboardVersion = delta.version;
+    leaderboardEntries.length = delta.total;
+    delta.changes.forEach(change => {
+        leaderboardEntries[change.rank - 1] = change;
+    });
+}
+
 function displayLeaderboard(leaderboard) {
     const tbody = document.getElementById('leaderboardBody');
     tbody.innerHTML = '';
@@ -1978,4 +2049,159 @@ async function logout() {
         // Force redirect even if network error
         window.location.replace('/teacher');
     }
-}
\ No newline at end of file
+}
+
+async function updateSimilarity() {
+    try {
+        const response = await fetch('/api/teacher/similarity');
+        if (!response.ok) return;
+        const data = await response.json();
+        displaySimilarity(data.pairs);
+    } catch (error) {
+        console.error('Error updating similarity:', error);
+    }
+}
+
+function displaySimilarity(pairs) {
+    const tbody = document.getElementById('similarityBody');
+    if (!tbody) return;
+    tbody.innerHTML = '';
+
+    if (pairs.length === 0) {
+        tbody.innerHTML = '<tr><td colspan="3" style="text-align: center; color: #666;">No similar submissions yet</td></tr>';
+        return;
+    }
+
+    pairs.forEach(pair => {
+        const row = document.createElement('tr');
+        row.innerHTML = `
+            <td>${pair.a} &amp; ${pair.b}</td>
+            <td>${Math.round(pair.score * 100)}%${pair.identical ? ' (identical)' : ''}</td>
+            <td>${pair.shared}</td>
+        `;
+        tbody.appendChild(row);
+    });
+}
+
+// Per-question summaries, kept by index so pushed updates replace single rows
+let questionAnalytics = {};
+let analyticsEtag = null;
+
+async function updateAnalytics() {
+    try {
+        const headers = analyticsEtag ? { 'If-None-Match': analyticsEtag } : {};
+        const response = await fetch('/api/teacher/analytics', { headers });
+        if (response.status === 304 || !response.ok) return;
+        analyticsEtag = response.headers.get('ETag');
+        const data = await response.json();
+        questionAnalytics = {};
+        data.questions.forEach(summary => { questionAnalytics[summary.question_index] = summary; });
+        displayAnalytics();
+    } catch (error) {
+        console.error('Error updating analytics:', error);
+    }
+}
+
+function describeHistogram(histogram, unit) {
+    if (histogram.count === 0) return '-';
+    const median = histogram.median_bucket === null
+        ? `> ${histogram.buckets[histogram.buckets.length - 1]}${unit}`
+        : `\u2264 ${histogram.median_bucket}${unit}`;
+    return `avg ${histogram.avg}${unit}, median ${median}`;
+}
+
+function displayAnalytics() {
+    const tbody = document.getElementById('analyticsBody');
+    if (!tbody) return;
+    tbody.innerHTML = '';
+
+    const summaries = Object.values(questionAnalytics).filter(summary => summary.submissions > 0);
+    if (summaries.length === 0) {
+        tbody.innerHTML = '<tr><td colspan="5" style="text-align: center; color: #666;">No submissions yet</td></tr>';
+        return;
+    }
+
+    summaries.sort((a, b) => a.question_index - b.question_index).forEach(summary => {
+        const row = document.createElement('tr');
+        row.innerHTML = `
+            <td>Q${summary.question_index + 1}</td>
+            <td>${summary.solved}/${summary.attempted} (${Math.round(summary.solve_rate * 100)}%)</td>
+            <td>${describeHistogram(summary.attempts_to_solve, '')}</td>
+            <td>${describeHistogram(summary.time_to_solve, 's')}</td>
+            <td>${summary.compile_errors}/${summary.submissions} (${Math.round(summary.compile_error_rate * 100)}%)</td>
+        `;
+        tbody.appendChild(row);
+    });
+}
+
+// Re-grade stored submissions after a question was corrected; progress arrives over the socket
+async function startRegrade() {
+    if (!confirm('Grade every submission of this game again against the current questions?')) return;
+    try {
+        const response = await fetch('/api/game/regrade', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({})
+        });
+        const result = await response.json();
+        if (!response.ok) {
+            alert('Re-grade failed: ' + result.error);
+            return;
+        }
+        displayRegrade(result);
+    } catch (error) {
+        alert('Re-grade failed: ' + error.message);
+    }
+}
+
+function displayRegrade(progress) {
+    const status = document.getElementById('regradeStatus');
+    if (!status) return;
+    status.style.display = 'block';
+    if (progress.state === 'running') {
+        status.textContent = `Re-grading: ${progress.graded + progress.failed + progress.skipped}/${progress.submissions} submissions (${progress.unique} distinct programs)`;
+    } else if (progress.state === 'done') {
+        status.textContent = `Re-grade finished in ${progress.seconds}s: ${progress.changed} verdicts changed` +
+            (progress.failed ? `, ${progress.failed} could not be graded and kept their verdict` : '');
+        updateAnalytics();
+    } else {
+        status.textContent = `Re-grade failed: ${progress.error}`;
+    }
+}
+
+// Leaderboard deltas and batched teacher notifications refresh the view as they happen;
+// the leaderboard poller only runs while this socket is disconnected
+window.addEventListener('load', function() {
+    if (typeof io === 'undefined') return;
+    
+    const teacherSocket = leaderboardSocket = io('/', { transports: ['websocket', 'polling'] });
+    teacherSocket.on('connect', () => {
+        teacherSocket.emit('subscribe', { room: 'teachers' });
+        teacherSocket.emit('join_leaderboard');
+        updateSimilarity();
+        updateAnalytics();
+    });
+    teacherSocket.on('leaderboard_snapshot', (snapshot) => {
+        leaderboardVersion = snapshot.version;
+        leaderboardEntries = snapshot.entries;
+        displayLeaderboard(leaderboardEntries);
+    });
+    teacherSocket.on('leaderboard_delta', (delta) => {
+        if (leaderboardVersion === null || delta.prev !== leaderboardVersion) {
+            // Missed a delta - resynchronize from a snapshot
+            teacherSocket.emit('join_leaderboard');
+            return;
+        }
+        applyLeaderboardDelta(delta);
+        displayLeaderboard(leaderboardEntries);
+    });
+    teacherSocket.on('regrade_progress', (data) => {
+        data.items.forEach(displayRegrade);
+    });
+    teacherSocket.on('analytics_updated', (data) => {
+        data.items.forEach(summary => { questionAnalytics[summary.question_index] = summary; });
+        analyticsEtag = null;
+        displayAnalytics();
+    });
+    teacherSocket.on('scores_updated', () => updateSimilarity());
+});
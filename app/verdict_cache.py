@@ -0,0 +1,106 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from grader import TIMEOUT, RUNTIME_ERROR, SKIPPED
+
+logger = logging.getLogger(__name__)
+
+# Verdicts that depend on machine load or transient failures are graded again
+UNCACHEABLE_VERDICTS = (TIMEOUT, RUNTIME_ERROR)
+
+
+def normalize_source(code):
+    """Source with line endings and trailing whitespace normalized, which never change a verdict"""
+    lines = code.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip()
+
+
+class VerdictCache:
+    """Bounded LRU of grading results for the current game.
+
+    Keyed by the normalized source, the question's test cases and the
+    grading config (compiler flags, time limits, sandbox limits), so a
+    resubmission of unchanged code returns the stored verdict without
+    compiling or running anything. Compile errors are cached too; verdicts
+    with a timeout or runtime error are not. The owner clears the cache when
+    the question changes; per-game counters reset with ``reset_stats()``.
+    """
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> {'compile_error', 'verdict', 'grade_seconds'}
+        self.evictions = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+            self.stored = 0
+            self.saved_seconds = 0.0
+            self.saved_compiles = 0
+            self.saved_case_runs = 0
+
+    @staticmethod
+    def key(code, cases, config):
+        payload = json.dumps([normalize_source(code), cases, config], sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Stored result for ``key`` or None; a hit counts the grading work it saved"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry['grade_seconds']
+            self.saved_compiles += 1
+            if entry['verdict'] is not None:
+                self.saved_case_runs += sum(1 for case in entry['verdict']['cases'] if case['verdict'] != SKIPPED)
+            return entry
+
+    def put(self, key, compile_error, verdict, grade_seconds):
+        """Remember a result; returns False when it is not safe to reuse"""
+        if verdict is not None and any(case['verdict'] in UNCACHEABLE_VERDICTS for case in verdict['cases']):
+            return False
+        with self.lock:
+            self.entries[key] = {
+                'compile_error': compile_error,
+                'verdict': verdict,
+                'grade_seconds': grade_seconds
+            }
+            self.entries.move_to_end(key)
+            self.stored += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        with self.lock:
+            dropped = len(self.entries)
+            self.entries.clear()
+        if dropped:
+            logger.info(f"Verdict cache cleared ({dropped} entries)")
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'stored': self.stored,
+                'evictions': self.evictions,
+                'saved_seconds': round(self.saved_seconds, 3),
+                'saved_compiles': self.saved_compiles,
+                'saved_case_runs': self.saved_case_runs
+            }
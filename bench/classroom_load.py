@@ -0,0 +1,385 @@
+"""Classroom load generator for a running instance.
+
+Simulates N students, each with a /pty Socket.IO connection and a game
+participant: join, repeatedly run programs from bench/corpus (answering
+scanf prompts, killing runaway loops), submit working answers, and poll the
+leaderboard. A teacher account starts the game. Reports throughput and
+p50/p95/p99 latencies plus server CPU/RSS as JSON:
+
+    python bench/classroom_load.py --url http://localhost:5000 --students 30 --duration 60 -o before.json
+
+Needs the Socket.IO client extras: pip install -r bench/requirements.txt
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+import psutil
+import socketio
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+COMPILED_MARKERS = ('Compilation successful!', 'Compilation failed:')
+RUNNING_MARKER = 'Running your program...'
+EXIT_MARKERS = ('Program completed successfully', 'Program exited with code', 'Program execution timed out',
+                'Program terminated', 'Compilation failed:', 'Server is busy')
+
+
+class Recorder:
+    """Thread-safe latency samples and counters"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.counters = {}
+
+    def observe(self, name, seconds):
+        with self.lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary(self, elapsed):
+        def percentile(ordered, fraction):
+            return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+        with self.lock:
+            latencies = {}
+            for name, values in sorted(self.samples.items()):
+                ordered = sorted(values)
+                latencies[name] = {
+                    'count': len(ordered),
+                    'per_second': round(len(ordered) / elapsed, 3),
+                    'mean_ms': round(statistics.mean(ordered) * 1000, 2),
+                    'p50_ms': round(percentile(ordered, 0.50) * 1000, 2),
+                    'p95_ms': round(percentile(ordered, 0.95) * 1000, 2),
+                    'p99_ms': round(percentile(ordered, 0.99) * 1000, 2),
+                    'max_ms': round(ordered[-1] * 1000, 2)
+                }
+            return latencies, dict(sorted(self.counters.items()))
+
+
+class HTTPClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, method, path, payload=None, timeout=120):
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'})
+        try:
+            with self.opener.open(req, timeout=timeout) as response:
+                return response.status, json.loads(response.read() or b'null')
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+
+class ResourceSampler(threading.Thread):
+    """Samples CPU and RSS of the server process and its children (compilers, student programs)"""
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(name='resource-sampler', daemon=True)
+        self.process = psutil.Process(pid) if pid else None
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.cpu = []
+        self.rss = []
+        self.children = []
+        self.threads = []
+
+    def run(self):
+        if self.process is None:
+            return
+        tracked = {}
+        while not self.stopped.wait(self.interval):
+            try:
+                processes = [self.process] + self.process.children(recursive=True)
+                cpu = rss = 0.0
+                for process in processes:
+                    # cpu_percent needs a previous call on the same Process object
+                    tracked_process = tracked.setdefault(process.pid, process)
+                    try:
+                        cpu += tracked_process.cpu_percent(None)
+                        rss += tracked_process.memory_info().rss
+                    except psutil.Error:
+                        pass
+                self.cpu.append(cpu)
+                self.rss.append(rss / (1024 * 1024))
+                self.children.append(len(processes) - 1)
+                self.threads.append(self.process.num_threads())
+            except psutil.Error:
+                break
+
+    def summary(self):
+        def stats(values):
+            if not values:
+                return None
+            return {'avg': round(statistics.mean(values), 1), 'max': round(max(values), 1)}
+
+        return {
+            'cpu_percent': stats(self.cpu),
+            'rss_mb': stats(self.rss),
+            'child_processes': stats(self.children),
+            'threads': stats(self.threads),
+            'cores': psutil.cpu_count()
+        }
+
+
+def find_server_pid(port):
+    """PID listening on ``port`` on this machine, if any"""
+    try:
+        for conn in psutil.net_connections(kind='tcp'):
+            if conn.laddr and conn.laddr.port == port and conn.status == psutil.CONN_LISTEN and conn.pid:
+                return conn.pid
+    except (psutil.AccessDenied, PermissionError):
+        pass
+    return None
+
+
+def load_corpus():
+    with open(os.path.join(CORPUS_DIR, 'manifest.json'), 'r') as f:
+        manifest = json.load(f)
+    for program in manifest['programs']:
+        with open(os.path.join(CORPUS_DIR, program['file']), 'r') as f:
+            program['code'] = f.read()
+    return manifest
+
+
+class Student(threading.Thread):
+    """One simulated student: a /pty connection plus game participation"""
+
+    def __init__(self, index, args, corpus, recorder, deadline):
+        super().__init__(name=f'student-{index}', daemon=True)
+        self.nickname = f'bench{index:03d}'
+        self.args = args
+        self.corpus = corpus
+        self.recorder = recorder
+        self.deadline = deadline
+        self.random = random.Random(args.seed + index)
+        self.http = HTTPClient(args.url)
+        self.sio = socketio.Client(reconnection=False)
+        self.output = []
+        self.output_event = threading.Condition()
+        self.sio.on('pty-output', self._on_output, namespace='/pty')
+
+    def _on_output(self, data):
+        text = data if isinstance(data, str) else (data or {}).get('data', '')
+        with self.output_event:
+            self.output.append((time.monotonic(), text))
+            self.output_event.notify_all()
+        return True  # Acknowledge the frame so the server keeps streaming
+
+    def _wait_for(self, start_index, markers, timeout):
+        """Wait for output containing one of ``markers``; returns (arrival time, index after it) or (None, None)"""
+        end = time.monotonic() + timeout
+        with self.output_event:
+            index = start_index
+            while True:
+                while index < len(self.output):
+                    arrived, text = self.output[index]
+                    index += 1
+                    if any(marker in text for marker in markers):
+                        return arrived, index
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return None, None
+                self.output_event.wait(remaining)
+
+    def _first_output_after(self, start_index, timeout):
+        """First program output after the separator that follows 'Running your program...'"""
+        end = time.monotonic() + timeout
+        with self.output_event:
+            index = start_index
+            while True:
+                while index < len(self.output):
+                    arrived, text = self.output[index]
+                    index += 1
+                    if text and not text.startswith('-' * 10) and 'Input handling ready' not in text:
+                        return arrived, index
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return None, start_index
+                self.output_event.wait(remaining)
+
+    def run(self):
+        try:
+            status, body = self.http.request('POST', '/api/game/join', {'nickname': self.nickname})
+            if status != 200 or not body or not body.get('success'):
+                self.recorder.count('join_errors')
+                return
+            started = time.monotonic()
+            self.sio.connect(self.args.url, namespaces=['/pty'], wait_timeout=30)
+            self.recorder.observe('connect', time.monotonic() - started)
+        except Exception as e:
+            self.recorder.count('connect_errors')
+            print(f"{self.nickname}: connect failed: {e}", file=sys.stderr)
+            return
+
+        programs = self.corpus['programs']
+        weights = [program.get('weight', 1) for program in programs]
+        try:
+            while time.monotonic() < self.deadline:
+                self._run_program(self.random.choices(programs, weights)[0])
+                time.sleep(self.random.uniform(0, self.args.think_time))
+        finally:
+            self.sio.disconnect()
+
+    def _run_program(self, program):
+        rec = self.recorder
+        with self.output_event:
+            start_index = len(self.output)
+        started = time.monotonic()
+        self.sio.emit('run', {'code': program['code'], 'nickname': self.nickname}, namespace='/pty')
+        rec.count('runs')
+
+        compiled_at, index = self._wait_for(start_index, COMPILED_MARKERS + ('Server is busy',), self.args.timeout)
+        if compiled_at is None:
+            rec.count('compile_timeouts')
+            return
+        rec.observe('compile', compiled_at - started)
+        _, text = self.output[index - 1]
+        if 'Compilation failed' in text or 'Server is busy' in text:
+            rec.count('compile_failures' if 'Compilation failed' in text else 'busy_rejections')
+            return
+
+        _, running_index = self._wait_for(index, (RUNNING_MARKER,), self.args.timeout)
+        if running_index is None:
+            return
+        _, separator_index = self._wait_for(running_index, ('-' * 50,), self.args.timeout)
+        if separator_index is not None:
+            first_at, _ = self._first_output_after(separator_index, self.args.timeout)
+            if first_at is not None:
+                rec.observe('first_output', first_at - started)
+
+        if program.get('input'):
+            self.sio.emit('input', {'data': program['input']}, namespace='/pty')
+        if program.get('kill_after'):
+            time.sleep(program['kill_after'])
+            self.sio.emit('kill', namespace='/pty')
+
+        exited_at, _ = self._wait_for(running_index, EXIT_MARKERS, self.args.timeout)
+        if exited_at is None:
+            rec.count('run_timeouts')
+            self.sio.emit('kill', namespace='/pty')
+            return
+        rec.observe('run_end_to_end', exited_at - started)
+
+        if program.get('submit'):
+            started = time.monotonic()
+            status, body = self.http.request('POST', '/api/game/submit',
+                                             {'nickname': self.nickname, 'code': program['code']})
+            rec.observe('grade', time.monotonic() - started)
+            if status != 200:
+                rec.count(f'submit_http_{status}')
+            elif body and body.get('correct'):
+                rec.count('submits_correct')
+            else:
+                rec.count('submits_incorrect')
+
+
+def poll_leaderboard(args, recorder, deadline):
+    """Leaderboard viewers polling with since_version, as the fallback path does"""
+    client = HTTPClient(args.url)
+    version = -1
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        status, body = client.request('GET', f'/api/leaderboard?since_version={version}')
+        recorder.observe('leaderboard', time.monotonic() - started)
+        if status == 200 and isinstance(body, dict):
+            version = body.get('version', version)
+        time.sleep(args.poll_interval)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--students', type=int, default=30)
+    parser.add_argument('--duration', type=float, default=60.0, help='seconds of load after everyone joined')
+    parser.add_argument('--ramp', type=float, default=5.0, help='seconds over which students connect')
+    parser.add_argument('--think-time', type=float, default=3.0, help='max pause between runs per student')
+    parser.add_argument('--viewers', type=int, default=2, help='leaderboard pollers')
+    parser.add_argument('--poll-interval', type=float, default=3.0)
+    parser.add_argument('--timeout', type=float, default=60.0, help='per-step timeout')
+    parser.add_argument('--teacher-username', default=os.environ.get('TEACHER_USERNAME', 'tuklu15'))
+    parser.add_argument('--teacher-password', default=os.environ.get('TEACHER_PASSWORD', 'AdJk@1526'))
+    parser.add_argument('--server-pid', type=int, help='server PID for CPU/RSS sampling (default: whoever listens on the port)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('-o', '--output', help='write the JSON report here as well as stdout')
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    teacher = HTTPClient(args.url)
+    status, _ = teacher.request('POST', '/api/teacher/login',
+                                {'username': args.teacher_username, 'password': args.teacher_password})
+    if status != 200:
+        raise SystemExit(f"Teacher login failed (HTTP {status})")
+    teacher.request('POST', '/api/game/start', {'questions': [corpus['question']], 'timer': 0})
+
+    port = urllib.parse.urlsplit(args.url).port or 80
+    sampler = ResourceSampler(args.server_pid or find_server_pid(port))
+    sampler.start()
+
+    recorder = Recorder()
+    started = time.monotonic()
+    deadline = started + args.ramp + args.duration
+    students = [Student(index, args, corpus, recorder, deadline) for index in range(args.students)]
+    viewers = [threading.Thread(target=poll_leaderboard, args=(args, recorder, deadline), daemon=True)
+               for _ in range(args.viewers)]
+    for viewer in viewers:
+        viewer.start()
+    for student in students:
+        student.start()
+        time.sleep(args.ramp / max(1, args.students))
+    for thread in students + viewers:
+        thread.join(timeout=max(0.0, deadline - time.monotonic()) + args.timeout * 2)
+    elapsed = time.monotonic() - started
+
+    sampler.stopped.set()
+    sampler.join(timeout=2)
+    teacher.request('POST', '/api/game/stop')
+
+    latencies, counters = recorder.summary(elapsed)
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(),
+        'config': {key: value for key, value in vars(args).items() if 'password' not in key},
+        'elapsed_seconds': round(elapsed, 2),
+        'throughput': {
+            'runs_per_second': round(counters.get('runs', 0) / elapsed, 3),
+            'grades_per_second': latencies.get('grade', {}).get('per_second', 0.0)
+        },
+        'latency': latencies,
+        'counters': counters,
+        'server': sampler.summary()
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
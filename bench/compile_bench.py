@@ -0,0 +1,115 @@
+"""Compile latency benchmark for the compile cache.
+
+Compiles a set of distinct student-style programs and reports p50/p95
+latency for a plain gcc call into a fresh temp dir (the path before the
+cache), a cache miss, and a cache hit on the same source:
+
+    python bench/compile_bench.py --runs 60
+    python bench/compile_bench.py --json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from compile_cache import CompileCache  # noqa: E402
+
+COMPILE_FLAGS = ['-Wall', '-Wextra', '-std=c99', '-g', '-O1']
+
+PROGRAMS = [
+    '#include <stdio.h>\n\nint main(void) {\n    printf("Hello, World! %d\\n", {n});\n    return 0;\n}\n',
+    '#include <stdio.h>\n#include <stdlib.h>\n\nint main(void) {\n    int a, b;\n'
+    '    if (scanf("%d %d", &a, &b) != 2) return 1;\n    printf("%d\\n", a + b + {n});\n    return 0;\n}\n',
+    '#include <stdio.h>\n#include <string.h>\n\nint main(void) {\n    char s[64];\n'
+    '    strcpy(s, "reverse me {n}");\n    for (int i = (int)strlen(s) - 1; i >= 0; i--) putchar(s[i]);\n'
+    '    putchar(\'\\n\');\n    return 0;\n}\n',
+    '#include <stdio.h>\n#include <stdlib.h>\n#include <string.h>\n\nstatic int cmp(const void *a, const void *b) {\n'
+    '    return *(const int *)a - *(const int *)b;\n}\n\nint main(void) {\n    int v[] = {5, 3, {n}, 1, 4};\n'
+    '    qsort(v, 5, sizeof v[0], cmp);\n    for (int i = 0; i < 5; i++) printf("%d ", v[i]);\n'
+    '    printf("\\n");\n    return 0;\n}\n',
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(name, timings):
+    return {
+        'config': name,
+        'runs': len(timings),
+        'p50_ms': round(percentile(timings, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 2),
+        'mean_ms': round(statistics.mean(timings) * 1000, 2)
+    }
+
+
+def source_for(i, offset):
+    # A unique constant per run keeps every compile a cache miss
+    return PROGRAMS[i % len(PROGRAMS)].replace('{n}', str(offset + i))
+
+
+def bench_gcc(runs, offset):
+    timings = []
+    for i in range(runs):
+        started = time.perf_counter()
+        temp_dir = tempfile.mkdtemp(prefix='ccbench_gcc_')
+        try:
+            c_file = os.path.join(temp_dir, 'program.c')
+            with open(c_file, 'w') as f:
+                f.write(source_for(i, offset))
+            result = subprocess.run(['gcc'] + COMPILE_FLAGS + ['-o', os.path.join(temp_dir, 'program'), c_file],
+                                    capture_output=True, text=True, timeout=60)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        timings.append(time.perf_counter() - started)
+        if result.returncode != 0:
+            raise SystemExit(f"Benchmark program failed to compile:\n{result.stderr}")
+    return summarize('gcc', timings)
+
+
+def bench_cache(runs, offset):
+    root = tempfile.mkdtemp(prefix='ccbench_cache_')
+    try:
+        cache = CompileCache(root)
+        results = []
+        for name in ('cache_miss', 'cache_hit'):
+            timings = []
+            for i in range(runs):
+                started = time.perf_counter()
+                result = cache.compile(source_for(i, offset), COMPILE_FLAGS, timeout=60)
+                timings.append(time.perf_counter() - started)
+                if not result.ok:
+                    raise SystemExit(f"Benchmark program failed to compile:\n{result.stderr}")
+            results.append(summarize(name, timings))
+        return results
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=40, help='compiles per configuration')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = [bench_gcc(args.runs, offset=0)] + bench_cache(args.runs, offset=args.runs)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'config':<20}{'runs':>6}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for result in results:
+        print(f"{result['config']:<20}{result['runs']:>6}{result['p50_ms']:>10}{result['p95_ms']:>10}{result['mean_ms']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+#include <stdio.h>
+#include <stdlib.h>
+
+int main(void) {
+    int values[500];
+    srand(42);
+    for (int i = 0; i < 500; i++) {
+        values[i] = rand() % 1000;
+    }
+    for (int i = 0; i < 500; i++) {
+        for (int j = 0; j + 1 < 500 - i; j++) {
+            if (values[j] > values[j + 1]) {
+                int tmp = values[j];
+                values[j] = values[j + 1];
+                values[j + 1] = tmp;
+            }
+        }
+    }
+    printf("min %d max %d\n", values[0], values[499]);
+    return 0;
+}
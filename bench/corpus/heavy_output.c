@@ -0,0 +1,8 @@
+#include <stdio.h>
+
+int main(void) {
+    for (int i = 0; i < 200000; i++) {
+        printf("line %d: the quick brown fox jumps over the lazy dog\n", i);
+    }
+    return 0;
+}
@@ -0,0 +1,11 @@
+#include <stdio.h>
+
+int main(void) {
+    unsigned long n = 0;
+    printf("Counting forever...\n");
+    fflush(stdout);
+    while (1) {
+        n++;
+    }
+    return 0;
+}
@@ -0,0 +1,12 @@
+#include <stdio.h>
+
+int main(void) {
+    int a, b;
+    printf("Enter two numbers: ");
+    fflush(stdout);
+    if (scanf("%d %d", &a, &b) != 2) {
+        return 1;
+    }
+    printf("%d\n", a + b);
+    return 0;
+}